@@ -1,14 +1,41 @@
 from django.contrib import admin
-from .models import Category, Transaction, Budget, TotalBudget
+from .models import Category, Transaction, Budget, TotalBudget, UserLedger, ImportJob, BudgetNotification, Job
+from .routers import read_from_replica, pin_session_to_primary
+
+
+class ReplicaAdmin(admin.ModelAdmin):
+    """Changelists read from a replica; a save or delete keeps the session on the primary for a while."""
+
+    def changelist_view(self, request, extra_context=None):
+        return read_from_replica(self.rendered_changelist_view)(request, extra_context)
+
+    def rendered_changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        if hasattr(response, 'render'):
+            # The template may still run queries (related objects, filters).
+            response.render()
+        return response
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        pin_session_to_primary(request)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        pin_session_to_primary(request)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        pin_session_to_primary(request)
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
+class CategoryAdmin(ReplicaAdmin):
     list_display = ('name', 'type', 'user')
     list_filter = ('type', 'user')
     search_fields = ('name', 'user__username')
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(ReplicaAdmin):
     list_display = ('date', 'amount', 'category', 'description', 'user', 'transaction_type')
     list_filter = ('date', 'category', 'user')
     search_fields = ('description', 'category__name', 'user__username')
@@ -19,23 +46,58 @@ class TransactionAdmin(admin.ModelAdmin):
     transaction_type.short_description = 'Type'
 
 @admin.register(Budget)
-class BudgetAdmin(admin.ModelAdmin):
-    list_display = ('category', 'amount', 'start_date', 'end_date', 'user', 'remaining_budget')
+class BudgetAdmin(ReplicaAdmin):
+    list_display = ('category', 'amount', 'start_date', 'end_date', 'user', 'remaining_budget', 'spent')
     list_filter = ('category', 'user', 'start_date', 'end_date')
     search_fields = ('category__name', 'user__username')
     date_hierarchy = 'start_date'
+    readonly_fields = ('spent', 'alert_level')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('category', 'user').with_remaining()
 
     def remaining_budget(self, obj):
         return obj.remaining_budget()
     remaining_budget.short_description = 'Remaining'
+    remaining_budget.admin_order_field = 'annotated_remaining'
 
 @admin.register(TotalBudget)
-class TotalBudgetAdmin(admin.ModelAdmin):
+class TotalBudgetAdmin(ReplicaAdmin):
     list_display = ('amount', 'start_date', 'end_date', 'user', 'total_remaining_budget')
     list_filter = ('user', 'start_date', 'end_date')
     search_fields = ('user__username',)
     date_hierarchy = 'start_date'
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user').with_remaining()
+
     def total_remaining_budget(self, obj):
         return obj.total_remaining_budget()
-    total_remaining_budget.short_description = 'Total Remaining'
\ No newline at end of file
+    total_remaining_budget.short_description = 'Total Remaining'
+    total_remaining_budget.admin_order_field = 'annotated_remaining'
+
+@admin.register(UserLedger)
+class UserLedgerAdmin(ReplicaAdmin):
+    list_display = ('user', 'total_income', 'total_expenses', 'transaction_count', 'last_modified')
+    search_fields = ('user__username',)
+    readonly_fields = ('total_income', 'total_expenses', 'transaction_count', 'last_modified')
+
+@admin.register(ImportJob)
+class ImportJobAdmin(ReplicaAdmin):
+    list_display = ('id', 'user', 'format', 'status', 'rows_imported', 'rows_failed', 'rows_per_second', 'created_at')
+    list_filter = ('status', 'format')
+    search_fields = ('user__username',)
+
+@admin.register(BudgetNotification)
+class BudgetNotificationAdmin(ReplicaAdmin):
+    list_display = ('id', 'user', 'budget', 'threshold', 'spent', 'amount', 'created_at', 'read_at')
+    list_filter = ('threshold',)
+    search_fields = ('user__username',)
+    list_select_related = ('user', 'budget__category')
+
+@admin.register(Job)
+class JobAdmin(ReplicaAdmin):
+    list_display = ('id', 'user', 'kind', 'status', 'progress', 'attempts', 'worker', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('user__username',)
+    readonly_fields = ('progress', 'result', 'attempts', 'worker', 'started_at', 'heartbeat_at', 'finished_at')
@@ -0,0 +1,258 @@
+"""Richer statistics: monthly series, moving averages, category shares, percentiles, year-over-year.
+
+The numpy engine loads a user's transactions in one query as three integer
+arrays (month ordinals, cents, category ids) and computes every section with array
+operations. The ORM engine computes the same report with per-section
+queries and Python loops; it is used when numpy is not installed, and as the
+baseline in ``manage.py benchmark``. Both return identical reports.
+
+Amounts are in currency units rounded to cents, year-over-year changes in
+percent, shares as fractions of the total.
+"""
+import datetime
+
+from django.db.models import BigIntegerField, Count, F, Func, IntegerField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, Round, TruncMonth
+from .categories import category_cache
+from .models import Transaction, cents
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ANALYTICS_SECTIONS = ('monthly', 'categories', 'percentiles')
+DEFAULT_WINDOW = 3
+DEFAULT_PERCENTILES = (50, 90, 99)
+MAX_WINDOW = 36
+
+
+def transactions(user, date_from=None, date_to=None):
+    queryset = Transaction.objects.filter(user=user)
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+    return queryset.order_by()
+
+
+def amount_cents():
+    return Cast(Round(F('amount') * 100), BigIntegerField())
+
+
+class MonthIndex(Func):
+    """Months since year 0 of a date, so consecutive months differ by one."""
+    # EXTRACT returns numeric on PostgreSQL.
+    template = 'CAST(EXTRACT(YEAR FROM %(expressions)s) * 12 + EXTRACT(MONTH FROM %(expressions)s) - 1 AS integer)'
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # Django's ExtractYear/ExtractMonth call back into Python for every row on SQLite.
+        return self.as_sql(compiler, connection, template=(
+            "(CAST(strftime('%%%%Y', %(expressions)s) AS INTEGER) * 12"
+            " + CAST(strftime('%%%%m', %(expressions)s) AS INTEGER) - 1)"), **extra_context)
+
+
+def money(value):
+    return None if value is None else round(value / 100, 2)
+
+
+def percent(value):
+    return None if value is None else round(value, 2)
+
+
+def month_start(index):
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def add_months(month, count):
+    return month_start(month.year * 12 + month.month - 1 + count)
+
+
+def monthly_rows(first_month, income, expenses, counts, averages, changes):
+    """The ``monthly`` section from per-month lists; None marks a missing average or change."""
+    rows = []
+    for i in range(len(counts)):
+        rows.append({
+            'month': add_months(first_month, i),
+            'income': money(income[i]),
+            'expenses': money(expenses[i]),
+            'savings': money(income[i] - expenses[i]),
+            'count': counts[i],
+            'income_avg': money(averages['income'][i]),
+            'expenses_avg': money(averages['expenses'][i]),
+            'savings_avg': money(averages['savings'][i]),
+            'income_yoy': percent(changes['income'][i]),
+            'expenses_yoy': percent(changes['expenses'][i]),
+        })
+    return rows
+
+
+def category_rows(user, totals, total_expenses):
+    """The ``categories`` section from (category id or 0, income, expenses, count), by expenses."""
+    categories = category_cache.in_bulk(user.pk, [category_id for category_id, *_ in totals if category_id])
+    rows = []
+    for category_id, income, expenses, count in sorted(totals, key=lambda row: (-row[2], row[0])):
+        category = categories.get(category_id)
+        rows.append({
+            'category': None if category is None else {'id': category.pk, 'name': category.name, 'type': category.type},
+            'income': money(income),
+            'expenses': money(expenses),
+            'count': count,
+            'share': round(expenses / total_expenses, 4) if total_expenses else None,
+        })
+    return rows
+
+
+def report(user, sections, window=DEFAULT_WINDOW, percentiles=DEFAULT_PERCENTILES, date_from=None, date_to=None,
+           engine=None):
+    """Compute the requested ``sections`` of the analytics report for one user."""
+    engine = engine or ('numpy' if np is not None else 'orm')
+    build = NumpyAnalytics if engine == 'numpy' else OrmAnalytics
+    analytics = build(user, date_from, date_to)
+    result = {}
+    if 'monthly' in sections:
+        result['monthly'] = analytics.monthly(window)
+    if 'categories' in sections:
+        result['categories'] = analytics.categories()
+    if 'percentiles' in sections:
+        result['percentiles'] = analytics.percentiles(percentiles)
+    return result
+
+
+class NumpyAnalytics:
+    def __init__(self, user, date_from=None, date_to=None):
+        self.user = user
+        # All-integer rows convert to a 2-D array in one call, without date objects.
+        rows = transactions(user, date_from, date_to).values_list(
+            MonthIndex('date'), amount_cents(), Coalesce('category_id', Value(0)))
+        columns = np.array(list(rows), dtype=np.int64).reshape(-1, 3).T
+        self.months, self.amounts, self.category_ids = columns
+        self.income = np.where(self.amounts > 0, self.amounts, 0)
+        self.expenses = np.where(self.amounts < 0, -self.amounts, 0)
+
+    @staticmethod
+    def sums(index, values, size):
+        # float64 sums of integer cents are exact below 2**53 cents.
+        return np.rint(np.bincount(index, weights=values, minlength=size)).astype(np.int64)
+
+    @staticmethod
+    def moving_average(values, window):
+        averages = np.full(len(values), np.nan)
+        if len(values) >= window:
+            totals = np.cumsum(values)
+            totals = np.concatenate(([0], totals))
+            averages[window - 1:] = (totals[window:] - totals[:-window]) / window
+        return averages
+
+    @staticmethod
+    def year_over_year(values):
+        changes = np.full(len(values), np.nan)
+        previous, current = values[:-12], values[12:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            changes[12:] = np.where(previous != 0, (current - previous) / previous * 100, np.nan)
+        return changes
+
+    @staticmethod
+    def as_list(values):
+        return [None if value != value else value for value in values.tolist()]
+
+    def monthly(self, window):
+        if not len(self.months):
+            return []
+        first = int(self.months.min())
+        index = self.months - first
+        size = int(index.max()) + 1
+        income = self.sums(index, self.income, size)
+        expenses = self.sums(index, self.expenses, size)
+        series = {'income': income, 'expenses': expenses, 'savings': income - expenses}
+        averages = {name: self.as_list(self.moving_average(values, window)) for name, values in series.items()}
+        changes = {name: self.as_list(self.year_over_year(series[name])) for name in ('income', 'expenses')}
+        return monthly_rows(month_start(first), income.tolist(), expenses.tolist(),
+                            np.bincount(index, minlength=size).tolist(), averages, changes)
+
+    def categories(self):
+        ids, index = np.unique(self.category_ids, return_inverse=True)
+        size = len(ids)
+        income = self.sums(index, self.income, size)
+        expenses = self.sums(index, self.expenses, size)
+        counts = np.bincount(index, minlength=size)
+        totals = list(zip(ids.tolist(), income.tolist(), expenses.tolist(), counts.tolist()))
+        return category_rows(self.user, totals, int(self.expenses.sum()))
+
+    def percentiles(self, percentiles):
+        result = {}
+        for name, values in (('income', self.amounts[self.amounts > 0]), ('expenses', -self.amounts[self.amounts < 0])):
+            points = np.percentile(values, percentiles).tolist() if len(values) else [None] * len(percentiles)
+            result[name] = {f'p{p:g}': money(point) for p, point in zip(percentiles, points)}
+        return result
+
+
+class OrmAnalytics:
+    AGGREGATES = {
+        'income': Sum('amount', filter=Q(amount__gt=0)),
+        'expenses': Sum('amount', filter=Q(amount__lt=0)),
+        'count': Count('id'),
+    }
+
+    def __init__(self, user, date_from=None, date_to=None):
+        self.user = user
+        self.queryset = transactions(user, date_from, date_to)
+
+    @staticmethod
+    def to_cents(total):
+        return int(cents(total) * 100)
+
+    @staticmethod
+    def moving_average(values, window):
+        return [sum(values[i + 1 - window:i + 1]) / window if i + 1 >= window else None for i in range(len(values))]
+
+    @staticmethod
+    def year_over_year(values):
+        return [(values[i] - values[i - 12]) / values[i - 12] * 100 if i >= 12 and values[i - 12] else None
+                for i in range(len(values))]
+
+    def monthly(self, window):
+        rows = list(self.queryset.annotate(month=TruncMonth('date')).values('month').annotate(**self.AGGREGATES)
+                    .order_by('month'))
+        if not rows:
+            return []
+        by_month = {row['month']: row for row in rows}
+        first, last = rows[0]['month'], rows[-1]['month']
+        size = (last.year - first.year) * 12 + last.month - first.month + 1
+        income, expenses, counts = [], [], []
+        for i in range(size):
+            row = by_month.get(add_months(first, i), {'income': 0, 'expenses': 0, 'count': 0})
+            income.append(self.to_cents(row['income']))
+            expenses.append(-self.to_cents(row['expenses']))
+            counts.append(row['count'])
+        savings = [i - e for i, e in zip(income, expenses)]
+        averages = {name: self.moving_average(values, window)
+                    for name, values in (('income', income), ('expenses', expenses), ('savings', savings))}
+        changes = {'income': self.year_over_year(income), 'expenses': self.year_over_year(expenses)}
+        return monthly_rows(first, income, expenses, counts, averages, changes)
+
+    def categories(self):
+        rows = self.queryset.values('category_id').annotate(**self.AGGREGATES)
+        totals = [(row['category_id'] or 0, self.to_cents(row['income']), -self.to_cents(row['expenses']), row['count'])
+                  for row in rows]
+        return category_rows(self.user, totals, sum(row[2] for row in totals))
+
+    @staticmethod
+    def percentile(values, p):
+        # Linear interpolation, computed the way numpy.percentile does.
+        position = p / 100 * (len(values) - 1)
+        low = int(position)
+        high = min(low + 1, len(values) - 1)
+        fraction = position - low
+        difference = values[high] - values[low]
+        if fraction >= 0.5:
+            return values[high] - difference * (1 - fraction)
+        return values[low] + difference * fraction
+
+    def percentiles(self, percentiles):
+        result = {}
+        for name, condition, sign in (('income', Q(amount__gt=0), 1), ('expenses', Q(amount__lt=0), -1)):
+            values = sorted(sign * value for value in self.queryset.filter(condition).values_list(amount_cents(), flat=True))
+            result[name] = {f'p{p:g}': money(self.percentile(values, p) if values else None) for p in percentiles}
+        return result
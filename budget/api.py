@@ -1,95 +1,186 @@
 from rest_framework.views import APIView
-from rest_framework import generics, permissions
+from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from django.utils.dateparse import parse_date
+from django.db import IntegrityError
 from django.db.models import Sum
-from .models import Transaction, Category, Budget, TotalBudget
+from .models import Transaction, Category, Budget, TotalBudget, UserLedger, DailyRollup, MonthlyRollup
 from .serializers import TransactionSerializer, CategorySerializer, BudgetSerializer, TotalBudgetSerializer, UserProfileSerializer
+from .pagination import TransactionCursorPagination, SearchCursorPagination, NewestFirstPagination
+from .search import search_transactions, SEARCH_RANK
+from .rows import TransactionRows, CategoryRows
+from .dashboard import Dashboard
+from . import analytics
+from .bulk import BULK_MAX_ITEMS, bulk_create_transactions, bulk_update_transactions, bulk_delete_transactions
+from .cache import cache_per_user, conditional_per_user, stats as cache_stats
+from .routers import read_from_replica
+from .renderers import FastJSONRenderer
+from .export import EXPORT_FORMATS, streaming_export_response
+from .importer import RECORD_READERS, start_import, store_upload
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.utils.decorators import method_decorator
+from django.utils import timezone
 from django.contrib.auth.models import User
-from .models import UserSettings
-from .serializers import UserSettingsSerializer
+from .models import UserSettings, ImportJob, BudgetNotification, Job
+from .serializers import UserSettingsSerializer, ImportJobSerializer, BudgetNotificationSerializer, JobSerializer
+from .jobs import result_path
+from django.http import FileResponse, Http404
+import os
 
 @method_decorator(ensure_csrf_cookie, name='dispatch')
+@method_decorator(conditional_per_user('dashboard'), name='get')
 class DashboardView(APIView):
     permission_classes = [permissions.IsAuthenticated]
-    renderer_classes = [JSONRenderer]
+    renderer_classes = [FastJSONRenderer]
 
+    @cache_per_user('dashboard')
+    @read_from_replica
     def get(self, request):
-        user = request.user
-        income = Transaction.objects.filter(user=user, amount__gt=0).aggregate(Sum('amount'))['amount__sum'] or 0
-        expenses = abs(Transaction.objects.filter(user=user, amount__lt=0).aggregate(Sum('amount'))['amount__sum'] or 0)
-        balance = income - expenses
-        recent_transactions = Transaction.objects.filter(user=user).order_by('-date', '-id')[:10]
-        budgets = Budget.objects.filter(user=user)
-        total_budget = TotalBudget.objects.filter(user=user).first()
-
-        data = {
-            'income': income,
-            'expenses': expenses,
-            'balance': balance,
-            'recent_transactions': TransactionSerializer(recent_transactions, many=True).data,
-            'budgets': BudgetSerializer(budgets, many=True).data,
-            'total_budget': TotalBudgetSerializer(total_budget).data if total_budget else None,
-        }
-        return Response(data)
-
+        return Response(Dashboard(request.user).data())
+
+def parse_date_param(request, name):
+    value = request.query_params.get(name, None)
+    if not value:
+        return None
+    try:
+        date = parse_date(value)
+    except ValueError:
+        date = None
+    if date is None:
+        raise ValidationError({name: 'Date must be in YYYY-MM-DD format.'})
+    return date
+
+def filter_transactions(request):
+    """The user's transactions filtered by the list query parameters, in list order."""
+    queryset = Transaction.objects.filter(user=request.user)
+    category = request.query_params.get('category', None)
+    date_from = parse_date_param(request, 'date_from')
+    date_to = parse_date_param(request, 'date_to')
+    
+    if category:
+        queryset = queryset.filter(category__name=category)
+    if date_from:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date__lte=date_to)
+    
+    query = request.query_params.get('q')
+    if query:
+        return search_transactions(queryset, query)
+    return queryset.order_by('-date', '-id')
+
+def transaction_paginator(request):
+    return SearchCursorPagination() if request.query_params.get('q') else TransactionCursorPagination()
+
+def transaction_rows(request, queryset):
+    # Read path skips TransactionSerializer; TransactionRows renders the same JSON.
+    if request.query_params.get('q'):
+        # The search cursor needs each row's rank.
+        return queryset.values(*TransactionRows.lookups, SEARCH_RANK)
+    return TransactionRows.values(queryset)
+
+@method_decorator(conditional_per_user('transactions'), name='get')
 class TransactionListCreateView(generics.ListCreateAPIView):
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
-    renderer_classes = [JSONRenderer]
+    renderer_classes = [FastJSONRenderer]
+    pagination_class = TransactionCursorPagination
 
     def get_queryset(self):
-        queryset = Transaction.objects.filter(user=self.request.user)
-        category = self.request.query_params.get('category', None)
-        date_from = self.request.query_params.get('date_from', None)
-        date_to = self.request.query_params.get('date_to', None)
-        
-        if category:
-            queryset = queryset.filter(category__name=category)
-        if date_from and date_to:
-            queryset = queryset.filter(date__range=[date_from, date_to])
-        
-        return queryset.order_by('-date', '-id')
+        if self.request.method == 'GET':
+            return filter_transactions(self.request)
+        return Transaction.objects.filter(user=self.request.user)
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            self._paginator = transaction_paginator(self.request)
+        return self._paginator
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(transaction_rows(request, self.get_queryset()))
+        return self.get_paginated_response(TransactionRows.serialize(page))
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+class TransactionBulkView(APIView):
+    """POST a list to create, PATCH a list of {"id", ...} to update, DELETE a list of ids."""
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [FastJSONRenderer]
+
+    def get_items(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of items.']})
+        if len(items) > BULK_MAX_ITEMS:
+            raise ValidationError({'non_field_errors': [f'At most {BULK_MAX_ITEMS} items per request.']})
+        return items
+
+    def respond(self, results, errors, success=status.HTTP_200_OK):
+        code = status.HTTP_400_BAD_REQUEST if errors and not results else success
+        return Response({'results': results, 'errors': errors}, status=code)
+
+    def write(self, func, request):
+        try:
+            return func(request.user, self.get_items(request))
+        except IntegrityError:
+            # A category was deleted after the batch was validated.
+            raise ValidationError({'category_id': ['A category in this batch no longer exists.']})
+
+    def post(self, request):
+        created, errors = self.write(bulk_create_transactions, request)
+        return self.respond(TransactionSerializer(created, many=True).data, errors, status.HTTP_201_CREATED)
+
+    def patch(self, request):
+        updated, errors = self.write(bulk_update_transactions, request)
+        return self.respond(TransactionSerializer(updated, many=True).data, errors)
+
+    def delete(self, request):
+        deleted, errors = bulk_delete_transactions(request.user, self.get_items(request))
+        return self.respond(deleted, errors)
+
 class TransactionDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = TransactionSerializer
     permission_classes = [permissions.IsAuthenticated]
-    renderer_classes = [JSONRenderer]
+    renderer_classes = [FastJSONRenderer]
 
     def get_queryset(self):
         return Transaction.objects.filter(user=self.request.user)
 
+@method_decorator(conditional_per_user('categories'), name='get')
 class CategoryListCreateView(generics.ListCreateAPIView):
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
-    renderer_classes = [JSONRenderer]
+    renderer_classes = [FastJSONRenderer]
 
     def get_queryset(self):
         return Category.objects.filter(user=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        return Response(CategoryRows.serialize(CategoryRows.values(self.get_queryset())))
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 class CategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
-    renderer_classes = [JSONRenderer]
+    renderer_classes = [FastJSONRenderer]
 
     def get_queryset(self):
         return Category.objects.filter(user=self.request.user)
 
+@method_decorator(conditional_per_user('budgets'), name='get')
 class BudgetListCreateView(generics.ListCreateAPIView):
     serializer_class = BudgetSerializer
     permission_classes = [permissions.IsAuthenticated]
-    renderer_classes = [JSONRenderer]
+    renderer_classes = [FastJSONRenderer]
 
     def get_queryset(self):
-        return Budget.objects.filter(user=self.request.user)
+        return Budget.objects.filter(user=self.request.user).with_remaining()
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -97,7 +188,7 @@ class BudgetListCreateView(generics.ListCreateAPIView):
 class BudgetDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = BudgetSerializer
     permission_classes = [permissions.IsAuthenticated]
-    renderer_classes = [JSONRenderer]
+    renderer_classes = [FastJSONRenderer]
 
     def get_queryset(self):
         return Budget.objects.filter(user=self.request.user)
@@ -105,7 +196,7 @@ class BudgetDetailView(generics.RetrieveUpdateDestroyAPIView):
 class UserProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
-    renderer_classes = [JSONRenderer]
+    renderer_classes = [FastJSONRenderer]
 
     def get_object(self):
         return self.request.user
@@ -128,30 +219,138 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 
 class StatisticsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
-    renderer_classes = [JSONRenderer]
+    renderer_classes = [FastJSONRenderer]
 
+    @cache_per_user('statistics')
+    @read_from_replica
     def get(self, request):
         user = request.user
-        total_income = Transaction.objects.filter(user=user, amount__gt=0).aggregate(Sum('amount'))['amount__sum'] or 0
-        total_expenses = abs(Transaction.objects.filter(user=user, amount__lt=0).aggregate(Sum('amount'))['amount__sum'] or 0)
-        savings_rate = (total_income - total_expenses) / total_income * 100 if total_income > 0 else 0
-        
+        ledger = UserLedger.for_user(user)
+        data = {
+            'total_income': ledger.total_income,
+            'total_expenses': ledger.total_expenses,
+            'savings_rate': ledger.savings_rate,
+        }
+        data.update(analytics_report(request))
+        return Response(data)
+
+def analytics_report(request):
+    """The analytics sections asked for with ``include``, or nothing."""
+    sections = analytics_sections(request)
+    if not sections:
+        return {}
+    return analytics.report(
+        request.user, sections, window=analytics_window(request), percentiles=analytics_percentiles(request),
+        date_from=parse_date_param(request, 'date_from'), date_to=parse_date_param(request, 'date_to'),
+    )
+
+def analytics_sections(request):
+    sections = [name for name in request.query_params.get('include', '').split(',') if name]
+    unknown = set(sections) - set(analytics.ANALYTICS_SECTIONS)
+    if unknown:
+        raise ValidationError({'include': f'Choose from: {", ".join(analytics.ANALYTICS_SECTIONS)}.'})
+    return sections
+
+def analytics_window(request):
+    window = request.query_params.get('window', str(analytics.DEFAULT_WINDOW))
+    if not window.isdigit() or not 1 <= int(window) <= analytics.MAX_WINDOW:
+        raise ValidationError({'window': f'Window must be a number of months from 1 to {analytics.MAX_WINDOW}.'})
+    return int(window)
+
+def analytics_percentiles(request):
+    value = request.query_params.get('percentiles')
+    if not value:
+        return analytics.DEFAULT_PERCENTILES
+    try:
+        percentiles = [float(p) for p in value.split(',')]
+    except ValueError:
+        percentiles = None
+    if not percentiles or len(percentiles) > 10 or not all(0 <= p <= 100 for p in percentiles):
+        raise ValidationError({'percentiles': 'Give up to 10 comma-separated numbers from 0 to 100.'})
+    return percentiles
+
+TIMESERIES_PERIODS = {'day': DailyRollup, 'month': MonthlyRollup}
+
+class TimeseriesStatisticsView(APIView):
+    """Income, expenses and savings per day or month, read from the rollup tables."""
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [FastJSONRenderer]
+
+    @cache_per_user('statistics_timeseries')
+    @read_from_replica
+    def get(self, request):
+        period = request.query_params.get('period', 'month')
+        model = TIMESERIES_PERIODS.get(period)
+        if model is None:
+            raise ValidationError({'period': f'Choose one of: {", ".join(TIMESERIES_PERIODS)}.'})
+        rollups = model.objects.filter(user=request.user, transaction_count__gt=0)
+        date_from = parse_date_param(request, 'date_from')
+        date_to = parse_date_param(request, 'date_to')
+        if date_from:
+            # Monthly buckets are keyed by their first day, so a mid-month start keeps its month.
+            rollups = rollups.filter(period__gte=model.bucket(date_from))
+        if date_to:
+            rollups = rollups.filter(period__lte=date_to)
+        category = request.query_params.get('category')
+        if category:
+            if not category.isdigit():
+                raise ValidationError({'category': 'Category must be an id.'})
+            rollups = rollups.filter(category_id=int(category))
+
+        totals = {'income': Sum('income'), 'expenses': Sum('expenses'), 'count': Sum('transaction_count')}
+        series = rollups.order_by('period').values('period').annotate(**totals)
+        categories = rollups.order_by('category_id').values('category_id', 'category__name', 'category__type').annotate(**totals)
         return Response({
-            'total_income': total_income,
-            'total_expenses': total_expenses,
-            'savings_rate': round(savings_rate, 2),
+            'period': period,
+            'series': [
+                {
+                    'period': row['period'],
+                    'income': row['income'],
+                    'expenses': row['expenses'],
+                    'savings': row['income'] - row['expenses'],
+                    'count': row['count'],
+                }
+                for row in series
+            ],
+            'categories': [
+                {
+                    'category': None if row['category_id'] is None else {
+                        'id': row['category_id'],
+                        'name': row['category__name'],
+                        'type': row['category__type'],
+                    },
+                    'income': row['income'],
+                    'expenses': row['expenses'],
+                    'count': row['count'],
+                }
+                for row in categories
+            ],
         })
 
+def streaming_export(request, output):
+    if output not in EXPORT_FORMATS:
+        raise ValidationError({'output': f'Choose one of: {", ".join(EXPORT_FORMATS)}.'})
+    compress = request.query_params.get('compress')
+    if compress not in (None, '', 'gzip'):
+        raise ValidationError({'compress': 'Only gzip is supported.'})
+    return streaming_export_response(request.user, output, compress=bool(compress))
+
 class ExportDataView(APIView):
     permission_classes = [permissions.IsAuthenticated]
-    renderer_classes = [JSONRenderer]
+    renderer_classes = [FastJSONRenderer]
 
+    @read_from_replica
     def get(self, request):
         user = request.user
+        output = request.query_params.get('output')
+        if request.query_params.get('background') in ('1', 'true'):
+            return enqueue_job(request, 'export', {'output': output or 'json'})
+        if output:
+            return streaming_export(request, output)
         transactions = TransactionSerializer(Transaction.objects.filter(user=user), many=True).data
         categories = CategorySerializer(Category.objects.filter(user=user), many=True).data
-        budgets = BudgetSerializer(Budget.objects.filter(user=user), many=True).data
-        total_budget = TotalBudgetSerializer(TotalBudget.objects.filter(user=user).first()).data
+        budgets = BudgetSerializer(Budget.objects.filter(user=user).with_remaining(), many=True).data
+        total_budget = TotalBudgetSerializer(TotalBudget.objects.filter(user=user).with_remaining().first()).data
         
         export_data = {
             'transactions': transactions,
@@ -161,20 +360,132 @@ class ExportDataView(APIView):
         }
         return Response(export_data)
 
+IMPORT_CONTENT_TYPES = {
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'text/csv': 'csv',
+}
+
+def import_format(request, filename=''):
+    requested = request.query_params.get('input')
+    if requested:
+        if requested not in RECORD_READERS:
+            raise ValidationError({'input': f'Choose one of: {", ".join(RECORD_READERS)}.'})
+        return requested
+    name = filename.lower().removesuffix('.gz')
+    for extension in RECORD_READERS:
+        if name.endswith(f'.{extension}'):
+            return extension
+    content_type = request.content_type.split(';')[0].strip()
+    if content_type in IMPORT_CONTENT_TYPES:
+        return IMPORT_CONTENT_TYPES[content_type]
+    raise ValidationError({'input': f'Cannot tell the file format, pass ?input={"|".join(RECORD_READERS)}.'})
+
 class ImportDataView(APIView):
     permission_classes = [permissions.IsAuthenticated]
-    renderer_classes = [JSONRenderer]
+    renderer_classes = [FastJSONRenderer]
+    parser_classes = [MultiPartParser]
 
     def post(self, request):
-        # Здесь добавьте логику для импорта данных пользователя
-        return Response({'message': 'Data import functionality not implemented yet'})
+        # Multipart uploads arrive as a file; anything else is read straight from the body.
+        if request.content_type.startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                raise ValidationError({'file': 'No file was submitted.'})
+            input_format = import_format(request, upload.name)
+            path, size = store_upload(upload.chunks())
+        else:
+            input_format = import_format(request)
+            stream = request.stream
+            path, size = store_upload(iter(lambda: stream.read(64 * 1024), b'') if stream else [])
+        if not size:
+            os.remove(path)
+            raise ValidationError({'file': 'The submitted file is empty.'})
+
+        job = ImportJob.objects.create(user=request.user, format=input_format, size=size)
+        job = start_import(job, path)
+        code = status.HTTP_202_ACCEPTED if job.status == 'pending' else status.HTTP_200_OK
+        return Response(ImportJobSerializer(job).data, status=code)
+
+class ImportJobDetailView(generics.RetrieveAPIView):
+    serializer_class = ImportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [FastJSONRenderer]
+
+    def get_queryset(self):
+        return ImportJob.objects.filter(user=self.request.user)
+
+
+class NotificationListView(generics.ListAPIView):
+    serializer_class = BudgetNotificationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [FastJSONRenderer]
+    pagination_class = NewestFirstPagination
+
+    def get_queryset(self):
+        queryset = BudgetNotification.objects.filter(user=self.request.user).select_related('budget')
+        if self.request.query_params.get('unread') in ('1', 'true'):
+            queryset = queryset.filter(read_at__isnull=True)
+        return queryset
+
+class NotificationReadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [FastJSONRenderer]
+
+    def post(self, request):
+        notifications = BudgetNotification.objects.filter(user=request.user, read_at__isnull=True)
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if ids is not None:
+            if not isinstance(ids, list) or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+                raise ValidationError({'ids': 'Give a list of notification IDs.'})
+            notifications = notifications.filter(pk__in=ids)
+        return Response({'updated': notifications.update(read_at=timezone.now())})
+
+
+def enqueue_job(request, kind, params):
+    serializer = JobSerializer(data={'kind': kind, 'params': params}, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+    job = serializer.save(user=request.user)
+    return Response(JobSerializer(job, context={'request': request}).data, status=status.HTTP_202_ACCEPTED)
+
+class JobListCreateView(generics.ListCreateAPIView):
+    serializer_class = JobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [FastJSONRenderer]
+    pagination_class = NewestFirstPagination
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        return enqueue_job(request, request.data.get('kind'), request.data.get('params') or {})
+
+class JobDetailView(generics.RetrieveAPIView):
+    serializer_class = JobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    renderer_classes = [FastJSONRenderer]
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+
+class JobResultView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        job = Job.objects.filter(user=request.user, pk=pk, status='done').first()
+        path = result_path(job) if job else None
+        if path is None or not path.exists():
+            raise Http404('This job has no result file.')
+        return FileResponse(path.open('rb'), as_attachment=True, filename=job.result['filename'],
+                            content_type='application/gzip')
 
 
 class UserListView(generics.ListAPIView):
     queryset = User.objects.all()
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
-    renderer_classes = [JSONRenderer]
+    renderer_classes = [FastJSONRenderer]
 
 
 class UserSettingsView(generics.RetrieveUpdateAPIView):
@@ -185,4 +496,13 @@ class UserSettingsView(generics.RetrieveUpdateAPIView):
         return UserSettings.objects.get_or_create(user=self.request.user)[0]
 
     def perform_update(self, serializer):
-        serializer.save(user=self.request.user)    
\ No newline at end of file
+        serializer.save(user=self.request.user)
+
+
+class CacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+    renderer_classes = [FastJSONRenderer]
+
+    def get(self, request):
+        return Response(cache_stats.snapshot())
+
@@ -0,0 +1,115 @@
+"""Async variants of the read-heavy API endpoints, for deployment under ASGI.
+
+Django's async ORM still runs a request's queries one at a time on a single
+thread, so the dashboard sends its independent queries to worker threads, each
+with its own database connection, and awaits them together. Set
+BUDGET_ASYNC_PARALLEL_QUERIES = False to run them one after another instead.
+"""
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse, HttpResponseNotAllowed
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import exception_handler
+from .api import analytics_report, filter_transactions, transaction_paginator, transaction_rows
+from .cache import cache_per_user
+from .dashboard import Dashboard
+from .renderers import FastJSONRenderer
+from .models import UserLedger
+from .routers import read_from_replica
+from .rows import TransactionRows
+
+
+def _in_worker(func):
+    def run():
+        try:
+            return func()
+        finally:
+            # Worker threads are pooled; don't keep their connections past CONN_MAX_AGE.
+            close_old_connections()
+    return run
+
+
+async def run_queries(*funcs):
+    """Call independent, query-running functions concurrently and return their results in order."""
+    if getattr(settings, 'BUDGET_ASYNC_PARALLEL_QUERIES', True):
+        return await asyncio.gather(*(sync_to_async(_in_worker(func), thread_sensitive=False)() for func in funcs))
+    return [await sync_to_async(func)() for func in funcs]
+
+
+def render(response):
+    if not isinstance(response, Response):
+        return response
+    rendered = HttpResponse(FastJSONRenderer().render(response.data), status=response.status_code,
+                            content_type='application/json')
+    for header, value in response.items():
+        if header.lower() != 'content-type':
+            rendered[header] = value
+    return rendered
+
+
+def async_api_view(view):
+    """A GET-only async view with the project's DRF authentication, IsAuthenticated and error responses."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return HttpResponseNotAllowed(['GET'])
+        authenticators = [authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+        drf_request = Request(request, authenticators=authenticators)
+        try:
+            user = await sync_to_async(lambda: drf_request.user)()
+            if not user.is_authenticated:
+                raise exceptions.NotAuthenticated()
+            response = await view(drf_request, *args, **kwargs)
+        except exceptions.APIException as exc:
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                # Same rule as APIView.handle_exception.
+                header = authenticators[0].authenticate_header(drf_request) if authenticators else None
+                if header:
+                    exc.auth_header = header
+                else:
+                    exc.status_code = 403
+            response = exception_handler(exc, {'request': drf_request})
+        return render(response)
+    return wrapper
+
+
+@async_api_view
+@cache_per_user('dashboard')
+@read_from_replica
+async def dashboard(request):
+    dashboard = Dashboard(request.user, load=False)
+    (dashboard.ledger, dashboard.total_budget), dashboard.budgets, recent = await run_queries(
+        dashboard.load_ledger, dashboard.load_budgets, dashboard.recent_transaction_rows)
+    await sync_to_async(dashboard.annotate_remaining)()
+    return Response(dashboard.data(recent))
+
+
+@async_api_view
+@cache_per_user('statistics')
+@read_from_replica
+async def statistics(request):
+    ledger = await UserLedger.objects.filter(user=request.user).afirst()
+    if ledger is None:
+        ledger = await sync_to_async(UserLedger.for_user)(request.user)
+    data = {
+        'total_income': ledger.total_income,
+        'total_expenses': ledger.total_expenses,
+        'savings_rate': ledger.savings_rate,
+    }
+    if request.query_params.get('include'):
+        data.update(await sync_to_async(analytics_report)(request))
+    return Response(data)
+
+
+@async_api_view
+async def transactions(request):
+    paginator = transaction_paginator(request)
+    rows = await paginator.apaginate_queryset(transaction_rows(request, filter_transactions(request)), request)
+    return paginator.get_paginated_response(TransactionRows.serialize(rows))
@@ -0,0 +1,128 @@
+"""Authentication that resolves users from a cache instead of the database.
+
+Session, token and JWT authentication each read the user row on every
+request. Here the user fields authentication needs (not the password hash)
+are kept in the BUDGET_AUTH_CACHE_ALIAS cache for
+BUDGET_AUTH_CACHE_TIMEOUT seconds, and DRF token keys map to user ids in the
+same cache. Together with the cached_db session engine, a request from a
+cached user runs no authentication queries.
+
+Saving or deleting a user (deactivating, changing the password) and deleting
+a token invalidate the entries; see budget.signals. Changes made with
+QuerySet.update() bypass the signals and show up once the entry expires.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+AUTH_CACHE_TIMEOUT = 60
+# What authentication and permission checks read; the rest of the row stays out of the shared cache.
+AUTH_USER_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+
+def get_cache():
+    return caches[getattr(settings, 'BUDGET_AUTH_CACHE_ALIAS', 'default')]
+
+
+def cache_timeout():
+    return getattr(settings, 'BUDGET_AUTH_CACHE_TIMEOUT', AUTH_CACHE_TIMEOUT)
+
+
+def user_key(user_id):
+    return f'budget:auth:user-fields:{user_id}'
+
+
+def token_key(key):
+    # Never put the credential itself in a cache key.
+    return f'budget:auth:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def get_cached_user(user_id):
+    """The user with this id, from the cache when possible, or None.
+
+    Only AUTH_USER_FIELDS and the session hash are cached, never the password
+    hash. Other fields are deferred and load from the database when read.
+    """
+    User = get_user_model()
+    cache = get_cache()
+    key = user_key(user_id)
+    cached = cache.get(key)
+    if cached is None:
+        user = User._default_manager.filter(pk=user_id).only(*AUTH_USER_FIELDS, 'password').first()
+        if user is None:
+            return None
+        cached = ({field: getattr(user, field) for field in AUTH_USER_FIELDS}, user.get_session_auth_hash())
+        cache.set(key, cached, cache_timeout())
+    fields, session_hash = cached
+    # from_db takes the values in field order.
+    names = [field.attname for field in User._meta.concrete_fields if field.attname in fields]
+    user = User.from_db(DEFAULT_DB_ALIAS, names, [fields[name] for name in names])
+    # Session authentication compares this on every request; computing it needs the password.
+    user.get_session_auth_hash = lambda: session_hash
+    return user
+
+
+def invalidate_user(user_id):
+    get_cache().delete(user_key(user_id))
+
+
+def invalidate_token(key):
+    get_cache().delete(token_key(key))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose per-request session lookup uses the user cache."""
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        cache = get_cache()
+        cache_key = token_key(key)
+        user_id = cache.get(cache_key)
+        if user_id is None:
+            user_id = self.get_model().objects.filter(key=key).values_list('user_id', flat=True).first()
+            if user_id is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            cache.set(cache_key, user_id, cache_timeout())
+
+        user = get_cached_user(user_id)
+        if user is None or not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return (user, key)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        if jwt_settings.USER_ID_FIELD == 'id':
+            user = get_cached_user(user_id)
+        else:
+            user = self.user_model.objects.filter(**{jwt_settings.USER_ID_FIELD: user_id}).first()
+        if user is None:
+            raise exceptions.AuthenticationFailed(_('User not found'), code='user_not_found')
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if jwt_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(jwt_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise exceptions.AuthenticationFailed(
+                    _("The user's password has been changed."), code='password_changed')
+        return user
@@ -0,0 +1,131 @@
+"""Create, update and delete many transactions per request.
+
+Each batch is validated in one pass, resolves its categories from the per-user
+category cache and is written with bulk_create/bulk_update/delete in one database
+transaction. Invalid items are reported by index and skipped; the rest of
+the batch is still written.
+"""
+from django.db import transaction
+from .models import Transaction
+from .categories import category_cache
+from .serializers import BulkTransactionSerializer
+
+BULK_MAX_ITEMS = 1000
+UPDATE_FIELDS = ('amount', 'date', 'description', 'category_id')
+
+
+class BulkBatch:
+    def __init__(self, user, items):
+        self.user = user
+        self.items = items
+        self.errors = []
+
+    def error(self, index, errors):
+        self.errors.append({'index': index, 'errors': errors})
+
+    def validate(self, partial=False):
+        valid = []
+        for index, item in enumerate(self.items):
+            serializer = BulkTransactionSerializer(data=item, partial=partial)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                self.error(index, serializer.errors)
+        return valid
+
+    def categories(self, category_ids):
+        return category_cache.in_bulk(self.user.pk, category_ids)
+
+    def missing_category(self, index, category_id):
+        self.error(index, {'category_id': [f'Invalid pk "{category_id}" - object does not exist.']})
+
+    def sorted_errors(self):
+        return sorted(self.errors, key=lambda error: error['index'])
+
+
+def normalize_amount(transaction_obj):
+    # Same rule as Transaction.save, which bulk writes skip.
+    if transaction_obj.category and transaction_obj.category.type == 'expense' and transaction_obj.amount > 0:
+        transaction_obj.amount = -transaction_obj.amount
+
+
+def bulk_create_transactions(user, items):
+    """Return (created transactions, errors)."""
+    batch = BulkBatch(user, items)
+    valid = batch.validate()
+    categories = batch.categories({data['category_id'] for _, data in valid})
+    objs = []
+    for index, data in valid:
+        category = categories.get(data['category_id'])
+        if category is None:
+            batch.missing_category(index, data['category_id'])
+            continue
+        obj = Transaction(user=user, amount=data['amount'], date=data['date'],
+                          description=data['description'], category=category)
+        normalize_amount(obj)
+        objs.append(obj)
+    with transaction.atomic():
+        created = Transaction.objects.bulk_create(objs)
+    return created, batch.sorted_errors()
+
+
+def bulk_update_transactions(user, items):
+    """Apply partial updates keyed by "id"; return (updated transactions, errors)."""
+    batch = BulkBatch(user, items)
+    valid, seen = [], set()
+    for index, data in batch.validate(partial=True):
+        if 'id' not in data:
+            batch.error(index, {'id': ['This field is required.']})
+        elif data['id'] in seen:
+            batch.error(index, {'id': ['Duplicate id in batch.']})
+        else:
+            seen.add(data['id'])
+            valid.append((index, data))
+
+    with transaction.atomic():
+        existing = Transaction.objects.filter(user=user, pk__in=seen).select_for_update().in_bulk()
+        category_ids = {obj.category_id for obj in existing.values()} | {
+            data['category_id'] for _, data in valid if 'category_id' in data}
+        categories = batch.categories(category_ids - {None})
+
+        objs, fields = [], set()
+        for index, data in valid:
+            obj = existing.get(data['id'])
+            if obj is None:
+                batch.error(index, {'id': ['Not found.']})
+                continue
+            if 'category_id' in data and data['category_id'] not in categories:
+                batch.missing_category(index, data['category_id'])
+                continue
+            for field in UPDATE_FIELDS:
+                if field in data:
+                    setattr(obj, field, data[field])
+                    fields.add(field)
+            obj.category = categories.get(obj.category_id)
+            amount = obj.amount
+            normalize_amount(obj)
+            if obj.amount != amount:
+                fields.add('amount')
+            objs.append(obj)
+        if objs and fields:
+            Transaction.objects.bulk_update(objs, sorted(fields))
+    return objs, batch.sorted_errors()
+
+
+def bulk_delete_transactions(user, ids):
+    """Delete transactions by id; return (deleted ids, errors)."""
+    batch = BulkBatch(user, ids)
+    wanted = {}
+    for index, pk in enumerate(ids):
+        if isinstance(pk, bool) or not isinstance(pk, int):
+            batch.error(index, {'id': ['A valid integer is required.']})
+        else:
+            wanted.setdefault(pk, index)
+    with transaction.atomic():
+        found = set(Transaction.objects.filter(user=user, pk__in=wanted).values_list('pk', flat=True))
+        for pk, index in wanted.items():
+            if pk not in found:
+                batch.error(index, {'id': ['Not found.']})
+        if found:
+            Transaction.objects.filter(pk__in=found).delete()
+    return [pk for pk in wanted if pk in found], batch.sorted_errors()
@@ -0,0 +1,171 @@
+import functools
+import hashlib
+import threading
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpRequest, HttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+from rest_framework.request import Request
+from rest_framework.response import Response
+from .models import DataVersion
+
+RESPONSE_CACHE_TIMEOUT = 300
+
+
+class CacheStats:
+    """In-process hit/miss counters per endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+
+    def record(self, endpoint, outcome):
+        with self._lock:
+            self._counts[(endpoint, outcome)] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        endpoints = sorted({endpoint for endpoint, _ in counts})
+        return {
+            endpoint: {'hits': counts.get((endpoint, 'hit'), 0), 'misses': counts.get((endpoint, 'miss'), 0)}
+            for endpoint in endpoints
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+stats = CacheStats()
+
+
+def get_cache():
+    return caches[getattr(settings, 'BUDGET_RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def data_version(request):
+    """The user's DataVersion, read once per request."""
+    version = getattr(request, '_budget_data_version', None)
+    if version is None:
+        version = request._budget_data_version = DataVersion.for_user(request.user)
+    return version
+
+
+def response_cache_key(request, endpoint, kwargs):
+    version = data_version(request)
+    # Remaining budgets depend on today's date, so yesterday's entries must not be served.
+    params = sorted(request.GET.lists()) + sorted(kwargs.items())
+    digest = hashlib.md5(repr(params).encode('utf-8')).hexdigest()
+    return f'budget:response:{request.user.pk}:{version.token}:{timezone.now().date()}:{endpoint}:{digest}'
+
+
+def cached_response(cached):
+    kind, payload, content_type = cached
+    if kind == 'data':
+        return Response(payload)
+    return HttpResponse(payload, content_type=content_type)
+
+
+def cache_entry(response):
+    """What to store for a response, or None when it must not be cached."""
+    if response.status_code != 200:
+        return None
+    if isinstance(response, Response):
+        return ('data', response.data, None)
+    if not response.streaming:
+        return ('content', response.content, response['Content-Type'])
+    return None
+
+
+def cache_timeout():
+    return getattr(settings, 'BUDGET_RESPONSE_CACHE_TIMEOUT', RESPONSE_CACHE_TIMEOUT)
+
+
+def cache_per_user(endpoint):
+    """Cache a GET handler's result per (user, data version, endpoint, params).
+
+    Works on DRF handlers (caches ``response.data``), plain Django views
+    (caches the rendered content) and async views.
+    """
+    def decorator(view):
+        def find_request(args):
+            # Function views get (request, ...); methods get (self, request, ...).
+            return next(arg for arg in args if isinstance(arg, (HttpRequest, Request)))
+
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                request = find_request(args)
+                if request.method != 'GET' or not request.user.is_authenticated:
+                    return await view(*args, **kwargs)
+
+                cache = get_cache()
+                key = await sync_to_async(response_cache_key)(request, endpoint, kwargs)
+                cached = await cache.aget(key)
+                if cached is not None:
+                    stats.record(endpoint, 'hit')
+                    return cached_response(cached)
+
+                stats.record(endpoint, 'miss')
+                response = await view(*args, **kwargs)
+                entry = cache_entry(response)
+                if entry is not None:
+                    await cache.aset(key, entry, cache_timeout())
+                return response
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            request = find_request(args)
+            if request.method != 'GET' or not request.user.is_authenticated:
+                return view(*args, **kwargs)
+
+            cache = get_cache()
+            key = response_cache_key(request, endpoint, kwargs)
+            cached = cache.get(key)
+            if cached is not None:
+                stats.record(endpoint, 'hit')
+                return cached_response(cached)
+
+            stats.record(endpoint, 'miss')
+            response = view(*args, **kwargs)
+            entry = cache_entry(response)
+            if entry is not None:
+                cache.set(key, entry, cache_timeout())
+            return response
+        return wrapper
+    return decorator
+
+
+def conditional_per_user(endpoint):
+    """Answer a GET whose If-None-Match still matches with 304.
+
+    The ETag hashes the response cache key (user, data version, date, endpoint,
+    params), so checking it costs one DataVersion read and runs no view code.
+    No Last-Modified is sent: its one-second granularity would answer 304 to a
+    client that fetched just before a second write in the same second.
+    Use with ``method_decorator`` on the handler, after authentication.
+    """
+    def etag(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return None
+        return hashlib.md5(response_cache_key(request, endpoint, kwargs).encode('utf-8')).hexdigest()
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag)(view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.has_header('ETag'):
+                # Browsers keep the body but revalidate before every use.
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,86 @@
+"""In-process, per-user category cache for the transaction write path.
+
+Each entry remembers the user's category version from the shared
+BUDGET_CATEGORY_CACHE_ALIAS cache, and is reloaded once that version moves.
+Category saves and deletes move it, and again when their transaction
+commits (see budget.signals), so every process sees a changed type or a
+deleted category on its next lookup. Entries are also reloaded after
+BUDGET_CATEGORY_CACHE_TIMEOUT seconds, for changes made with QuerySet.update(),
+which send no signals.
+"""
+import threading
+import time
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+CATEGORY_CACHE_TIMEOUT = 60
+
+
+def version_key(user_id):
+    return f'budget:categories:version:{user_id}'
+
+
+class CategoryCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'BUDGET_CATEGORY_CACHE_TIMEOUT', CATEGORY_CACHE_TIMEOUT)
+
+    @property
+    def shared(self):
+        return caches[getattr(settings, 'BUDGET_CATEGORY_CACHE_ALIAS', 'default')]
+
+    def _fields(self, user_id):
+        now = time.monotonic()
+        # Read before the categories, so a change committed in between makes the entry stale.
+        version = self.shared.get(version_key(user_id))
+        with self._lock:
+            entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > now and entry[1] == version:
+            return entry[2]
+        Category = apps.get_model('budget', 'Category')
+        fields = {pk: (name, category_type) for pk, name, category_type in
+                  Category.objects.filter(user_id=user_id).values_list('pk', 'name', 'type')}
+        with self._lock:
+            self._entries[user_id] = (now + self.timeout, version, fields)
+        return fields
+
+    def _category(self, user_id, fields, pk):
+        try:
+            name, category_type = fields[int(pk)]
+        except (KeyError, TypeError, ValueError):
+            return None
+        Category = apps.get_model('budget', 'Category')
+        return Category.from_db(DEFAULT_DB_ALIAS, ['id', 'name', 'type', 'user_id'], [int(pk), name, category_type, user_id])
+
+    def get(self, user_id, pk):
+        """A fresh Category for one of the user's categories, or None."""
+        return self._category(user_id, self._fields(user_id), pk)
+
+    def in_bulk(self, user_id, pks):
+        fields = self._fields(user_id)
+        return {pk: category for pk in pks if (category := self._category(user_id, fields, pk)) is not None}
+
+    def invalidate(self, user_id):
+        self._bump(user_id)
+        # Another process may reload before the change commits; move the version again once it has.
+        transaction.on_commit(lambda: self._bump(user_id))
+
+    def _bump(self, user_id):
+        self.shared.set(version_key(user_id), uuid.uuid4().hex, None)
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+category_cache = CategoryCache()
@@ -0,0 +1,107 @@
+from django.db.models import Q, Sum
+from django.utils import timezone
+from .models import Transaction, Budget, TotalBudget, UserLedger
+from .rows import TransactionRows
+from .serializers import BudgetSerializer, TotalBudgetSerializer
+
+RECENT_TRANSACTIONS = 10
+
+
+class Dashboard:
+    """Everything the dashboards show, loaded in a fixed number of queries.
+
+    1. the ledger totals, joined with the total budget;
+    2. the budgets with their categories;
+    3. one aggregate with a filtered Sum per active budget and for the total budget;
+    4. the recent transactions.
+    """
+
+    def __init__(self, user, load=True):
+        self.user = user
+        self.today = timezone.now().date()
+        if load:
+            self.ledger, self.total_budget = self.load_ledger()
+            self.budgets = self.load_budgets()
+            self.annotate_remaining()
+
+    def load_ledger(self):
+        """Return (ledger, total budget or None)."""
+        ledger = UserLedger.objects.filter(user=self.user).select_related('user__totalbudget').first()
+        if ledger is None:
+            ledger = UserLedger.for_user(self.user)
+        try:
+            return ledger, ledger.user.totalbudget
+        except TotalBudget.DoesNotExist:
+            return ledger, None
+
+    def load_budgets(self):
+        return list(Budget.objects.filter(user=self.user).select_related('category'))
+
+    @property
+    def income(self):
+        return self.ledger.total_income
+
+    @property
+    def expenses(self):
+        return self.ledger.total_expenses
+
+    @property
+    def balance(self):
+        return self.ledger.balance
+
+    def is_active(self, budget):
+        return budget.start_date <= self.today <= budget.end_date
+
+    def annotate_remaining(self):
+        """Set ``annotated_remaining`` the way BudgetQuerySet.with_remaining would."""
+        active = [budget for budget in self.budgets if self.is_active(budget)]
+        total_active = self.total_budget is not None and self.is_active(self.total_budget)
+        spend = {
+            f'budget_{budget.pk}': Sum('amount', filter=Q(category_id=budget.category_id, date__gte=budget.start_date))
+            for budget in active
+        }
+        if total_active:
+            spend['total'] = Sum('amount', filter=Q(date__gte=self.total_budget.start_date))
+        spent = {}
+        if spend:
+            earliest = min(budget.start_date for budget in active + ([self.total_budget] if total_active else []))
+            spent = Transaction.objects.filter(
+                user=self.user, date__gte=earliest, date__lte=self.today,
+            ).aggregate(**spend)
+
+        for budget in self.budgets:
+            budget.annotated_remaining = budget.amount + (spent.get(f'budget_{budget.pk}') or 0)
+        if self.total_budget is not None:
+            self.total_budget.annotated_remaining = self.total_budget.amount + (spent.get('total') or 0)
+
+    def recent_transactions(self):
+        return (Transaction.objects.filter(user=self.user).select_related('category')
+                .order_by('-date', '-id')[:RECENT_TRANSACTIONS])
+
+    def recent_transaction_rows(self):
+        queryset = Transaction.objects.filter(user=self.user).order_by('-date', '-id')[:RECENT_TRANSACTIONS]
+        return TransactionRows.serialize(TransactionRows.values(queryset))
+
+    def context(self):
+        """Template context for budget/dashboard.html."""
+        return {
+            'income': self.income,
+            'expenses': self.expenses,
+            'balance': self.balance,
+            'recent_transactions': self.recent_transactions(),
+            'budgets': self.budgets,
+            'total_budget': self.total_budget,
+        }
+
+    def data(self, recent_transaction_rows=None):
+        """The JSON dashboard payload."""
+        if recent_transaction_rows is None:
+            recent_transaction_rows = self.recent_transaction_rows()
+        return {
+            'income': self.income,
+            'expenses': self.expenses,
+            'balance': self.balance,
+            'recent_transactions': recent_transaction_rows,
+            'budgets': BudgetSerializer(self.budgets, many=True).data,
+            'total_budget': TotalBudgetSerializer(self.total_budget).data if self.total_budget else None,
+        }
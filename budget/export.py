@@ -0,0 +1,130 @@
+import csv
+import zlib
+
+from django.http import StreamingHttpResponse
+from .models import Transaction, Category, Budget, TotalBudget
+from .rows import TransactionRows, money
+from .renderers import dumps
+
+EXPORT_CHUNK_SIZE = 2000
+# Bytes buffered before a chunk is handed to the WSGI server (and the compressor).
+EXPORT_BUFFER_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {
+    'json': ('application/json; charset=utf-8', 'json'),
+    'ndjson': ('application/x-ndjson; charset=utf-8', 'ndjson'),
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+}
+
+CSV_COLUMNS = ['id', 'date', 'amount', 'description', 'category_id', 'category_name', 'category_type']
+
+
+def transaction_rows(user, chunk_size=EXPORT_CHUNK_SIZE):
+    queryset = TransactionRows.values(Transaction.objects.filter(user=user).order_by('id'))
+    return TransactionRows.iterate(queryset.iterator(chunk_size=chunk_size))
+
+
+def category_rows(user, chunk_size=EXPORT_CHUNK_SIZE):
+    queryset = Category.objects.filter(user=user).order_by('id').values('id', 'name', 'type')
+    yield from queryset.iterator(chunk_size=chunk_size)
+
+
+def budget_rows(user, chunk_size=EXPORT_CHUNK_SIZE):
+    queryset = Budget.objects.filter(user=user).order_by('id').with_remaining()
+    for budget in queryset.iterator(chunk_size=chunk_size):
+        yield {
+            'id': budget.pk,
+            'category': budget.category_id,
+            'amount': money(budget.amount),
+            'start_date': budget.start_date.isoformat(),
+            'end_date': budget.end_date.isoformat(),
+            'remaining_budget': float(budget.remaining_budget()),
+            'spent': money(budget.spent),
+        }
+
+
+def total_budget_row(user):
+    total_budget = TotalBudget.objects.filter(user=user).with_remaining().first()
+    if total_budget is None:
+        return None
+    return {
+        'id': total_budget.pk,
+        'amount': money(total_budget.amount),
+        'start_date': total_budget.start_date.isoformat(),
+        'end_date': total_budget.end_date.isoformat(),
+        'total_remaining_budget': float(total_budget.total_remaining_budget()),
+    }
+
+
+def iter_json(user):
+    """The ExportDataView document, emitted piece by piece."""
+    sections = [('transactions', transaction_rows), ('categories', category_rows), ('budgets', budget_rows)]
+    for index, (name, rows) in enumerate(sections):
+        yield ('{' if index == 0 else '],') + f'"{name}":['
+        for position, row in enumerate(rows(user)):
+            yield (',' if position else '') + dumps(row)
+    yield '],"total_budget":' + dumps(total_budget_row(user)) + '}'
+
+
+def iter_ndjson(user):
+    """One {"record": ..., "data": ...} object per line; categories come first."""
+    for record, rows in [('category', category_rows), ('transaction', transaction_rows), ('budget', budget_rows)]:
+        for row in rows(user):
+            yield dumps({'record': record, 'data': row}) + '\n'
+    total_budget = total_budget_row(user)
+    if total_budget is not None:
+        yield dumps({'record': 'total_budget', 'data': total_budget}) + '\n'
+
+
+class _Line:
+    def write(self, value):
+        return value
+
+
+def iter_csv(user):
+    """Transactions only, with their category inlined."""
+    writer = csv.writer(_Line())
+    yield writer.writerow(CSV_COLUMNS)
+    for row in transaction_rows(user):
+        category = row['category'] or {}
+        yield writer.writerow([row['id'], row['date'], row['amount'], row['description'],
+                               category.get('id', ''), category.get('name', ''), category.get('type', '')])
+
+
+def buffered(pieces, size=EXPORT_BUFFER_SIZE):
+    buffer, length = [], 0
+    for piece in pieces:
+        data = piece.encode('utf-8')
+        buffer.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def iter_export(user, output):
+    return {'json': iter_json, 'ndjson': iter_ndjson, 'csv': iter_csv}[output](user)
+
+
+def streaming_export_response(user, output, compress=False):
+    content_type, extension = EXPORT_FORMATS[output]
+    chunks = buffered(iter_export(user, output))
+    filename = f'moneyapp-export.{extension}'
+    if compress:
+        chunks = gzipped(chunks)
+        content_type = 'application/gzip'
+        filename += '.gz'
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
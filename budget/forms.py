@@ -1,5 +1,18 @@
 from django import forms
 from .models import Transaction, Budget, Category
+from .categories import category_cache
+
+class UserCategoryChoiceField(forms.ModelChoiceField):
+    """Validates the submitted category against the per-user category cache."""
+    user = None
+
+    def to_python(self, value):
+        if self.user is None or value in self.empty_values:
+            return super().to_python(value)
+        category = category_cache.get(self.user.pk, value)
+        if category is None:
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return category
 
 class TransactionForm(forms.ModelForm):
     class Meta:
@@ -8,6 +21,9 @@ class TransactionForm(forms.ModelForm):
         widgets = {
             'date': forms.DateInput(attrs={'type': 'date'}),
         }
+        field_classes = {
+            'category': UserCategoryChoiceField,
+        }
 
     def clean(self):
         cleaned_data = super().clean()
@@ -22,11 +38,19 @@ class TransactionForm(forms.ModelForm):
         
         return cleaned_data
 
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        if self.fields['category'].user is not None:
+            # Already checked against the user's cached categories; skip the model's FK exists() query.
+            exclude.add('category')
+        return exclude
+
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user', None)
         super(TransactionForm, self).__init__(*args, **kwargs)
         if user:
             self.fields['category'].queryset = Category.objects.filter(user=user)
+            self.fields['category'].user = user
 
 class BudgetForm(forms.ModelForm):
     class Meta:
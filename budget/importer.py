@@ -0,0 +1,360 @@
+import codecs
+import csv
+import gzip
+import json
+import logging
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .models import Transaction, Category, Budget, TotalBudget, ImportJob, Job
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_READ_SIZE = 64 * 1024
+# Longest single JSON value (one transaction, a key) the reader buffers, in characters
+# (BUDGET_IMPORT_MAX_VALUE_SIZE); anything longer fails the import instead of filling memory.
+IMPORT_MAX_VALUE_SIZE = 4 * 1024 * 1024
+IMPORT_MAX_ERRORS = 50
+# Uploads above this size (BUDGET_IMPORT_SYNC_MAX_BYTES) are imported in the background: by a run_jobs
+# worker with BUDGET_JOB_QUEUE on, otherwise in a thread of the web process.
+IMPORT_SYNC_MAX_BYTES = 1024 * 1024
+
+JSON_SECTIONS = {
+    'transactions': 'transaction',
+    'categories': 'category',
+    'budgets': 'budget',
+    'total_budget': 'total_budget',
+}
+AMOUNT_LIMIT = Decimal('1e8')  # Transaction.amount is max_digits=10, decimal_places=2
+
+
+class ImportFormatError(Exception):
+    """The upload cannot be read any further."""
+
+
+class _JSONStream:
+    """Pulls JSON values out of a text stream without loading the whole document."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+        self.max_value_size = getattr(settings, 'BUDGET_IMPORT_MAX_VALUE_SIZE', IMPORT_MAX_VALUE_SIZE)
+
+    def fill(self, size=IMPORT_READ_SIZE):
+        if self.eof:
+            return False
+        data = self.stream.read(size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self.fill():
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ImportFormatError(f'Expected "{char}" in JSON document')
+        self.pos += 1
+
+    def more(self):
+        # Read as much again as is pending, so a long value is re-parsed a logarithmic number of times.
+        pending = len(self.buffer) - self.pos
+        if pending > self.max_value_size:
+            raise ImportFormatError(f'A JSON value is longer than {self.max_value_size} characters')
+        return self.fill(max(IMPORT_READ_SIZE, pending))
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.more():
+                    raise ImportFormatError('Malformed JSON document')
+                continue
+            # A number or literal ending exactly at the buffer edge may continue in the next read.
+            if end == len(self.buffer) and self.more():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_records(stream):
+    """Yield (record, data) from an ExportDataView JSON document."""
+    reader = _JSONStream(stream)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        record = JSON_SECTIONS.get(key)
+        if reader.peek() == '[':
+            reader.expect('[')
+            if reader.peek() != ']':
+                while True:
+                    item = reader.value()
+                    if record:
+                        yield record, item
+                    if reader.peek() != ',':
+                        break
+                    reader.expect(',')
+            reader.expect(']')
+        else:
+            item = reader.value()
+            if record:
+                yield record, item
+        if reader.peek() != ',':
+            break
+        reader.expect(',')
+    reader.expect('}')
+
+
+def iter_ndjson_records(stream):
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            yield item['record'], item['data']
+        except (ValueError, KeyError, TypeError):
+            raise ImportFormatError(f'Line {number} is not a {{"record": ..., "data": ...}} object')
+
+
+def iter_csv_records(stream):
+    for row in csv.DictReader(stream):
+        category = None
+        if row.get('category_name'):
+            category = {'id': row.get('category_id') or None, 'name': row['category_name'], 'type': row.get('category_type')}
+        yield 'transaction', {
+            'amount': row.get('amount'),
+            'date': row.get('date'),
+            'description': row.get('description') or '',
+            'category': category,
+        }
+
+
+RECORD_READERS = {
+    'json': iter_json_records,
+    'ndjson': iter_ndjson_records,
+    'csv': iter_csv_records,
+}
+
+
+def open_upload(path):
+    """Open a stored upload as text, transparently un-gzipping it."""
+    with open(path, 'rb') as probe:
+        compressed = probe.read(2) == b'\x1f\x8b'
+    raw = gzip.open(path, 'rb') if compressed else open(path, 'rb')
+    return codecs.getreader('utf-8-sig')(raw)
+
+
+class Importer:
+    """Resolves categories from an in-memory map and writes rows with batched bulk_create."""
+
+    def __init__(self, user, batch_size=IMPORT_BATCH_SIZE, on_flush=None):
+        self.user = user
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self.categories = {(c.name, c.type): c for c in Category.objects.filter(user=user)}
+        self.exported_categories = {}
+        self.transactions = []
+        self.budgets = []
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, records):
+        for position, (record, data) in enumerate(records, 1):
+            handler = getattr(self, f'add_{record}', None)
+            try:
+                if handler is None:
+                    raise ValueError(f'Unknown record type "{record}"')
+                handler(data)
+            except (AttributeError, KeyError, TypeError, ValueError, InvalidOperation) as exc:
+                self.failed += 1
+                if len(self.errors) < IMPORT_MAX_ERRORS:
+                    self.errors.append({'record': position, 'error': str(exc) or exc.__class__.__name__})
+            if len(self.transactions) + len(self.budgets) >= self.batch_size:
+                self.flush()
+        self.flush()
+
+    def flush(self):
+        if not self.transactions and not self.budgets:
+            return
+        with transaction.atomic():
+            Transaction.objects.bulk_create(self.transactions)
+            Budget.objects.bulk_create(self.budgets)
+        self.imported += len(self.transactions) + len(self.budgets)
+        self.transactions, self.budgets = [], []
+        if self.on_flush:
+            self.on_flush(self)
+
+    def category(self, data):
+        if not data:
+            return None
+        name, category_type = str(data.get('name') or '').strip(), data.get('type')
+        if not name or category_type not in ('income', 'expense'):
+            raise ValueError('Category needs a name and a type of income or expense')
+        category = self.categories.get((name, category_type))
+        if category is None:
+            category = Category.objects.create(user=self.user, name=name[:100], type=category_type)
+            self.categories[(name, category_type)] = category
+        if data.get('id') is not None:
+            self.exported_categories[str(data['id'])] = category
+        return category
+
+    def add_category(self, data):
+        self.category(data)
+        self.imported += 1
+
+    def add_transaction(self, data):
+        amount = parse_amount(data['amount'])
+        category = self.category(data.get('category'))
+        # Same normalization as Transaction.save, which bulk_create skips.
+        if category and category.type == 'expense' and amount > 0:
+            amount = -amount
+        self.transactions.append(Transaction(
+            user=self.user,
+            amount=amount,
+            date=parse_required_date(data['date']),
+            description=str(data.get('description') or ''),
+            category=category,
+        ))
+
+    def add_budget(self, data):
+        category = self.exported_categories.get(str(data['category']))
+        if category is None:
+            raise ValueError(f'Budget refers to unknown category {data["category"]}')
+        self.budgets.append(Budget(
+            user=self.user,
+            category=category,
+            amount=parse_amount(data['amount']),
+            start_date=parse_required_date(data['start_date']),
+            end_date=parse_required_date(data['end_date']),
+        ))
+
+    def add_total_budget(self, data):
+        if not data or data.get('amount') is None:
+            return
+        TotalBudget.objects.update_or_create(user=self.user, defaults={
+            'amount': parse_amount(data['amount']),
+            'start_date': parse_required_date(data['start_date']),
+            'end_date': parse_required_date(data['end_date']),
+        })
+        self.imported += 1
+
+
+def parse_amount(value):
+    amount = Decimal(str(value)).quantize(Decimal('0.01'))
+    if not amount.is_finite() or abs(amount) >= AMOUNT_LIMIT:
+        raise ValueError(f'Amount {value} is out of range')
+    return amount
+
+
+def parse_required_date(value):
+    date = parse_date(str(value))
+    if date is None:
+        raise ValueError(f'Invalid date {value!r}')
+    return date
+
+
+def store_upload(chunks):
+    """Copy an upload to a private temporary file and return (path, size)."""
+    handle, path = tempfile.mkstemp(prefix='moneyapp-import-')
+    size = 0
+    with os.fdopen(handle, 'wb') as target:
+        for chunk in chunks:
+            target.write(chunk)
+            size += len(chunk)
+    return path, size
+
+
+def uploads_dir():
+    return pathlib.Path(getattr(settings, 'BUDGET_JOB_UPLOADS_DIR', pathlib.Path(settings.BASE_DIR) / 'job_uploads'))
+
+
+def remove_upload(path):
+    # The file may be gone already (a second run, a cleaned tmp); that must not keep the job from finishing.
+    try:
+        pathlib.Path(path).unlink(missing_ok=True)
+    except OSError:
+        logger.warning('Could not remove upload %s', path, exc_info=True)
+
+
+def run_import(job, path):
+    job.status = 'running'
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+    started = time.monotonic()
+
+    def report(importer):
+        ImportJob.objects.filter(pk=job.pk).update(rows_imported=importer.imported, rows_failed=importer.failed)
+
+    importer = Importer(job.user, on_flush=report)
+    try:
+        with open_upload(path) as stream:
+            importer.run(RECORD_READERS[job.format](stream))
+        job.status = 'done'
+    except (ImportFormatError, UnicodeDecodeError, csv.Error, OSError) as exc:
+        importer.flush()
+        job.status = 'failed'
+        job.message = str(exc)
+    except Exception:
+        logger.exception('Import job %s crashed', job.pk)
+        job.status = 'failed'
+        job.message = 'Internal error during import'
+    finally:
+        remove_upload(path)
+
+    elapsed = time.monotonic() - started
+    job.rows_imported = importer.imported
+    job.rows_failed = importer.failed
+    job.errors = importer.errors
+    job.rows_per_second = round(importer.imported / elapsed, 1) if elapsed > 0 else None
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+def _run_in_thread(job_id, path):
+    try:
+        run_import(ImportJob.objects.select_related('user').get(pk=job_id), path)
+    finally:
+        connection.close()
+
+
+def start_import(job, path):
+    """Run small imports inline and hand large ones to the job queue, or a background thread."""
+    if job.size <= getattr(settings, 'BUDGET_IMPORT_SYNC_MAX_BYTES', IMPORT_SYNC_MAX_BYTES):
+        return run_import(job, path)
+    if getattr(settings, 'BUDGET_JOB_QUEUE', False):
+        # Workers may run elsewhere (another container); they find the upload in the shared directory.
+        directory = uploads_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f'import-{job.pk}'
+        shutil.move(path, directory / name)
+        Job.enqueue(job.user, 'import', import_job=job.pk, upload=name)
+        return job
+    threading.Thread(target=_run_in_thread, args=(job.pk, path), daemon=True).start()
+    return job
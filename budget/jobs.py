@@ -0,0 +1,215 @@
+"""Background jobs, queued in the database and run by ``manage.py run_jobs``.
+
+Requests enqueue a Job row and return; a worker claims pending rows with a
+compare-and-set UPDATE, so several workers (on any host that can reach the
+database) never run the same job, and no broker is needed. Import jobs also
+read the upload from BUDGET_JOB_UPLOADS_DIR, which workers and the web
+server must share. The worker runs
+jobs in a process pool and keeps ``heartbeat_at`` fresh while they run; a
+job whose worker died is put back in the queue once the heartbeat is older
+than BUDGET_JOB_STALE_SECONDS, or failed if it is not safe to run twice.
+
+Handlers take the job and a ``progress(done, total)`` callback and return a
+JSON result. Exports write a gzipped file into BUDGET_JOB_RESULTS_DIR, served
+by /budget/api/jobs/<id>/result/; finished jobs and their files are pruned
+after BUDGET_JOB_RESULT_TTL seconds.
+"""
+import datetime
+import gzip
+import logging
+import os
+import pathlib
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections, router, transaction
+from django.db.models import F
+from django.utils import timezone
+from .export import EXPORT_FORMATS, buffered, iter_export
+from .importer import remove_upload, run_import, uploads_dir
+from .models import DataVersion, ImportJob, Job, UserLedger, rebuild_budget_spend, rebuild_rollups
+
+logger = logging.getLogger(__name__)
+
+JOB_STALE_SECONDS = 300
+JOB_RESULT_TTL = 24 * 60 * 60
+JOB_MAX_ATTEMPTS = 3
+# Pending or running jobs a user may have at once (BUDGET_JOB_MAX_UNFINISHED).
+JOB_MAX_UNFINISHED = 5
+# Seconds between progress writes of one job.
+PROGRESS_INTERVAL = 1.0
+EXPORT_PROGRESS_EVERY = 2000
+
+
+class JobError(Exception):
+    """An expected failure; the message is shown to the user."""
+
+
+def results_dir():
+    return pathlib.Path(getattr(settings, 'BUDGET_JOB_RESULTS_DIR', pathlib.Path(settings.BASE_DIR) / 'job_results'))
+
+
+def result_path(job):
+    name = (job.result or {}).get('file')
+    return results_dir() / name if name else None
+
+
+def export(job, progress):
+    output = job.params.get('output', 'json')
+    if output not in EXPORT_FORMATS:
+        raise JobError(f'Unknown export format {output!r}')
+    _, extension = EXPORT_FORMATS[output]
+    # Rows written per transaction row; categories and budgets are few.
+    total = max(UserLedger.for_user(job.user).transaction_count, 1)
+
+    def counted(pieces):
+        for count, piece in enumerate(pieces, 1):
+            if count % EXPORT_PROGRESS_EVERY == 0:
+                progress(count, total)
+            yield piece
+
+    directory = results_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    name = f'export-{job.pk}.{extension}.gz'
+    partial = directory / f'.{name}.partial'
+    with gzip.open(partial, 'wb', compresslevel=6) as target:
+        for chunk in buffered(counted(iter_export(job.user, output))):
+            target.write(chunk)
+    os.replace(partial, directory / name)
+    return {'file': name, 'filename': f'moneyapp-export.{extension}.gz', 'size': (directory / name).stat().st_size}
+
+
+def import_upload(job, progress):
+    import_job = ImportJob.objects.select_related('user').get(pk=job.params['import_job'])
+    import_job = run_import(import_job, uploads_dir() / job.params['upload'])
+    if import_job.status == 'failed':
+        raise JobError(import_job.message)
+    return {'import_job': import_job.pk, 'rows_imported': import_job.rows_imported, 'rows_failed': import_job.rows_failed}
+
+
+def rebuild(job, progress):
+    user_ids = [job.user_id]
+    # One transaction, so readers never see the ledger and rollups disagree; no progress until it's done.
+    with transaction.atomic():
+        UserLedger.rebuild(user_ids)
+        rollup_rows = rebuild_rollups(user_ids)
+        budgets = rebuild_budget_spend(user_ids)
+        DataVersion.bump(user_ids)
+    return {'rollup_rows': rollup_rows, 'budgets_corrected': budgets}
+
+
+JOB_HANDLERS = {
+    'export': export,
+    'import': import_upload,
+    'rebuild': rebuild,
+}
+# Kinds that may start over after a worker died mid-run; an import would insert its rows twice.
+RETRYABLE_KINDS = {'export', 'rebuild'}
+
+
+def claim(limit, worker):
+    """Mark up to ``limit`` of the oldest pending jobs as running for ``worker``; returns their ids."""
+    claimed = []
+    for pk in Job.objects.filter(status='pending').order_by('id').values_list('pk', flat=True)[:limit]:
+        now = timezone.now()
+        # Another worker may have taken it since the SELECT.
+        if Job.objects.filter(pk=pk, status='pending').update(
+                status='running', worker=worker, started_at=now, heartbeat_at=now, attempts=F('attempts') + 1):
+            claimed.append(pk)
+    return claimed
+
+
+def heartbeat(job_ids):
+    if job_ids:
+        Job.objects.filter(pk__in=job_ids, status='running').update(heartbeat_at=timezone.now())
+
+
+def release(job_ids, message):
+    """Give up on running jobs: retryable ones go back to the queue, the rest fail with ``message``."""
+    running = Job.objects.filter(pk__in=job_ids, status='running')
+    requeued = running.filter(kind__in=RETRYABLE_KINDS, attempts__lt=JOB_MAX_ATTEMPTS).update(
+        status='pending', worker='', heartbeat_at=None)
+    now = timezone.now()
+    imports = list(running.filter(kind='import').values_list('params', flat=True))
+    ImportJob.objects.filter(pk__in=[params.get('import_job') for params in imports],
+                             status__in=('pending', 'running')).update(status='failed', message=message, finished_at=now)
+    failed = running.update(status='failed', message=message, finished_at=now)
+    for params in imports:
+        if params.get('upload'):
+            remove_upload(uploads_dir() / params['upload'])
+    return requeued, failed
+
+
+def requeue_stale(stale_seconds=None):
+    """Release running jobs whose worker stopped sending heartbeats."""
+    if stale_seconds is None:
+        stale_seconds = getattr(settings, 'BUDGET_JOB_STALE_SECONDS', JOB_STALE_SECONDS)
+    cutoff = timezone.now() - datetime.timedelta(seconds=stale_seconds)
+    stale = list(Job.objects.filter(status='running', heartbeat_at__lt=cutoff).values_list('pk', flat=True))
+    return release(stale, 'The worker running this job stopped') if stale else (0, 0)
+
+
+class ProgressWriter:
+    """Writes a job's progress through a connection of its own.
+
+    On SQLite the handler's connection may be in the middle of a read (an
+    export's chunked cursor), which can't be turned into a write. Progress
+    reported inside a transaction is dropped: nobody would see it before the
+    commit, and on SQLite the write would wait for that very transaction.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.alias = router.db_for_write(Job)
+        self.last_write = 0.0
+        self.connection = None
+
+    def __call__(self, done, total):
+        if time.monotonic() - self.last_write < PROGRESS_INTERVAL or connections[self.alias].in_atomic_block:
+            return
+        self.last_write = time.monotonic()
+        if self.connection is None:
+            self.connection = connections.create_connection(self.alias)
+        quote = self.connection.ops.quote_name
+        try:
+            with self.connection.cursor() as cursor:
+                # Never 100 until the result is stored.
+                cursor.execute(f'UPDATE {quote(Job._meta.db_table)} SET {quote("progress")} = %s WHERE {quote("id")} = %s',
+                               [min(int(done * 100 / total), 99), self.job.pk])
+        except DatabaseError:
+            # Progress is a hint; a busy database must not fail the job.
+            logger.warning('Could not record progress of job %s', self.job.pk, exc_info=True)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+
+
+def run_job(job_id):
+    """Run one claimed job and record its outcome; returns the final status."""
+    job = Job.objects.select_related('user').get(pk=job_id)
+    progress = ProgressWriter(job)
+    try:
+        outcome = {'status': 'done', 'result': JOB_HANDLERS[job.kind](job, progress), 'progress': 100}
+    except JobError as exc:
+        outcome = {'status': 'failed', 'message': str(exc)}
+    except Exception:
+        logger.exception('Job %s (%s) crashed', job.pk, job.kind)
+        outcome = {'status': 'failed', 'message': 'Internal error while running the job'}
+    finally:
+        progress.close()
+    # Outside the except blocks: the traceback, and any cursor the handler left open, are gone.
+    Job.objects.filter(pk=job.pk).update(finished_at=timezone.now(), **outcome)
+    return outcome['status']
+
+
+def prune(ttl=None):
+    """Delete finished jobs older than ``ttl`` seconds together with their result files."""
+    if ttl is None:
+        ttl = getattr(settings, 'BUDGET_JOB_RESULT_TTL', JOB_RESULT_TTL)
+    old = Job.objects.filter(status__in=('done', 'failed'), finished_at__lt=timezone.now() - datetime.timedelta(seconds=ttl))
+    for job in old.filter(result__isnull=False).only('pk', 'result'):
+        path = result_path(job)
+        if path is not None:
+            path.unlink(missing_ok=True)
+    return old.delete()[0]
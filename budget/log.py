@@ -0,0 +1,130 @@
+"""Production logging: JSON lines written by a background thread, with rate limiting and sampling.
+
+Request threads only put records on a bounded queue; a QueueListener thread
+formats and writes them. When the queue is full the record is dropped and
+counted rather than blocking the request. See LOGGING in moneyapp.settings.
+"""
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import threading
+import time
+
+LOG_QUEUE_SIZE = 10000
+
+# LogRecord attributes that are not user-supplied ``extra`` fields.
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, ``extra`` fields and any traceback."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Shutting down may wait for a full queue to drain; logging calls never do.
+        self.queue.put(self._sentinel)
+
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+    """Hand records to a listener thread that writes them to ``stream``.
+
+    The formatter set on this handler is applied on the listener thread.
+    """
+
+    def __init__(self, stream=None, queue_size=LOG_QUEUE_SIZE):
+        super().__init__(queue.Queue(queue_size))
+        self.target = logging.StreamHandler(stream or sys.stderr)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+        self.listener = QueueListener(self.queue, self.target, respect_handler_level=False)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt):
+        super().setFormatter(fmt)
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Records stay in-process, so skip QueueHandler's formatting on the calling
+        # thread; only freeze the message, whose arguments may change later.
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            if self.dropped:
+                self.target.handle(logging.makeLogRecord({
+                    'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': f'Log queue was full; dropped {self.dropped} records',
+                }))
+            self.target.close()
+        super().close()
+
+
+class RateLimitFilter(logging.Filter):
+    """Let at most ``rate`` records per second through for each logger, with bursts up to ``burst``.
+
+    Warnings and errors always pass.
+    """
+
+    def __init__(self, rate=100, burst=None):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst or rate
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(record.name, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            self._buckets[record.name] = (tokens - 1 if allowed else tokens, now)
+        return allowed
+
+
+class SamplingFilter(logging.Filter):
+    """Let a random ``rate`` share of records through; warnings and errors always pass."""
+
+    def __init__(self, rate=0.01):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from budget.backup import BACKUP_PAGES_PER_STEP, BACKUP_STEP_PAUSE, BackupError, backup, backup_dir, keep_count
+
+
+class Command(BaseCommand):
+    help = ('Back up the SQLite database online, a few pages at a time, into database_backups/; '
+            'verify, compress and rotate the copies. With --every, keep backing up on a schedule')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--dir', help='Backup directory (default BUDGET_BACKUP_DIR)')
+        parser.add_argument('--keep', type=int, help='Number of backups to keep (default BUDGET_BACKUP_KEEP)')
+        parser.add_argument('--pages', type=int, default=BACKUP_PAGES_PER_STEP,
+                            help='Pages copied per step; -1 copies everything in one step')
+        parser.add_argument('--pause-ms', type=float, default=BACKUP_STEP_PAUSE * 1000,
+                            help='Pause between steps so writers can get in')
+        parser.add_argument('--no-compress', action='store_true')
+        parser.add_argument('--every', type=float, metavar='SECONDS',
+                            help='Run forever, starting a backup every SECONDS')
+
+    def handle(self, *args, **options):
+        if options['pages'] == 0 or options['pages'] < -1:
+            raise CommandError('--pages must be positive or -1')
+        keep = keep_count() if options['keep'] is None else options['keep']
+        if keep < 1:
+            raise CommandError('--keep must be at least 1')
+        if options['every'] is not None and options['every'] <= 0:
+            raise CommandError('--every must be positive')
+
+        while True:
+            started = time.monotonic()
+            self.run(options, keep)
+            if options['every'] is None:
+                return
+            time.sleep(max(options['every'] - (time.monotonic() - started), 0))
+
+    def run(self, options, keep):
+        connection = connections[options['database']]
+        started = time.perf_counter()
+        try:
+            path, counts = backup(
+                connection, options['dir'] or backup_dir(), pages=options['pages'],
+                pause=options['pause_ms'] / 1000, compressed=not options['no_compress'], keep=keep)
+        except BackupError as e:
+            if options['every'] is None:
+                raise CommandError(str(e))
+            # A scheduled run tries again next time.
+            self.stderr.write(str(e))
+            return
+        finally:
+            # Don't hold the connection open between scheduled runs.
+            connection.close()
+        rows = ', '.join(f'{count} {name}' for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'Backed up to {path} ({path.stat().st_size / 1e6:.1f} MB, {rows}) '
+            f'in {time.perf_counter() - started:.2f}s'))
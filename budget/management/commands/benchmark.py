@@ -0,0 +1,188 @@
+import datetime
+import fnmatch
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+from budget import analytics, api
+from budget.dashboard import Dashboard
+from budget.models import Transaction, Budget
+
+
+class Command(BaseCommand):
+    help = ('Run the budget endpoints and model methods against existing data (see generate_data) '
+            'and record wall time, SQL query count and peak memory to a JSON file')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', dest='username', help='Benchmark this user (default: the user with most transactions)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per benchmark')
+        parser.add_argument('--only', action='append', default=[], metavar='PATTERN',
+                            help='Run only benchmarks whose name matches this glob; may be repeated')
+        parser.add_argument('--output', default='benchmark-results.json', help='Where to write the results')
+        parser.add_argument('--compare', help='Previous results file to compare the medians against')
+        parser.add_argument('--threshold', type=float, default=10, help='Percent slowdown reported as a regression')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be positive')
+        user = self.get_user(options['username'])
+        benchmarks = {
+            name: func for name, func in self.benchmarks(user).items()
+            if not options['only'] or any(fnmatch.fnmatch(name, pattern) for pattern in options['only'])
+        }
+        if not benchmarks:
+            raise CommandError('No benchmark matches --only')
+        previous = self.load(options['compare']) if options['compare'] else None
+
+        results = {}
+        self.stdout.write(f'{"":40}{"median ms":>12}{"queries":>10}{"peak KiB":>12}')
+        # Every run must do its real work, not hit the response cache.
+        with override_settings(BUDGET_RESPONSE_CACHE_TIMEOUT=0):
+            for name, func in benchmarks.items():
+                results[name] = result = self.measure(func, options['repeat'])
+                self.stdout.write(f'{name:40}{result["median_ms"]:>12.1f}{result["queries"]:>10}'
+                                  f'{result["peak_memory_kib"]:>12.0f}')
+
+        with open(options['output'], 'w') as output:
+            json.dump({'meta': self.meta(user, options['repeat']), 'results': results}, output, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {len(results)} results to {options["output"]}'))
+        if previous is not None:
+            self.compare(previous, results, options['threshold'])
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'User "{username}" does not exist')
+        user = User.objects.annotate(n=Count('transaction')).order_by('-n').first()
+        if user is None:
+            raise CommandError('No users in the database; run generate_data first')
+        return user
+
+    def benchmarks(self, user):
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS[0] != '*' else 'localhost'
+        factory = APIRequestFactory(HTTP_HOST=host)
+
+        def get(view, path, **params):
+            view = view.as_view()
+
+            def run():
+                request = factory.get(path, params)
+                force_authenticate(request, user=user)
+                response = view(request)
+                if response.streaming:
+                    return sum(len(chunk) for chunk in response.streaming_content)
+                return len(response.render().content)
+            return run
+
+        category = Transaction.objects.filter(user=user, category__isnull=False).values_list('category__name', flat=True).first()
+        description = Transaction.objects.filter(user=user).exclude(description='').values_list('description', flat=True).first()
+
+        def remaining_budgets():
+            return [budget.remaining_budget() for budget in Budget.objects.filter(user=user).select_related('user', 'category')]
+
+        benchmarks = {
+            'DashboardView': get(api.DashboardView, '/budget/api/dashboard/'),
+            'Dashboard.data': lambda: Dashboard(user).data(),
+            'TransactionListCreateView': get(api.TransactionListCreateView, '/budget/api/transactions/'),
+            'TransactionListCreateView category': get(api.TransactionListCreateView, '/budget/api/transactions/',
+                                                       category=category or ''),
+            'TransactionListCreateView search': get(api.TransactionListCreateView, '/budget/api/transactions/',
+                                                     q=(description or 'a').split()[0]),
+            'StatisticsView': get(api.StatisticsView, '/budget/api/statistics/'),
+            'StatisticsView analytics': get(api.StatisticsView, '/budget/api/statistics/',
+                                            include=','.join(analytics.ANALYTICS_SECTIONS)),
+            'analytics numpy': lambda: analytics.report(user, analytics.ANALYTICS_SECTIONS, engine='numpy'),
+            'analytics orm': lambda: analytics.report(user, analytics.ANALYTICS_SECTIONS, engine='orm'),
+            'TimeseriesStatisticsView': get(api.TimeseriesStatisticsView, '/budget/api/statistics/timeseries/'),
+            'ExportDataView': get(api.ExportDataView, '/budget/api/export-data/'),
+            'ExportDataView ndjson': get(api.ExportDataView, '/budget/api/export-data/', output='ndjson'),
+            'Budget.remaining_budget': remaining_budgets,
+        }
+        if analytics.np is None:
+            del benchmarks['analytics numpy']
+        return benchmarks
+
+    def measure(self, func, repeat):
+        # Warm-up run, which also counts the queries (the DEBUG query log stops at 9000 entries).
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            func()
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        # tracemalloc slows Python down, so peak memory gets a run of its own.
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {
+            'median_ms': round(statistics.median(timings), 3),
+            'min_ms': round(min(timings), 3),
+            'max_ms': round(max(timings), 3),
+            'queries': len(queries),
+            'peak_memory_kib': round(peak / 1024, 1),
+        }
+
+    def meta(self, user, repeat):
+        try:
+            commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'commit': commit,
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'user': user.username,
+            'transactions': Transaction.objects.filter(user=user).count(),
+            'budgets': Budget.objects.filter(user=user).count(),
+            'repeat': repeat,
+        }
+
+    def load(self, path):
+        try:
+            with open(path) as previous:
+                return json.load(previous)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+
+    def compare(self, previous, results, threshold):
+        before = previous.get('results', {})
+        self.stdout.write(f'\nAgainst {previous.get("meta", {}).get("commit") or "previous run"}:')
+        regressions = 0
+        for name, result in results.items():
+            if name not in before or not before[name]['median_ms']:
+                continue
+            change = (result['median_ms'] / before[name]['median_ms'] - 1) * 100
+            queries = result['queries'] - before[name]['queries']
+            line = f'{name:40}{change:>+11.1f}%{queries:>+10}'
+            if change > threshold or queries > 0:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        if regressions:
+            self.stdout.write(self.style.WARNING(f'{regressions} benchmarks slower by more than {threshold:g}% or with more queries'))
@@ -0,0 +1,145 @@
+import asyncio
+import datetime
+import io
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+from budget.models import Transaction, Category, Budget, TotalBudget
+
+ENDPOINTS = [
+    # (label, WSGI path, ASGI path)
+    ('dashboard', '/budget/api/dashboard/', '/budget/api/async/dashboard/'),
+    ('statistics', '/budget/api/statistics/', '/budget/api/async/statistics/'),
+    ('transactions', '/budget/api/transactions/', '/budget/api/async/transactions/'),
+]
+
+
+class Command(BaseCommand):
+    help = ('Compare latency and throughput of the sync endpoints under WSGI with their async '
+            'variants under ASGI, driving both handlers in-process with concurrent requests')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help='Requests per endpoint and server')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--transactions', type=int, default=5000, help='Synthetic transactions for the benchmark user')
+        parser.add_argument('--budgets', type=int, default=10)
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive')
+        user = self.create_user(options['transactions'], options['budgets'])
+        self.host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS[0] != '*' else 'localhost'
+        self.token = str(AccessToken.for_user(user))
+        try:
+            # Every request must do its real work, not hit the response cache.
+            with override_settings(BUDGET_RESPONSE_CACHE_TIMEOUT=0):
+                self.run(options['requests'], options['concurrency'])
+        finally:
+            user.delete()
+
+    def create_user(self, transaction_count, budget_count):
+        user = User.objects.create_user(username=f'benchmark-asgi-{uuid.uuid4().hex[:8]}')
+        categories = [Category.objects.create(user=user, name=f'Category {i}', type='expense' if i % 4 else 'income')
+                      for i in range(max(budget_count, 8))]
+        today = timezone.now().date()
+        Transaction.objects.bulk_create([
+            Transaction(user=user, category=categories[i % len(categories)], date=today - datetime.timedelta(days=i % 730),
+                        amount=Decimal(i % 500 + 1) * (1 if categories[i % len(categories)].type == 'income' else -1),
+                        description=f'Transaction {i}')
+            for i in range(transaction_count)
+        ], batch_size=1000)
+        for category in categories[:budget_count]:
+            Budget.objects.create(user=user, category=category, amount=1000,
+                                  start_date=today - datetime.timedelta(days=30), end_date=today)
+        TotalBudget.objects.create(user=user, amount=10000, start_date=today - datetime.timedelta(days=30), end_date=today)
+        return user
+
+    def run(self, requests, concurrency):
+        wsgi, asgi = WSGIHandler(), ASGIHandler()
+        self.stdout.write(f'{requests} requests per endpoint, {concurrency} concurrent')
+        self.stdout.write(f'{"":28}{"p50 ms":>10}{"p99 ms":>10}{"req/s":>10}')
+        for label, wsgi_path, asgi_path in ENDPOINTS:
+            wsgi_result = self.measure_wsgi(wsgi, wsgi_path, requests, concurrency)
+            asgi_result = asyncio.run(self.measure_asgi(asgi, asgi_path, requests, concurrency))
+            for server, (latencies, elapsed) in (('WSGI sync', wsgi_result), ('ASGI async', asgi_result)):
+                self.stdout.write(f'{label + " " + server:28}{self.percentile(latencies, 50):>10.1f}'
+                                  f'{self.percentile(latencies, 99):>10.1f}{len(latencies) / elapsed:>10.0f}')
+            speedup = (len(asgi_result[0]) / asgi_result[1]) / (len(wsgi_result[0]) / wsgi_result[1])
+            self.stdout.write(self.style.SUCCESS(f'{label}: ASGI async at {speedup:.2f}x the WSGI throughput'))
+
+    def percentile(self, latencies, percent):
+        if len(latencies) == 1:
+            return latencies[0]
+        return statistics.quantiles(latencies, n=100, method='inclusive')[percent - 1]
+
+    def measure_wsgi(self, handler, path, requests, concurrency):
+        def call(_):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+                'SERVER_NAME': self.host, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'HTTP_HOST': self.host, 'HTTP_AUTHORIZATION': f'Bearer {self.token}',
+                'wsgi.input': io.BytesIO(), 'wsgi.errors': io.StringIO(), 'wsgi.url_scheme': 'http',
+                'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+            }
+            started = time.perf_counter()
+            status = []
+            body = b''.join(handler(environ, lambda code, headers, exc_info=None: status.append(code)))
+            latency = (time.perf_counter() - started) * 1000
+            self.ensure_ok(path, int(status[0].split()[0]), body)
+            return latency
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(call, range(requests)))
+        return latencies, time.perf_counter() - started
+
+    async def measure_asgi(self, handler, path, requests, concurrency):
+        limit = asyncio.Semaphore(concurrency)
+
+        async def call():
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+                'headers': [(b'host', self.host.encode()), (b'authorization', f'Bearer {self.token}'.encode())],
+                'client': ('127.0.0.1', 0), 'server': (self.host, 80),
+            }
+            messages = []
+            requested = []
+
+            async def receive():
+                if requested:
+                    # The handler keeps listening for a disconnect that never comes.
+                    await asyncio.Event().wait()
+                requested.append(True)
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                messages.append(message)
+
+            async with limit:
+                started = time.perf_counter()
+                await handler(scope, receive, send)
+                latency = (time.perf_counter() - started) * 1000
+            status = next(message['status'] for message in messages if message['type'] == 'http.response.start')
+            self.ensure_ok(path, status, b''.join(message.get('body', b'') for message in messages
+                                             if message['type'] == 'http.response.body'))
+            return latency
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(call() for _ in range(requests)))
+        return list(latencies), time.perf_counter() - started
+
+    def ensure_ok(self, path, status, body):
+        if status != 200:
+            raise CommandError(f'{path} answered {status}: {body[:200]!r}')
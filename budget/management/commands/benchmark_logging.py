@@ -0,0 +1,118 @@
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from budget.log import BackgroundHandler, JSONFormatter, RateLimitFilter, SamplingFilter
+
+
+class SlowFile:
+    """A file whose writes take at least ``latency`` seconds, like a terminal or a log shipper under load."""
+
+    def __init__(self, path, latency):
+        self.file = open(path, 'w')
+        self.latency = latency
+
+    def write(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+        return self.file.write(text)
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class Command(BaseCommand):
+    help = ('Compare request-thread logging throughput of the synchronous console handler with the '
+            'background JSON handler, with and without SQL sampling and rate limiting')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--records', type=int, default=5000, help='Records per thread')
+        parser.add_argument('--sql-share', type=float, default=0.8, help='Share of records that are SQL debug lines')
+        parser.add_argument('--sink-latency-us', type=float, default=20, help='Simulated cost of each write')
+        parser.add_argument('--sql-sample-rate', type=float, default=0.01)
+        parser.add_argument('--rate-limit', type=float, default=100, help='Records per second per logger')
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['records'] < 1:
+            raise CommandError('--threads and --records must be positive')
+        modes = {
+            'console (sync)': lambda stream: self.console(stream),
+            'json (background)': lambda stream: self.background(stream),
+            'json (background, sampled)': lambda stream: self.background(
+                stream, RateLimitFilter(options['rate_limit']), SamplingFilter(options['sql_sample_rate'])),
+        }
+        self.stdout.write(f'{options["threads"]} threads x {options["records"]} records, '
+                          f'{options["sql_share"]:.0%} SQL, {options["sink_latency_us"]:g}us per write')
+        self.stdout.write(f'{"":30}{"records/s":>12}{"p50 us":>10}{"p99 us":>10}{"written":>10}{"drain s":>10}')
+        with tempfile.TemporaryDirectory() as directory:
+            for label, build in modes.items():
+                path = os.path.join(directory, 'log')
+                stream = SlowFile(path, options['sink_latency_us'] / 1e6)
+                handler, sql_filter = build(stream)
+                latencies, elapsed, drain = self.run(handler, sql_filter, options)
+                stream.close()
+                with open(path) as written:
+                    lines = sum(1 for _ in written)
+                self.stdout.write(
+                    f'{label:30}{len(latencies) / elapsed:>12.0f}{statistics.median(latencies):>10.1f}'
+                    f'{statistics.quantiles(latencies, n=100)[98]:>10.1f}{lines:>10}{drain:>10.2f}')
+
+    def console(self, stream):
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter('%(levelname)s %(name)s %(message)s'))
+        return handler, None
+
+    def background(self, stream, rate_limit=None, sql_sample=None):
+        handler = BackgroundHandler(stream, queue_size=100000)
+        handler.setFormatter(JSONFormatter())
+        if rate_limit is not None:
+            handler.addFilter(rate_limit)
+        return handler, sql_sample
+
+    def run(self, handler, sql_filter, options):
+        app = logging.getLogger('benchmark_logging.app')
+        sql = logging.getLogger('benchmark_logging.db.backends')
+        for logger in (app, sql):
+            logger.handlers = [handler]
+            logger.filters = []
+            logger.setLevel(logging.DEBUG)
+            logger.propagate = False
+        if sql_filter is not None:
+            sql.addFilter(sql_filter)
+
+        every = max(round(1 / (1 - options['sql_share'])), 1) if options['sql_share'] < 1 else None
+        latencies = [[] for _ in range(options['threads'])]
+
+        def work(index):
+            timings = latencies[index]
+            for i in range(options['records']):
+                started = time.perf_counter()
+                if every and i % every == 0:
+                    app.info('Handled %s %s', 'GET', '/budget/api/dashboard/', extra={'status': 200})
+                else:
+                    sql.debug('(%.3f) %s; args=%s', 0.001, 'SELECT "budget_transaction"."id" FROM "budget_transaction" '
+                              'WHERE "budget_transaction"."user_id" = %s', (i,))
+                timings.append((time.perf_counter() - started) * 1e6)
+
+        threads = [threading.Thread(target=work, args=(index,)) for index in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        # Closing waits for the listener to write everything still queued.
+        handler.close()
+        drain = time.perf_counter() - started - elapsed
+        for logger in (app, sql):
+            logger.handlers = []
+            logger.filters = []
+        return [latency for timings in latencies for latency in timings], elapsed, drain
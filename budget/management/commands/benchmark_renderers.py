@@ -0,0 +1,83 @@
+import datetime
+import io
+import statistics
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import compress_string
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from budget.middleware import BROTLI_QUALITY, brotli
+from budget.renderers import FastJSONParser, FastJSONRenderer, orjson
+from budget.rows import TransactionRows
+
+
+class Command(BaseCommand):
+    help = ('Compare DRF\'s JSONRenderer/JSONParser with FastJSONRenderer/FastJSONParser on a large '
+            'transaction list, and gzip with brotli on the rendered bytes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stderr.write('orjson is not installed; FastJSONRenderer falls back to the stock renderer')
+        payloads = {
+            'transactions': {'next': None, 'previous': None, 'results': TransactionRows.serialize(self.rows(options['rows']))},
+            'raw decimals': self.decimals(options['rows']),
+        }
+        self.stdout.write(f'{options["rows"]} rows, median of {options["repeat"]} runs')
+        self.stdout.write(f'{"":28}{"DRF ms":>10}{"fast ms":>10}{"speedup":>10}{"MB":>8}')
+        for name, data in payloads.items():
+            stock, stock_output = self.measure(options['repeat'], lambda: JSONRenderer().render(data))
+            fast, fast_output = self.measure(options['repeat'], lambda: FastJSONRenderer().render(data))
+            if stock_output != fast_output:
+                raise CommandError(f'FastJSONRenderer output differs from JSONRenderer for {name}')
+            self.row(f'render {name}', stock, fast, len(fast_output))
+
+            stock, _ = self.measure(options['repeat'], lambda: JSONParser().parse(io.BytesIO(fast_output)))
+            fast, _ = self.measure(options['repeat'], lambda: FastJSONParser().parse(io.BytesIO(fast_output)))
+            self.row(f'parse {name}', stock, fast, len(fast_output))
+
+        content = JSONRenderer().render(payloads['transactions'])
+        self.stdout.write(f'\n{"compression":28}{"ms":>10}{"MB":>10}{"ratio":>10}')
+        gzip_ms, gzipped = self.measure(options['repeat'], lambda: compress_string(content, max_random_bytes=100))
+        self.stdout.write(f'{"gzip (level 6)":28}{gzip_ms:>10.1f}{len(gzipped) / 1e6:>10.2f}{len(content) / len(gzipped):>10.1f}')
+        if brotli is None:
+            self.stdout.write('brotli is not installed')
+            return
+        quality = getattr(settings, 'BUDGET_BROTLI_QUALITY', BROTLI_QUALITY)
+        brotli_ms, compressed = self.measure(options['repeat'], lambda: brotli.compress(content, quality=quality))
+        self.stdout.write(f'{f"brotli (quality {quality})":28}{brotli_ms:>10.1f}{len(compressed) / 1e6:>10.2f}'
+                          f'{len(content) / len(compressed):>10.1f}')
+
+    def rows(self, count):
+        start = datetime.date(2020, 1, 1)
+        for i in range(count):
+            category = i % 20 + 1 if i % 50 else None
+            amount = Decimal(i % 5000) / 4 * (-1 if i % 2 else 1)
+            yield {
+                'id': i + 1, 'amount': Decimal(f'{amount:.2f}'), 'date': start + datetime.timedelta(days=i % 1500),
+                'description': f'Transaction {i} – café', 'category_id': category,
+                'category__name': category and f'Category {category}', 'category__type': category and 'expense',
+            }
+
+    def decimals(self, count):
+        # Shapes like the statistics and dashboard payloads: raw Decimals and dates, no serializer.
+        start = datetime.date(2020, 1, 1)
+        return [{'date': start + datetime.timedelta(days=i % 1500), 'income': Decimal(i % 997) / 4,
+                 'expenses': Decimal(i % 613) / 8, 'count': i} for i in range(count)]
+
+    def row(self, label, stock, fast, size):
+        self.stdout.write(f'{label:28}{stock:>10.1f}{fast:>10.1f}{stock / fast:>9.1f}x{size / 1e6:>8.2f}')
+
+    def measure(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            output = func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), output
@@ -0,0 +1,59 @@
+import datetime
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from budget.models import Transaction, Category
+from budget.rows import TransactionRows
+from budget.serializers import TransactionSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare TransactionSerializer with TransactionRows on in-memory rows (serialize + render)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        categories = [Category(id=i, name=f'Category {i}', type='expense' if i % 3 else 'income') for i in range(1, 21)]
+        instances, rows = [], []
+        start = datetime.date(2020, 1, 1)
+        for i in range(options['rows']):
+            category = categories[i % len(categories)] if i % 50 else None
+            amount = Decimal(i % 5000) / 4 * (-1 if i % 2 else 1)
+            date = start + datetime.timedelta(days=i % 1500)
+            transaction = Transaction(id=i + 1, amount=Decimal(f'{amount:.2f}'), date=date,
+                                      description=f'Transaction {i}', category=category)
+            instances.append(transaction)
+            rows.append({
+                'id': transaction.id, 'amount': transaction.amount, 'date': date, 'description': transaction.description,
+                'category_id': category and category.id, 'category__name': category and category.name,
+                'category__type': category and category.type,
+            })
+
+        renderer = JSONRenderer()
+        legacy, legacy_data = self.measure(options['repeat'], lambda: TransactionSerializer(instances, many=True).data)
+        lean, lean_data = self.measure(options['repeat'], lambda: TransactionRows.serialize(rows))
+        legacy_total, legacy_output = self.measure(options['repeat'], lambda: renderer.render(TransactionSerializer(instances, many=True).data))
+        lean_total, lean_output = self.measure(options['repeat'], lambda: renderer.render(TransactionRows.serialize(rows)))
+        if legacy_output != lean_output:
+            raise CommandError('TransactionRows output differs from TransactionSerializer')
+
+        self.stdout.write(f'{options["rows"]} rows, median of {options["repeat"]} runs')
+        self.stdout.write(f'{"":24}{"serialize":>12}{"+ render":>12}')
+        self.stdout.write(f'{"TransactionSerializer":24}{legacy:>10.1f}ms{legacy_total:>10.1f}ms')
+        self.stdout.write(f'{"TransactionRows":24}{lean:>10.1f}ms{lean_total:>10.1f}ms')
+        self.stdout.write(self.style.SUCCESS(
+            f'{legacy / lean:.1f}x faster to serialize, {legacy_total / lean_total:.1f}x end to end, '
+            f'output identical ({len(lean_output)} bytes)'))
+
+    def measure(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            output = func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), output
@@ -0,0 +1,94 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from budget.models import Transaction, Budget, UserLedger
+
+
+class Command(BaseCommand):
+    help = ('Print EXPLAIN plans and timings of the hot Transaction queries, '
+            'with the Transaction indexes dropped (before) and in place (after)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', dest='username', help='Run queries for this user (default: the user with most transactions)')
+        parser.add_argument('--repeat', type=int, default=20, help='Executions per query for timing')
+        parser.add_argument('--after-only', action='store_true', help='Skip the run without indexes')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['username'])
+        self.stdout.write(f'Database: {connection.vendor}, user: {user.username}, '
+                          f'transactions: {Transaction.objects.filter(user=user).count()}')
+
+        before = None
+        if not options['after_only']:
+            with transaction.atomic():
+                self.drop_indexes()
+                before = self.run_queries(user, options['repeat'])
+                transaction.set_rollback(True)
+            # SQLite caches EXPLAIN statements without re-checking the schema.
+            connection.close()
+        after = self.run_queries(user, options['repeat'])
+
+        for label, (plan, timing) in after.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n== {label}'))
+            if before:
+                before_plan, before_timing = before[label]
+                self.stdout.write(f'-- before ({before_timing:.3f} ms median)')
+                self.stdout.write(before_plan)
+            self.stdout.write(f'-- after ({timing:.3f} ms median)')
+            self.stdout.write(plan)
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'User "{username}" does not exist')
+        user = User.objects.annotate(n=Count('transaction')).order_by('-n').first()
+        if user is None:
+            raise CommandError('No users in the database')
+        return user
+
+    def drop_indexes(self):
+        with connection.cursor() as cursor:
+            for index in Transaction._meta.indexes:
+                cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+
+    def get_queries(self, user):
+        """Querysets as built by TransactionListCreateView, DashboardView and Budget.remaining_budget."""
+        today = timezone.now().date()
+        transactions = Transaction.objects.filter(user=user)
+        first = transactions.select_related('category').order_by('date').first()
+        category = first.category if first else None
+        budget = Budget.objects.filter(user=user).first()
+        budget_start = budget.start_date if budget else today - timezone.timedelta(days=30)
+        budget_category = budget.category if budget else category
+        return {
+            'TransactionListCreateView: list': transactions.order_by('-date', '-id')[:100],
+            'TransactionListCreateView: category filter': transactions.filter(
+                category__name=category.name if category else '').order_by('-date', '-id')[:100],
+            'TransactionListCreateView: date range': transactions.filter(
+                date__range=[today - timezone.timedelta(days=90), today]).order_by('-date', '-id')[:100],
+            'DashboardView: recent transactions': transactions.select_related('category').order_by('-date', '-id')[:10],
+            'DashboardView: budgets with remaining': Budget.objects.filter(user=user).with_remaining(),
+            'UserLedger.compute: income/expense totals': Transaction.objects.filter(user_id__in=[user.pk])
+                .order_by().values('user_id').annotate(**UserLedger.AGGREGATES),
+            'Budget.remaining_budget: spent': transactions.filter(
+                category=budget_category, date__range=(budget_start, today)).values('user').annotate(Sum('amount')),
+        }
+
+    def run_queries(self, user, repeat):
+        results = {}
+        for label, queryset in self.get_queries(user).items():
+            plan = queryset.explain()
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[label] = (plan, statistics.median(timings))
+        return results
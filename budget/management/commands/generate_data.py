@@ -0,0 +1,133 @@
+import datetime
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import models, transaction
+from django.utils import timezone
+from budget.models import Transaction, Category, Budget, TotalBudget, UserLedger, DataVersion, rebuild_budget_spend, rebuild_rollups
+
+# (name, type, relative frequency, median amount, spread); amounts are log-normal around the median.
+CATEGORIES = [
+    ('Groceries', 'expense', 30, 45, 0.6),
+    ('Dining', 'expense', 14, 25, 0.7),
+    ('Transport', 'expense', 14, 12, 0.8),
+    ('Shopping', 'expense', 8, 60, 0.9),
+    ('Entertainment', 'expense', 6, 30, 0.8),
+    ('Health', 'expense', 3, 50, 1.0),
+    ('Utilities', 'expense', 2, 90, 0.4),
+    ('Subscriptions', 'expense', 4, 12, 0.5),
+    ('Travel', 'expense', 1, 400, 1.0),
+    ('Rent', 'expense', 1, 1200, 0.2),
+    ('Salary', 'income', 1, 3500, 0.15),
+    ('Freelance', 'income', 1, 600, 0.8),
+    ('Interest', 'income', 1, 15, 0.6),
+]
+DESCRIPTIONS = {
+    'Groceries': ['Supermarket', 'Farmers market', 'Bakery', 'Corner shop'],
+    'Dining': ['Lunch', 'Dinner out', 'Coffee', 'Takeaway pizza'],
+    'Transport': ['Metro ticket', 'Taxi', 'Fuel', 'Parking'],
+    'Shopping': ['Clothes', 'Electronics', 'Books', 'Home goods'],
+    'Entertainment': ['Cinema', 'Concert tickets', 'Video game', 'Museum'],
+    'Health': ['Pharmacy', 'Dentist', 'Gym membership'],
+    'Utilities': ['Electricity bill', 'Water bill', 'Internet', 'Phone plan'],
+    'Subscriptions': ['Music streaming', 'Video streaming', 'Cloud storage'],
+    'Travel': ['Flight', 'Hotel', 'Train tickets'],
+    'Rent': ['Monthly rent'],
+    'Salary': ['Monthly salary', 'Salary and bonus'],
+    'Freelance': ['Consulting invoice', 'Design project'],
+    'Interest': ['Savings interest'],
+}
+
+
+class Command(BaseCommand):
+    help = ('Generate synthetic users with categories, budgets and a transaction history, '
+            'for load testing and the benchmark command')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1)
+        parser.add_argument('--transactions', type=int, default=100000, help='Transactions per user')
+        parser.add_argument('--days', type=int, default=3 * 365, help='Length of the history, ending today')
+        parser.add_argument('--prefix', default='synthetic', help='Usernames are <prefix>-<n>')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for reproducible data')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--replace', action='store_true', help='Delete existing users with the same names first')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['transactions'] < 0 or options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--users, --days and --batch-size must be positive, --transactions not negative')
+        usernames = [f'{options["prefix"]}-{n}' for n in range(1, options['users'] + 1)]
+        existing = User.objects.filter(username__in=usernames)
+        if existing.exists():
+            if not options['replace']:
+                raise CommandError(f'Users {", ".join(existing.values_list("username", flat=True)[:5])} '
+                                   f'already exist; pass --replace to recreate them')
+            existing.delete()
+
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        for username in usernames:
+            self.generate_user(rng, username, options['transactions'], options['days'], options['batch_size'])
+        total = options['users'] * options['transactions']
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {options["users"]} users with {total} transactions in {elapsed:.1f}s '
+            f'({total / elapsed if elapsed else 0:.0f} transactions/s)'))
+
+    def generate_user(self, rng, username, count, days, batch_size):
+        user = User.objects.create_user(username=username, password=username)
+        categories = Category.objects.bulk_create([
+            Category(user=user, name=name, type=category_type) for name, category_type, *_ in CATEGORIES
+        ])
+        today = timezone.now().date()
+        self.generate_budgets(rng, user, categories, today, count * 30 / days)
+
+        # Applying ledger, rollup and budget deltas row by row dominates insert time at this scale, so
+        # a plain QuerySet inserts the history and the derived tables are rebuilt once at the end.
+        plain = models.QuerySet(Transaction)
+        batch = []
+        for transaction_data in self.transactions(rng, user, categories, count, days, today):
+            batch.append(transaction_data)
+            if len(batch) >= batch_size:
+                plain.bulk_create(batch)
+                batch = []
+        if batch:
+            plain.bulk_create(batch)
+        with transaction.atomic():
+            UserLedger.rebuild([user.pk])
+            rebuild_rollups([user.pk])
+            rebuild_budget_spend([user.pk])
+            DataVersion.bump([user.pk])
+        self.stdout.write(f'{username}: {count} transactions')
+
+    def transactions(self, rng, user, categories, count, days, today):
+        weights = [row[2] for row in CATEGORIES]
+        first_day = today - datetime.timedelta(days=days - 1)
+        for _ in range(count):
+            index = rng.choices(range(len(CATEGORIES)), weights=weights)[0]
+            name, category_type, _, median, spread = CATEGORIES[index]
+            amount = Decimal(f'{rng.lognormvariate(0, spread) * median:.2f}') or Decimal('0.01')
+            date = first_day + datetime.timedelta(days=rng.randrange(days))
+            yield Transaction(
+                user=user, category=categories[index], date=date,
+                amount=amount if category_type == 'income' else -amount,
+                description=rng.choice(DESCRIPTIONS[name]),
+            )
+
+    def generate_budgets(self, rng, user, categories, today, monthly_count):
+        start = today.replace(day=1)
+        end = (start + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+        budgets = []
+        total_frequency = sum(row[2] for row in CATEGORIES)
+        for category, (_, category_type, frequency, median, _) in zip(categories, CATEGORIES):
+            if category_type != 'expense':
+                continue
+            # Roughly the expected monthly spend, give or take a fifth.
+            expected = monthly_count * frequency / total_frequency * median * rng.uniform(0.8, 1.2)
+            budgets.append(Budget(user=user, category=category, amount=Decimal(f'{max(expected, 1):.2f}'),
+                                  start_date=start, end_date=end))
+        Budget.objects.bulk_create(budgets)
+        TotalBudget.objects.create(user=user, amount=sum(budget.amount for budget in budgets),
+                                   start_date=start, end_date=end)
@@ -0,0 +1,30 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from budget.models import UserLedger
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-user balance ledgers from Transaction, or verify them with --verify'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='usernames', help='Limit to this username (repeatable)')
+        parser.add_argument('--verify', action='store_true', help='Only check ledgers against Transaction, do not write')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['usernames']:
+            user_ids = list(User.objects.filter(username__in=options['usernames']).values_list('id', flat=True))
+            if len(user_ids) != len(set(options['usernames'])):
+                raise CommandError('Unknown username in --user')
+
+        if options['verify']:
+            mismatches = UserLedger.verify(user_ids)
+            for user_id, stored, expected in mismatches:
+                self.stderr.write(f'user {user_id}: ledger {stored} != transactions {expected}')
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} ledger(s) out of sync')
+            self.stdout.write(self.style.SUCCESS('All ledgers match'))
+            return
+
+        count = UserLedger.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} ledger(s)'))
@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from budget.models import rebuild_budget_spend, rebuild_rollups, verify_budget_spend, verify_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily and monthly rollups and budget spend from Transaction, or verify them with --verify'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='usernames', help='Limit to this username (repeatable)')
+        parser.add_argument('--verify', action='store_true', help='Only check rollups against Transaction, do not write')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['usernames']:
+            user_ids = list(User.objects.filter(username__in=options['usernames']).values_list('id', flat=True))
+            if len(user_ids) != len(set(options['usernames'])):
+                raise CommandError('Unknown username in --user')
+
+        if options['verify']:
+            mismatches = verify_rollups(user_ids)
+            for model_name, key, stored, expected in mismatches:
+                self.stderr.write(f'{model_name} {key}: rollup {stored} != transactions {expected}')
+            budget_mismatches = verify_budget_spend(user_ids)
+            for budget_id, stored, expected in budget_mismatches:
+                self.stderr.write(f'Budget {budget_id}: spent {stored} != transactions {expected}')
+            if mismatches or budget_mismatches:
+                raise CommandError(f'{len(mismatches)} rollup row(s) and {len(budget_mismatches)} budget(s) out of sync')
+            self.stdout.write(self.style.SUCCESS('All rollups and budgets match'))
+            return
+
+        count = rebuild_rollups(user_ids)
+        budgets = rebuild_budget_spend(user_ids)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} rollup row(s), corrected {budgets} budget(s)'))
@@ -0,0 +1,116 @@
+import multiprocessing
+import os
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from budget import worker
+from budget.jobs import claim, heartbeat, prune, release, requeue_stale, run_job
+
+JOB_PROCESSES = 2
+# Recycle pool processes now and then, so memory held by one big job is returned.
+MAX_JOBS_PER_PROCESS = 50
+HOUSEKEEPING_INTERVAL = 60
+HEARTBEAT_INTERVAL = 10
+
+
+class Command(BaseCommand):
+    help = ('Run queued background jobs (exports, imports, rebuilds) in a pool of processes. '
+            'Runs until stopped; with --burst, exits once the queue is empty')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int,
+                            help='Jobs run at once (default BUDGET_JOB_PROCESSES); 0 runs them in this process')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds between queue checks when idle')
+        parser.add_argument('--burst', action='store_true', help='Exit when no job is pending or running')
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        if processes is None:
+            processes = getattr(settings, 'BUDGET_JOB_PROCESSES', JOB_PROCESSES)
+        if processes < 0:
+            raise CommandError('--processes must be 0 or more')
+        if options['poll'] <= 0:
+            raise CommandError('--poll must be positive')
+        self.worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.housekeeping_at = self.heartbeat_at = 0
+        if processes == 0:
+            self.run_inline(options)
+        else:
+            self.run_pool(processes, options)
+
+    def housekeeping(self):
+        if time.monotonic() - self.housekeeping_at < HOUSEKEEPING_INTERVAL:
+            return
+        self.housekeeping_at = time.monotonic()
+        requeued, failed = requeue_stale()
+        if requeued or failed:
+            self.stderr.write(f'Stale jobs: {requeued} requeued, {failed} failed')
+        prune()
+
+    def run_inline(self, options):
+        while True:
+            self.housekeeping()
+            claimed = claim(1, self.worker)
+            if not claimed:
+                if options['burst']:
+                    return
+                connection.close()
+                time.sleep(options['poll'])
+                continue
+            self.report(claimed[0], run_job(claimed[0]))
+
+    def run_pool(self, processes, options):
+        pool = self.start_pool(processes)
+        running = {}
+        try:
+            while True:
+                self.housekeeping()
+                if running and time.monotonic() - self.heartbeat_at >= HEARTBEAT_INTERVAL:
+                    self.heartbeat_at = time.monotonic()
+                    heartbeat(list(running.values()))
+                for job_id in claim(processes - len(running), self.worker):
+                    running[pool.submit(worker.execute, job_id)] = job_id
+                if not running:
+                    if options['burst']:
+                        return
+                    connection.close()
+                    time.sleep(options['poll'])
+                    continue
+                done, _ = wait(running, timeout=options['poll'], return_when=FIRST_COMPLETED)
+                lost = []
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        self.report(job_id, future.result())
+                    except BrokenProcessPool:
+                        lost.append(job_id)
+                    except Exception as exc:
+                        # run_job records handler errors itself; this is e.g. the database going away.
+                        self.stderr.write(f'Job {job_id}: {exc!r}')
+                        release([job_id], 'The worker failed while running this job')
+                if lost:
+                    # A process died (killed, out of memory) and took the pool down with every job in it.
+                    self.stderr.write('A worker process died; restarting the pool')
+                    release(lost + list(running.values()), 'The worker process running this job died')
+                    running = {}
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = self.start_pool(processes)
+        except KeyboardInterrupt:
+            self.stderr.write('Interrupted; returning unfinished jobs to the queue')
+            release(list(running.values()), 'The worker was stopped while running this job')
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def start_pool(self, processes):
+        # Spawned, not forked: children must not share the parent's database connections.
+        return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=worker.setup_process, max_tasks_per_child=MAX_JOBS_PER_PROCESS)
+
+    def report(self, job_id, status):
+        style = self.style.SUCCESS if status == 'done' else self.style.ERROR
+        self.stdout.write(style(f'Job {job_id}: {status}'))
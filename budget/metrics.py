@@ -0,0 +1,167 @@
+"""Per-request performance numbers: Server-Timing headers and Prometheus histograms.
+
+PerformanceMiddleware samples requests (BUDGET_METRICS_SAMPLE_RATE). For a
+sampled request, every query run on its behalf, including on worker threads,
+is counted and timed through the execute wrapper installed on new connections
+(see budget.signals). The numbers are per process; scrape every worker.
+"""
+import contextvars
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+METRICS_SAMPLE_RATE = 1.0
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+current_timing = contextvars.ContextVar('budget_request_timing', default=None)
+
+
+def sample_rate():
+    return getattr(settings, 'BUDGET_METRICS_SAMPLE_RATE', METRICS_SAMPLE_RATE)
+
+
+class RequestTiming:
+    """What one sampled request spent, in seconds."""
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = self.clock()
+        self.queries = 0
+        self.db = 0.0
+        self.render = 0.0
+        self.total = None
+
+    def add_query(self, duration):
+        with self._lock:
+            self.queries += 1
+            self.db += duration
+
+    def add_render(self, duration):
+        self.render += duration
+
+    def finish(self):
+        self.total = self.clock() - self.started
+
+    @property
+    def app(self):
+        return max(self.total - self.db - self.render, 0.0)
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db * 1000:.1f};desc="{self.queries} queries"',
+            f'render;dur={self.render * 1000:.1f}',
+            f'app;dur={self.app * 1000:.1f}',
+            f'total;dur={self.total * 1000:.1f}',
+        ])
+
+
+def time_query(execute, sql, params, many, context):
+    """connection.execute_wrapper that charges queries to the current sampled request."""
+    timing = current_timing.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.add_query(time.perf_counter() - started)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """In-process request counters and per-endpoint histograms."""
+
+    HISTOGRAMS = {
+        'budget_request_duration_seconds': ('Total request time of sampled requests', DURATION_BUCKETS),
+        'budget_request_db_seconds': ('Time spent in SQL queries by sampled requests', DURATION_BUCKETS),
+        'budget_request_render_seconds': ('Time spent rendering the response of sampled requests', DURATION_BUCKETS),
+        'budget_request_queries': ('SQL queries run by sampled requests', QUERY_BUCKETS),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)
+        self._histograms = {}
+
+    def record_request(self, endpoint, method, status):
+        with self._lock:
+            self._requests[(endpoint, method, str(status))] += 1
+
+    def record_timing(self, endpoint, timing):
+        values = {
+            'budget_request_duration_seconds': timing.total,
+            'budget_request_db_seconds': timing.db,
+            'budget_request_render_seconds': timing.render,
+            'budget_request_queries': timing.queries,
+        }
+        with self._lock:
+            for name, value in values.items():
+                histogram = self._histograms.get((name, endpoint))
+                if histogram is None:
+                    histogram = self._histograms[(name, endpoint)] = Histogram(self.HISTOGRAMS[name][1])
+                histogram.observe(value)
+
+    def reset(self):
+        with self._lock:
+            self._requests.clear()
+            self._histograms.clear()
+
+    def render(self, cache_stats=None):
+        """The Prometheus text exposition format."""
+        with self._lock:
+            requests = dict(self._requests)
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+        lines = [
+            '# HELP budget_requests_total Requests handled, sampled or not',
+            '# TYPE budget_requests_total counter',
+        ]
+        for (endpoint, method, status), count in sorted(requests.items()):
+            lines.append(f'budget_requests_total{{{labels(endpoint=endpoint, method=method, status=status)}}} {count}')
+
+        for name, (help_text, buckets) in self.HISTOGRAMS.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for (histogram_name, endpoint), (counts, total, count) in sorted(histograms.items()):
+                if histogram_name != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    lines.append(f'{name}_bucket{{{labels(endpoint=endpoint, le=bound)}}} {cumulative}')
+                lines.append(f'{name}_sum{{{labels(endpoint=endpoint)}}} {total:g}')
+                lines.append(f'{name}_count{{{labels(endpoint=endpoint)}}} {count}')
+
+        if cache_stats is not None:
+            lines += [
+                '# HELP budget_response_cache_total Response cache lookups by outcome',
+                '# TYPE budget_response_cache_total counter',
+            ]
+            for endpoint, counts in cache_stats.items():
+                for outcome, key in (('hit', 'hits'), ('miss', 'misses')):
+                    lines.append(f'budget_response_cache_total{{{labels(endpoint=endpoint, outcome=outcome)}}} {counts[key]}')
+        return '\n'.join(lines) + '\n'
+
+
+def labels(**values):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{key}="{escape(value)}"' for key, value in values.items())
+
+
+metrics = Metrics()
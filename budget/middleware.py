@@ -0,0 +1,144 @@
+import random
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from .metrics import RequestTiming, current_timing, metrics, sample_rate
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_SIZE = 1024
+BROTLI_QUALITY = 4
+# Only payloads without secrets next to reflected input: brotli has no BREACH
+# padding, unlike Django's gzip (used for everything else, e.g. HTML with CSRF tokens).
+BROTLI_CONTENT_TYPES = ('application/json', 'application/x-ndjson', 'text/csv')
+# Compressing these again only costs CPU.
+COMPRESSED_CONTENT_TYPES = ('application/gzip', 'application/zip')
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+
+class PerformanceMiddleware:
+    """Count every request; for sampled ones, time SQL, rendering and the whole request.
+
+    Sampled responses carry a Server-Timing header (unless BUDGET_SERVER_TIMING is
+    off) and feed the per-endpoint histograms served at /metrics. Put it first in
+    MIDDLEWARE so the total includes the other middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timing, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                current_timing.reset(token)
+        return self.finish(request, response, timing)
+
+    async def __acall__(self, request):
+        timing, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            if token is not None:
+                current_timing.reset(token)
+        return self.finish(request, response, timing)
+
+    def start(self, request):
+        rate = sample_rate()
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return None, None
+        timing = RequestTiming()
+        request.performance_timing = timing
+        return timing, current_timing.set(timing)
+
+    def process_template_response(self, request, response):
+        # DRF and template responses render after the view returns; time that separately.
+        timing = getattr(request, 'performance_timing', None)
+        if timing is not None:
+            started = timing.clock()
+            response.add_post_render_callback(lambda rendered: timing.add_render(timing.clock() - started))
+        return response
+
+    def finish(self, request, response, timing):
+        match = request.resolver_match
+        endpoint = match.view_name if match else 'unmatched'
+        metrics.record_request(endpoint, request.method, response.status_code)
+        if timing is not None:
+            timing.finish()
+            metrics.record_timing(endpoint, timing)
+            if getattr(settings, 'BUDGET_SERVER_TIMING', True):
+                response['Server-Timing'] = timing.server_timing()
+        return response
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZipMiddleware that skips small responses and prefers brotli for API payloads.
+
+    Responses shorter than BUDGET_COMPRESSION_MIN_SIZE bytes are sent as is.
+    JSON, NDJSON and CSV go out as brotli (BUDGET_BROTLI_QUALITY) to clients that
+    accept it, when the ``brotli`` package is installed; everything else as gzip.
+    """
+
+    def process_response(self, request, response):
+        min_size = getattr(settings, 'BUDGET_COMPRESSION_MIN_SIZE', COMPRESSION_MIN_SIZE)
+        if not response.streaming and len(response.content) < min_size:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip()
+        if content_type in COMPRESSED_CONTENT_TYPES:
+            return response
+        if (brotli is None or content_type not in BROTLI_CONTENT_TYPES
+                or not re_accepts_brotli.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        quality = getattr(settings, 'BUDGET_BROTLI_QUALITY', BROTLI_QUALITY)
+        if response.streaming:
+            response.streaming_content = self.brotli_stream(response, quality)
+            del response.headers['Content-Length']
+        else:
+            compressed = brotli.compress(response.content, quality=quality)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
+
+    def brotli_stream(self, response, quality):
+        content = response.streaming_content
+        compressor = brotli.Compressor(quality=quality)
+        if response.is_async:
+            async def compress():
+                async for chunk in content:
+                    if data := compressor.process(chunk):
+                        yield data
+                yield compressor.finish()
+            return compress()
+
+        def compress():
+            for chunk in content:
+                if data := compressor.process(chunk):
+                    yield data
+            yield compressor.finish()
+        return compress()
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def populate_ledgers(apps, schema_editor):
+    Transaction = apps.get_model('budget', 'Transaction')
+    UserLedger = apps.get_model('budget', 'UserLedger')
+    rows = Transaction.objects.order_by().values('user_id').annotate(
+        income=Sum('amount', filter=Q(amount__gt=0)),
+        expenses=Sum('amount', filter=Q(amount__lt=0)),
+        count=Count('id'),
+    )
+    UserLedger.objects.bulk_create([
+        UserLedger(
+            user_id=row['user_id'],
+            total_income=row['income'] or 0,
+            total_expenses=-(row['expenses'] or 0),
+            transaction_count=row['count'],
+        )
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0003_usersettings'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_income', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('total_expenses', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('transaction_count', models.PositiveIntegerField(default=0)),
+                ('last_modified', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ledger', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(populate_ledgers, migrations.RunPython.noop),
+    ]
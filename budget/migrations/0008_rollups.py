@@ -0,0 +1,73 @@
+# Generated by Django 5.1.1 on 2026-10-18 17:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+
+
+def populate_rollups(apps, schema_editor):
+    Transaction = apps.get_model('budget', 'Transaction')
+    for model_name, period in (('DailyRollup', F('date')), ('MonthlyRollup', TruncMonth('date'))):
+        Rollup = apps.get_model('budget', model_name)
+        rows = Transaction.objects.order_by().annotate(period=period).values('user_id', 'category_id', 'period').annotate(
+            income=Sum('amount', filter=Q(amount__gt=0)),
+            expenses=Sum('amount', filter=Q(amount__lt=0)),
+            count=Count('id'),
+        )
+        Rollup.objects.bulk_create([
+            Rollup(
+                user_id=row['user_id'],
+                category_id=row['category_id'],
+                period=row['period'],
+                income=row['income'] or 0,
+                expenses=-(row['expenses'] or 0),
+                transaction_count=row['count'],
+            )
+            for row in rows
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0007_dataversion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('income', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('expenses', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='budget.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('user', 'category', 'period'), name='budget_dailyrollup_unique'), models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('user', 'period'), name='budget_dailyrollup_unique_uncategorized')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField()),
+                ('income', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('expenses', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='budget.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('user', 'category', 'period'), name='budget_monthlyrollup_unique'), models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('user', 'period'), name='budget_monthlyrollup_unique_uncategorized')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,117 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:00
+
+import budget.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+SQLITE_FORWARD = [
+    """CREATE VIRTUAL TABLE budget_transactionsearch USING fts5(
+        description, category_name, tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER budget_transactionsearch_insert AFTER INSERT ON budget_transaction BEGIN
+        INSERT INTO budget_transactionsearch(rowid, description, category_name)
+        VALUES (new.id, new.description, COALESCE((SELECT name FROM budget_category WHERE id = new.category_id), ''));
+    END""",
+    """CREATE TRIGGER budget_transactionsearch_update AFTER UPDATE OF description, category_id ON budget_transaction BEGIN
+        DELETE FROM budget_transactionsearch WHERE rowid = old.id;
+        INSERT INTO budget_transactionsearch(rowid, description, category_name)
+        VALUES (new.id, new.description, COALESCE((SELECT name FROM budget_category WHERE id = new.category_id), ''));
+    END""",
+    """CREATE TRIGGER budget_transactionsearch_delete AFTER DELETE ON budget_transaction BEGIN
+        DELETE FROM budget_transactionsearch WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER budget_transactionsearch_category AFTER UPDATE OF name ON budget_category BEGIN
+        UPDATE budget_transactionsearch SET category_name = new.name
+        WHERE rowid IN (SELECT id FROM budget_transaction WHERE category_id = new.id);
+    END""",
+    """INSERT INTO budget_transactionsearch(rowid, description, category_name)
+        SELECT t.id, t.description, COALESCE(c.name, '')
+        FROM budget_transaction t LEFT JOIN budget_category c ON c.id = t.category_id""",
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER budget_transactionsearch_category',
+    'DROP TRIGGER budget_transactionsearch_delete',
+    'DROP TRIGGER budget_transactionsearch_update',
+    'DROP TRIGGER budget_transactionsearch_insert',
+    'DROP TABLE budget_transactionsearch',
+]
+
+POSTGRESQL_FORWARD = [
+    """CREATE TABLE budget_transactionsearch (
+        rowid bigint PRIMARY KEY REFERENCES budget_transaction(id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED,
+        document tsvector NOT NULL
+    )""",
+    'CREATE INDEX budget_transactionsearch_document ON budget_transactionsearch USING GIN (document)',
+    """CREATE FUNCTION budget_transactionsearch_document(description text, category bigint) RETURNS tsvector AS $$
+        SELECT setweight(to_tsvector('simple', COALESCE(description, '')), 'A')
+            || setweight(to_tsvector('simple', COALESCE((SELECT name FROM budget_category WHERE id = category), '')), 'B')
+    $$ LANGUAGE sql STABLE""",
+    """CREATE FUNCTION budget_transactionsearch_sync() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO budget_transactionsearch(rowid, document)
+        VALUES (NEW.id, budget_transactionsearch_document(NEW.description, NEW.category_id))
+        ON CONFLICT (rowid) DO UPDATE SET document = EXCLUDED.document;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE TRIGGER budget_transactionsearch_sync AFTER INSERT OR UPDATE OF description, category_id
+        ON budget_transaction FOR EACH ROW EXECUTE FUNCTION budget_transactionsearch_sync()""",
+    """CREATE FUNCTION budget_transactionsearch_category() RETURNS trigger AS $$
+    BEGIN
+        UPDATE budget_transactionsearch s
+        SET document = budget_transactionsearch_document(t.description, t.category_id)
+        FROM budget_transaction t WHERE t.category_id = NEW.id AND s.rowid = t.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE TRIGGER budget_transactionsearch_category AFTER UPDATE OF name
+        ON budget_category FOR EACH ROW EXECUTE FUNCTION budget_transactionsearch_category()""",
+    """INSERT INTO budget_transactionsearch(rowid, document)
+        SELECT id, budget_transactionsearch_document(description, category_id) FROM budget_transaction""",
+]
+
+POSTGRESQL_BACKWARD = [
+    'DROP TRIGGER budget_transactionsearch_category ON budget_category',
+    'DROP TRIGGER budget_transactionsearch_sync ON budget_transaction',
+    'DROP FUNCTION budget_transactionsearch_category()',
+    'DROP FUNCTION budget_transactionsearch_sync()',
+    'DROP FUNCTION budget_transactionsearch_document(text, bigint)',
+    'DROP TABLE budget_transactionsearch',
+]
+
+STATEMENTS = {
+    'sqlite': (SQLITE_FORWARD, SQLITE_BACKWARD),
+    'postgresql': (POSTGRESQL_FORWARD, POSTGRESQL_BACKWARD),
+}
+
+
+def run_statements(direction):
+    # Other databases get no index; budget.search falls back to icontains there.
+    def run(apps, schema_editor):
+        statements = STATEMENTS.get(schema_editor.connection.vendor)
+        if statements:
+            for statement in statements[direction]:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0008_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionSearch',
+            fields=[
+                ('transaction', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search', serialize=False, to='budget.transaction')),
+                ('document', budget.search.SearchDocumentField()),
+            ],
+            options={
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(run_statements(0), run_statements(1)),
+    ]
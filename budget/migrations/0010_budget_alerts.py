@@ -0,0 +1,64 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:20
+
+import django.db.models.deletion
+from django.conf import settings
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_spent(apps, schema_editor):
+    # Existing overspending counts as already notified; only later crossings queue notifications.
+    Budget = apps.get_model('budget', 'Budget')
+    Transaction = apps.get_model('budget', 'Transaction')
+    thresholds = getattr(settings, 'BUDGET_ALERT_THRESHOLDS', (80, 100))
+    for budget in Budget.objects.all():
+        total = Transaction.objects.filter(
+            user_id=budget.user_id,
+            category_id=budget.category_id,
+            date__range=(budget.start_date, budget.end_date),
+        ).aggregate(Sum('amount'))['amount__sum']
+        budget.spent = Decimal(-(total or 0)).quantize(Decimal('0.01'))
+        if budget.amount > 0:
+            budget.alert_level = max((t for t in thresholds if budget.spent * 100 >= budget.amount * t), default=0)
+        budget.save(update_fields=['spent', 'alert_level'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0009_transaction_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='budget',
+            name='alert_level',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='spent',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=15),
+        ),
+        migrations.CreateModel(
+            name='BudgetNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('threshold', models.PositiveSmallIntegerField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('spent', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('budget', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='budget.budget')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='budget_notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['user', '-id'], name='notification_user_idx')],
+            },
+        ),
+        migrations.RunPython(populate_spent, migrations.RunPython.noop),
+    ]
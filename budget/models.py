@@ -1,7 +1,15 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, router, transaction, IntegrityError
 from django.contrib.auth.models import User
-from django.db.models import Sum
+from django.db.models import Sum, Count, Q, F, OuterRef, Subquery, Value, Case, When
+from django.db.models.functions import Coalesce, TruncMonth
 from django.utils import timezone
+from decimal import Decimal
+from .search import SearchDocumentField
+from .categories import category_cache
+
+CENT = Decimal('0.01')
+BUDGET_ALERT_THRESHOLDS = (80, 100)
 
 class Category(models.Model):
     CATEGORY_TYPES = [
@@ -18,6 +26,117 @@ class Category(models.Model):
     class Meta:
         verbose_name_plural = "Categories"
 
+def cents(total):
+    """Round an aggregated amount to cents; SQLite sums decimals as floats."""
+    return Decimal(total or 0).quantize(CENT)
+
+def split_amount(amount):
+    """Return the (income, expenses) contribution of a signed amount."""
+    if amount > 0:
+        return amount, 0
+    return 0, -amount
+
+ROLLUP_FIELDS = ('amount', 'date', 'category', 'category_id')
+
+class TransactionQuerySet(models.QuerySet):
+    """Keeps UserLedger, the rollups and DataVersion in sync for bulk writes that bypass Transaction.save/delete."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            user_ids = {obj.user_id for obj in created}
+            DataVersion.bump(user_ids)
+            if kwargs.get('ignore_conflicts') or kwargs.get('update_conflicts'):
+                UserLedger.rebuild(user_ids)
+                rebuild_rollups(user_ids)
+                rebuild_budget_spend(user_ids)
+                return created
+            for obj in created:
+                obj._db_state = obj.get_db_state()
+            apply_state_deltas((obj._db_state, 1) for obj in created)
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        changed = {Transaction._meta.get_field(name).attname for name in fields}
+        with transaction.atomic(using=self.db):
+            unknown = [obj.pk for obj in objs if getattr(obj, '_db_state', None) is None]
+            previous = {obj.pk: obj._db_state for obj in objs if getattr(obj, '_db_state', None) is not None}
+            previous.update(
+                (row[0], row[1:]) for row in
+                Transaction.objects.filter(pk__in=unknown).values_list('pk', *Transaction.DB_STATE_FIELDS)
+            )
+            # Django implements bulk_update with update(); a plain QuerySet skips our rebuild there.
+            rows = models.QuerySet(self.model, using=self.db).bulk_update(objs, fields, *args, **kwargs)
+            signed_states = []
+            for obj in objs:
+                before = previous.get(obj.pk)
+                if before is None:
+                    continue
+                # Fields left out of the update keep their database values.
+                current = tuple(
+                    value if attname in changed else old
+                    for attname, value, old in zip(Transaction.DB_STATE_FIELDS, obj.get_db_state(), before)
+                )
+                obj._db_state = current
+                if current != before:
+                    signed_states += [(before, -1), (current, 1)]
+            DataVersion.bump({state[0] for state in previous.values()} | {obj.user_id for obj in objs})
+            apply_state_deltas(signed_states)
+        return rows
+
+    def update(self, **kwargs):
+        with transaction.atomic(using=self.db):
+            user_ids = set(self.order_by().values_list('user_id', flat=True).distinct())
+            rows = super().update(**kwargs)
+            new_user = kwargs.get('user', kwargs.get('user_id'))
+            if new_user is not None:
+                user_ids.add(getattr(new_user, 'pk', new_user))
+            DataVersion.bump(user_ids)
+            if 'amount' in kwargs or new_user is not None:
+                UserLedger.rebuild(user_ids)
+            if new_user is not None or any(field in kwargs for field in ROLLUP_FIELDS):
+                rebuild_rollups(user_ids)
+                rebuild_budget_spend(user_ids)
+        return rows
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            totals = list(self.order_by().values('user_id').annotate(**UserLedger.AGGREGATES))
+            rollup_totals = list(self.order_by().values('user_id', 'category_id', 'date').annotate(**UserLedger.AGGREGATES))
+            result = super().delete()
+            DataVersion.bump(row['user_id'] for row in totals)
+            for row in totals:
+                UserLedger.apply_delta(
+                    row['user_id'],
+                    -(row['income'] or 0),
+                    row['expenses'] or 0,
+                    -row['count'],
+                )
+            deltas = {
+                (row['user_id'], row['category_id'], row['date']): [-(row['income'] or 0), row['expenses'] or 0, -row['count']]
+                for row in rollup_totals
+            }
+            apply_rollup_deltas(deltas)
+            apply_budget_deltas(deltas)
+        return result
+
+def apply_state_deltas(signed_states):
+    """Add (sign = 1) or remove (sign = -1) Transaction.get_db_state() tuples from the ledger, rollups and budgets."""
+    deltas = {}
+    rollup_deltas = {}
+    for (user_id, amount, category_id, date), sign in signed_states:
+        income, expenses = split_amount(amount)
+        for key, bucket in ((user_id, deltas), ((user_id, category_id, date), rollup_deltas)):
+            delta = bucket.setdefault(key, [0, 0, 0])
+            delta[0] += sign * income
+            delta[1] += sign * expenses
+            delta[2] += sign
+    for user_id, (income, expenses, count) in deltas.items():
+        UserLedger.apply_delta(user_id, income, expenses, count)
+    apply_rollup_deltas(rollup_deltas)
+    apply_budget_deltas(rollup_deltas)
+
 class Transaction(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     date = models.DateField()
@@ -25,10 +144,72 @@ class Transaction(models.Model):
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    objects = TransactionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Listing and dashboard "recent" order: user + (-date, -id).
+            models.Index(fields=['user', '-date', '-id'], name='txn_user_date_id_idx'),
+            # Category filters and Budget.remaining_budget date ranges.
+            models.Index(fields=['user', 'category', 'date'], name='txn_user_cat_date_idx'),
+            # Sign-partitioned aggregates (income vs expenses).
+            models.Index(fields=['user', 'amount'], condition=Q(amount__gt=0), name='txn_user_income_idx'),
+            models.Index(fields=['user', 'amount'], condition=Q(amount__lt=0), name='txn_user_expense_idx'),
+        ]
+
+    DB_STATE_FIELDS = ('user_id', 'amount', 'category_id', 'date')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if all(field in field_names for field in cls.DB_STATE_FIELDS):
+            instance._db_state = instance.get_db_state()
+        return instance
+
+    def get_db_state(self):
+        """What this row contributes to the ledger and rollups."""
+        return (self.user_id, self.amount, self.category_id, self.date)
+
+    def category_type(self):
+        if self.category_id is None:
+            return None
+        if not Transaction.category.is_cached(self):
+            # Saves by category_id read the type from the cache instead of the table.
+            category = category_cache.get(self.user_id, self.category_id)
+            if category is not None:
+                return category.type
+        return self.category.type
+
     def save(self, *args, **kwargs):
-        if self.category and self.category.type == 'expense' and self.amount > 0:
+        if self.category_type() == 'expense' and self.amount > 0:
             self.amount = -self.amount
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                # This instance may be stale (saved or deleted through another one): count what the row holds now.
+                previous = self._locked_db_state()
+            super().save(*args, **kwargs)
+            current = self.get_db_state()
+            # One pass over the ledger, rollups and budgets; none when only e.g. the description changed.
+            if previous is None:
+                apply_state_deltas([(current, 1)])
+            elif previous != current:
+                apply_state_deltas([(previous, -1), (current, 1)])
+            DataVersion.bump({self.user_id, previous[0]} if previous else [self.user_id])
+        self._db_state = current
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            state = self._locked_db_state()
+            result = super().delete(*args, **kwargs)
+            # Deleting a row that is already gone removes nothing, so there is nothing to subtract.
+            if result[1].get(self._meta.label):
+                apply_state_deltas([(state, -1)])
+                DataVersion.bump([state[0]])
+        return result
+
+    def _locked_db_state(self):
+        return Transaction.objects.select_for_update().filter(pk=self.pk).values_list(*self.DB_STATE_FIELDS).first()
 
     @property
     def transaction_type(self):
@@ -37,17 +218,109 @@ class Transaction(models.Model):
     def __str__(self):
         return f"{self.amount:.2f} - {self.category} - {self.date}"
 
+REMAINING_FIELD = models.DecimalField(max_digits=15, decimal_places=2)
+
+def _remaining_annotation(spent_queryset, today):
+    """amount + spend to date while the period is active, otherwise the full amount."""
+    spent = Coalesce(Subquery(spent_queryset.values('total')[:1]), Value(0), output_field=REMAINING_FIELD)
+    return Case(
+        When(start_date__lte=today, end_date__gte=today, then=F('amount') + spent),
+        default=F('amount'),
+        output_field=REMAINING_FIELD,
+    )
+
+class BudgetQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            # Budget.save counts the spend; bulk_create skips it.
+            refresh_budget_spend(Budget.objects.using(self.db).filter(pk__in=[budget.pk for budget in created]))
+        return created
+
+    def with_remaining(self):
+        """Annotate remaining amounts for every budget in the same SELECT."""
+        today = timezone.now().date()
+        spent = Transaction.objects.filter(
+            user=OuterRef('user'),
+            category=OuterRef('category'),
+            date__gte=OuterRef('start_date'),
+            date__lte=today,
+        ).order_by().values('category').annotate(total=Sum('amount'))
+        return self.annotate(annotated_remaining=_remaining_annotation(spent, today))
+
+    def with_computed_spent(self):
+        """Annotate what ``spent`` should be, aggregated from Transaction over each whole period."""
+        total = Transaction.objects.filter(
+            user=OuterRef('user'),
+            category=OuterRef('category'),
+            date__gte=OuterRef('start_date'),
+            date__lte=OuterRef('end_date'),
+        ).order_by().values('category').annotate(total=Sum('amount'))
+        return self.annotate(computed_spent=Coalesce(Subquery(total.values('total')[:1]), Value(0),
+                                                     output_field=REMAINING_FIELD))
+
+class TotalBudgetQuerySet(models.QuerySet):
+    def with_remaining(self):
+        today = timezone.now().date()
+        spent = Transaction.objects.filter(
+            user=OuterRef('user'),
+            date__gte=OuterRef('start_date'),
+            date__lte=today,
+        ).order_by().values('user').annotate(total=Sum('amount'))
+        return self.annotate(annotated_remaining=_remaining_annotation(spent, today))
+
 class Budget(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     start_date = models.DateField()
     end_date = models.DateField()
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Net spend in the category over the whole period, maintained from Transaction writes.
+    spent = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    # Highest BUDGET_ALERT_THRESHOLDS percentage that spent has reached.
+    alert_level = models.PositiveSmallIntegerField(default=0)
+
+    objects = BudgetQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.category} - {self.amount:.2f}"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            # The period or category may have changed: recount, it's one indexed aggregate.
+            total = Transaction.objects.filter(
+                user_id=self.user_id,
+                category_id=self.category_id,
+                date__range=(self.start_date, self.end_date),
+            ).aggregate(Sum('amount'))['amount__sum']
+            raised = self.move_alert_level(cents(-(total or 0)))
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'spent', 'alert_level'}
+            super().save(*args, **kwargs)
+            if raised:
+                queue_budget_notifications([self])
+
+    def reached_level(self, spent):
+        if self.amount <= 0:
+            return 0
+        thresholds = getattr(settings, 'BUDGET_ALERT_THRESHOLDS', BUDGET_ALERT_THRESHOLDS)
+        return max((threshold for threshold in thresholds if spent * 100 >= self.amount * threshold), default=0)
+
+    def move_alert_level(self, spent):
+        """Set spent and the alert level it reaches; True when that is a higher threshold than before."""
+        level = self.reached_level(spent)
+        raised = level > self.alert_level
+        self.spent, self.alert_level = spent, level
+        return raised
+
+    def set_spent(self, spent):
+        raised = self.move_alert_level(spent)
+        Budget.objects.filter(pk=self.pk).update(spent=self.spent, alert_level=self.alert_level)
+        return raised
+
     def remaining_budget(self):
+        if hasattr(self, 'annotated_remaining'):
+            return self.annotated_remaining
         current_date = timezone.now().date()
         if current_date < self.start_date or current_date > self.end_date:
             return self.amount
@@ -64,10 +337,14 @@ class TotalBudget(models.Model):
     end_date = models.DateField()
     user = models.OneToOneField(User, on_delete=models.CASCADE)
 
+    objects = TotalBudgetQuerySet.as_manager()
+
     def __str__(self):
         return f"Total Budget: {self.amount:.2f}"
 
     def total_remaining_budget(self):
+        if hasattr(self, 'annotated_remaining'):
+            return self.annotated_remaining
         current_date = timezone.now().date()
         if current_date < self.start_date or current_date > self.end_date:
             return self.amount
@@ -77,6 +354,87 @@ class TotalBudget(models.Model):
         ).aggregate(Sum('amount'))['amount__sum'] or 0
         return self.amount + spent  # spent is negative for expenses
 
+def apply_budget_deltas(deltas):
+    """Apply {(user_id, category_id, date): [income, expenses, count]} to the budgets whose period covers each date."""
+    spending = {}
+    for (user_id, category_id, date), (income, expenses, count) in deltas.items():
+        if category_id is not None and income != expenses:
+            spending.setdefault((user_id, category_id), []).append((date, expenses - income))
+    if not spending:
+        return
+    # Lock only the budgets whose period overlaps the touched dates, not every past budget of the category.
+    condition = Q()
+    for (user_id, category_id), changes in spending.items():
+        dates = [date for date, _ in changes]
+        condition |= Q(user_id=user_id, category_id=category_id, start_date__lte=max(dates), end_date__gte=min(dates))
+    raised = []
+    for budget in Budget.objects.select_for_update().filter(condition):
+        delta = sum(amount for date, amount in spending[budget.user_id, budget.category_id]
+                    if budget.start_date <= date <= budget.end_date)
+        if delta and budget.set_spent(cents(budget.spent + delta)):
+            raised.append(budget)
+    queue_budget_notifications(raised)
+
+def rebuild_budget_spend(user_ids=None):
+    return refresh_budget_spend(Budget.objects.all() if user_ids is None else Budget.objects.filter(user_id__in=user_ids))
+
+def refresh_budget_spend(budgets):
+    """Recount spent for these budgets from Transaction; returns how many were corrected."""
+    budgets = budgets.select_for_update()
+    raised = []
+    rebuilt = 0
+    with transaction.atomic(using=budgets.db):
+        for budget in budgets.with_computed_spent():
+            expected = cents(-budget.computed_spent)
+            if (expected, budget.reached_level(expected)) != (budget.spent, budget.alert_level):
+                rebuilt += 1
+                if budget.set_spent(expected):
+                    raised.append(budget)
+        queue_budget_notifications(raised)
+    return rebuilt
+
+def verify_budget_spend(user_ids=None):
+    """Return (budget id, stored, expected) for every budget whose spend disagrees with Transaction."""
+    budgets = Budget.objects.all() if user_ids is None else Budget.objects.filter(user_id__in=user_ids)
+    mismatches = []
+    for budget in budgets.with_computed_spent().order_by('pk'):
+        expected = cents(-budget.computed_spent)
+        if budget.spent != expected:
+            mismatches.append((budget.pk, budget.spent, expected))
+    return mismatches
+
+def queue_budget_notifications(budgets):
+    """Store a BudgetNotification for each budget that just reached a higher threshold, if its owner wants them."""
+    if not budgets:
+        return
+    enabled = set(UserSettings.objects.filter(
+        user_id__in={budget.user_id for budget in budgets}, notifications_enabled=True,
+    ).values_list('user_id', flat=True))
+    BudgetNotification.objects.bulk_create([
+        BudgetNotification(user_id=budget.user_id, budget=budget, threshold=budget.alert_level,
+                           amount=budget.amount, spent=budget.spent)
+        for budget in budgets if budget.user_id in enabled
+    ])
+
+class BudgetNotification(models.Model):
+    """A budget's spend reached one of BUDGET_ALERT_THRESHOLDS; queued at write time for the API to hand out."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budget_notifications')
+    budget = models.ForeignKey(Budget, on_delete=models.CASCADE, related_name='notifications')
+    threshold = models.PositiveSmallIntegerField()
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    spent = models.DecimalField(max_digits=15, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['user', '-id'], name='notification_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.budget_id}: {self.threshold}% ({self.spent:.2f} of {self.amount:.2f})"
+
 class UserSettings(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='settings')
     notifications_enabled = models.BooleanField(default=False)
@@ -84,4 +442,321 @@ class UserSettings(models.Model):
     language = models.CharField(max_length=2, default='ru', choices=[('ru', 'Russian'), ('en', 'English')])
 
     def __str__(self):
-        return f"{self.user.username}'s settings"
\ No newline at end of file
+        return f"{self.user.username}'s settings"
+
+class UserLedger(models.Model):
+    """Running per-user totals so dashboards don't have to aggregate every transaction."""
+    AGGREGATES = {
+        'income': Sum('amount', filter=Q(amount__gt=0)),
+        'expenses': Sum('amount', filter=Q(amount__lt=0)),
+        'count': Count('id'),
+    }
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='ledger')
+    total_income = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    total_expenses = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    transaction_count = models.PositiveIntegerField(default=0)
+    last_modified = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username}'s ledger"
+
+    @property
+    def balance(self):
+        return self.total_income - self.total_expenses
+
+    @property
+    def savings_rate(self):
+        if self.total_income <= 0:
+            return 0
+        return round(self.balance / self.total_income * 100, 2)
+
+    @classmethod
+    def compute(cls, user_ids=None):
+        """Aggregate ledger totals straight from Transaction, keyed by user id."""
+        queryset = Transaction.objects.all()
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=user_ids)
+        rows = queryset.order_by().values('user_id').annotate(**cls.AGGREGATES)
+        return {
+            row['user_id']: (cents(row['income']), cents(-(row['expenses'] or 0)), row['count'])
+            for row in rows
+        }
+
+    @classmethod
+    def rebuild(cls, user_ids=None):
+        if user_ids is None:
+            user_ids = list(User.objects.values_list('id', flat=True))
+        user_ids = list(user_ids)
+        totals = cls.compute(user_ids)
+        for user_id in user_ids:
+            income, expenses, count = totals.get(user_id, (0, 0, 0))
+            cls.objects.update_or_create(
+                user_id=user_id,
+                defaults={'total_income': income, 'total_expenses': expenses, 'transaction_count': count},
+            )
+        return len(user_ids)
+
+    @classmethod
+    def verify(cls, user_ids=None):
+        """Return (user_id, stored, expected) for every ledger that disagrees with Transaction."""
+        if user_ids is None:
+            user_ids = list(User.objects.values_list('id', flat=True))
+        totals = cls.compute(user_ids)
+        ledgers = {ledger.user_id: ledger for ledger in cls.objects.filter(user_id__in=user_ids)}
+        mismatches = []
+        for user_id in user_ids:
+            expected = totals.get(user_id, (0, 0, 0))
+            ledger = ledgers.get(user_id)
+            stored = (ledger.total_income, ledger.total_expenses, ledger.transaction_count) if ledger else None
+            if stored != expected:
+                mismatches.append((user_id, stored, expected))
+        return mismatches
+
+    @classmethod
+    def apply_delta(cls, user_id, income=0, expenses=0, count=0):
+        updated = cls.objects.filter(user_id=user_id).update(
+            total_income=F('total_income') + income,
+            total_expenses=F('total_expenses') + expenses,
+            transaction_count=F('transaction_count') + count,
+            last_modified=timezone.now(),
+        )
+        if not updated:
+            # No ledger yet: build it from the table, which already includes this write.
+            try:
+                with transaction.atomic():
+                    cls.rebuild([user_id])
+            except IntegrityError:
+                pass
+
+    @classmethod
+    def for_user(cls, user):
+        ledger = cls.objects.filter(user=user).first()
+        if ledger is None:
+            cls.rebuild([user.pk])
+            # Read the new row back from the database it was written to, not a lagging replica.
+            ledger = cls.objects.db_manager(router.db_for_write(cls)).get(user=user)
+        return ledger
+
+
+class Rollup(models.Model):
+    """Per user x category x period totals, maintained incrementally from Transaction writes."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, related_name='+')
+    period = models.DateField()
+    income = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    expenses = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    transaction_count = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category', 'period'], name='%(app_label)s_%(class)s_unique'),
+            # NULLs are distinct in unique constraints, so uncategorized rows need their own.
+            models.UniqueConstraint(fields=['user', 'period'], condition=Q(category__isnull=True),
+                                    name='%(app_label)s_%(class)s_unique_uncategorized'),
+        ]
+
+    @staticmethod
+    def bucket(date):
+        return date
+
+    @classmethod
+    def apply_delta(cls, user_id, category_id, period, income, expenses, count):
+        rows = cls.objects.filter(user_id=user_id, category_id=category_id, period=period)
+        changes = {
+            'income': F('income') + income,
+            'expenses': F('expenses') + expenses,
+            'transaction_count': F('transaction_count') + count,
+        }
+        if rows.update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(user_id=user_id, category_id=category_id, period=period,
+                                   income=income, expenses=expenses, transaction_count=count)
+        except IntegrityError:
+            rows.update(**changes)
+
+class DailyRollup(Rollup):
+    pass
+
+class MonthlyRollup(Rollup):
+    @staticmethod
+    def bucket(date):
+        return date.replace(day=1)
+
+ROLLUPS = (DailyRollup, MonthlyRollup)
+
+def apply_rollup_deltas(deltas):
+    """Apply {(user_id, category_id, date): [income, expenses, count]} to every rollup."""
+    for model in ROLLUPS:
+        merged = {}
+        for (user_id, category_id, date), (income, expenses, count) in deltas.items():
+            total = merged.setdefault((user_id, category_id, model.bucket(date)), [0, 0, 0])
+            total[0] += income
+            total[1] += expenses
+            total[2] += count
+        for (user_id, category_id, period), (income, expenses, count) in merged.items():
+            model.apply_delta(user_id, category_id, period, income, expenses, count)
+
+def compute_rollups(model, user_ids=None):
+    queryset = Transaction.objects.all()
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=user_ids)
+    period = F('date') if model is DailyRollup else TruncMonth('date')
+    rows = queryset.order_by().annotate(period=period).values('user_id', 'category_id', 'period').annotate(**UserLedger.AGGREGATES)
+    return {
+        (row['user_id'], row['category_id'], row['period']): (cents(row['income']), cents(-(row['expenses'] or 0)), row['count'])
+        for row in rows
+    }
+
+def rebuild_rollups(user_ids=None):
+    rebuilt = 0
+    with transaction.atomic():
+        for model in ROLLUPS:
+            stale = model.objects.all() if user_ids is None else model.objects.filter(user_id__in=user_ids)
+            stale.delete()
+            rebuilt += len(model.objects.bulk_create([
+                model(user_id=user_id, category_id=category_id, period=period,
+                      income=income, expenses=expenses, transaction_count=count)
+                for (user_id, category_id, period), (income, expenses, count) in compute_rollups(model, user_ids).items()
+            ], batch_size=1000))
+    return rebuilt
+
+def verify_rollups(user_ids=None):
+    """Return (model name, key, stored, expected) for every rollup row that disagrees with Transaction."""
+    mismatches = []
+    for model in ROLLUPS:
+        expected = compute_rollups(model, user_ids)
+        stored_rows = model.objects.all() if user_ids is None else model.objects.filter(user_id__in=user_ids)
+        stored = {
+            (row.user_id, row.category_id, row.period): (row.income, row.expenses, row.transaction_count)
+            for row in stored_rows if row.transaction_count
+        }
+        for key in sorted(set(expected) | set(stored), key=str):
+            if stored.get(key) != expected.get(key):
+                mismatches.append((model.__name__, key, stored.get(key), expected.get(key)))
+    return mismatches
+
+def fold_category_rollups(category):
+    """Move a category's rollups to the uncategorized bucket, as SET_NULL does for its transactions."""
+    for model in ROLLUPS:
+        rows = list(model.objects.filter(category=category))
+        for row in rows:
+            model.apply_delta(row.user_id, None, row.period, row.income, row.expenses, row.transaction_count)
+        model.objects.filter(category=category).delete()
+
+class TransactionSearch(models.Model):
+    """Full-text index row of a Transaction, maintained by database triggers (see budget.search)."""
+    # FTS5 keys its rows by rowid; the PostgreSQL table uses the same column name.
+    transaction = models.OneToOneField(Transaction, on_delete=models.DO_NOTHING, primary_key=True,
+                                       db_column='rowid', related_name='search')
+    document = SearchDocumentField()
+
+    class Meta:
+        managed = False
+
+class DataVersion(models.Model):
+    """Per-user counter bumped on every write to the user's budget data; keys response caches."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='data_version')
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.user_id}: v{self.version}"
+
+    @property
+    def token(self):
+        # updated_at keeps keys unique if the table is ever reset and versions start over.
+        return f'{self.version}.{self.updated_at.timestamp():.6f}'
+
+    @classmethod
+    def bump(cls, user_ids, create=True):
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+        now = timezone.now()
+        updated = cls.objects.filter(user_id__in=user_ids).update(version=F('version') + 1, updated_at=now)
+        if create and updated < len(user_ids):
+            existing = set(cls.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+            cls.objects.bulk_create(
+                [cls(user_id=user_id, version=1, updated_at=now) for user_id in user_ids - existing],
+                ignore_conflicts=True,
+            )
+
+    @classmethod
+    def for_user(cls, user):
+        return cls.objects.get_or_create(user=user)[0]
+
+class ImportJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    FORMAT_CHOICES = [
+        ('json', 'JSON'),
+        ('ndjson', 'NDJSON'),
+        ('csv', 'CSV'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='import_jobs')
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    size = models.PositiveBigIntegerField(default=0)
+    rows_imported = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    rows_per_second = models.FloatField(null=True, blank=True)
+    errors = models.JSONField(default=list, blank=True)
+    message = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+
+    def __str__(self):
+        return f"Import #{self.pk} ({self.format}, {self.get_status_display()})"
+
+class Job(models.Model):
+    """A unit of background work, queued in this table and run by ``manage.py run_jobs`` (see budget.jobs)."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    KIND_CHOICES = [
+        ('export', 'Export'),
+        ('import', 'Import'),
+        ('rebuild', 'Rebuild'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    params = models.JSONField(default=dict, blank=True)
+    progress = models.PositiveSmallIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    message = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            # Workers take the oldest pending job first.
+            models.Index(fields=['status', 'id'], name='job_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} job #{self.pk} ({self.get_status_display()})"
+
+    @classmethod
+    def enqueue(cls, user, kind, **params):
+        return cls.objects.create(user=user, kind=kind, params=params)
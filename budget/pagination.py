@@ -0,0 +1,167 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class TransactionCursorPagination(BasePagination):
+    """Keyset pagination over (-date, -id).
+
+    The cursor is the (date, id) of the last row on the previous page, so every
+    page is a bounded index range scan no matter how deep the client is, and rows
+    inserted while paging never shift or duplicate later pages.
+    """
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering = ('-date', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.get_page(list(self.get_page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        return self.get_page([row async for row in self.get_page_queryset(queryset, request)])
+
+    def get_page_queryset(self, queryset, request):
+        """One row more than the page, so the next link is known without a count."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.after(position))
+        return queryset.order_by(*self.ordering)[:self.page_size + 1]
+
+    def after(self, position):
+        date, pk = position
+        return Q(date__lte=date) & (Q(date__lt=date) | Q(id__lt=pk))
+
+    def get_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = self.get_position(rows[-1]) if self.has_next else None
+        return rows
+
+    def get_position(self, row):
+        # Rows are model instances or values() dicts (see budget.rows).
+        if isinstance(row, dict):
+            return row['date'], row['id']
+        return row.date, row.pk
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            date, pk = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            date, pk = parse_date(date), int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return date, pk
+
+    def encode_cursor(self, position):
+        date, pk = position
+        encoded = base64.urlsafe_b64encode(f'{date.isoformat()}|{pk}'.encode('ascii')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Cursor returned in the "next" link of the previous page',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Number of results per page (max {self.max_page_size})',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+
+class SearchCursorPagination(TransactionCursorPagination):
+    """Keyset pagination over search results: (search_rank, -date, -id).
+
+    Ranks depend on index-wide statistics, so pages may shift slightly while
+    other transactions are written; no row is ever returned twice on one page.
+    """
+    ordering = ('search_rank', '-date', '-id')
+
+    def after(self, position):
+        rank, date, pk = position
+        return (
+            Q(search_rank__gt=rank)
+            | Q(search_rank=rank, date__lt=date)
+            | Q(search_rank=rank, date=date, id__lt=pk)
+        )
+
+    def get_position(self, row):
+        if isinstance(row, dict):
+            return row['search_rank'], row['date'], row['id']
+        return row.search_rank, row.date, row.pk
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            rank, date, pk = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            rank, date, pk = float(rank), parse_date(date), int(pk)
+        except (binascii.Error, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return rank, date, pk
+
+    def encode_cursor(self, position):
+        rank, date, pk = position
+        encoded = base64.urlsafe_b64encode(f'{rank!r}|{date.isoformat()}|{pk}'.encode('ascii')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+
+class NewestFirstPagination(CursorPagination):
+    """Cursor pagination by descending id, for notifications and jobs."""
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    ordering = '-id'
@@ -0,0 +1,82 @@
+"""JSON rendering and parsing with orjson, when it is installed.
+
+FastJSONRenderer produces the same bytes as DRF's compact JSONRenderer:
+amounts that serializers coerce to strings stay strings, raw Decimals
+become numbers as before, and dates and datetimes are formatted by DRF's
+own encoder. Without orjson, or for anything orjson cannot encode, it
+falls back to the stock renderer.
+"""
+import datetime
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encoder = JSONEncoder()
+
+
+def _default(value):
+    # Fast paths for the two types every payload has, with DRF's encoding.
+    if type(value) is Decimal:
+        return float(value)
+    if type(value) is datetime.date:
+        return value.isoformat()
+    return _encoder.default(value)
+
+
+# datetimes go through DRF's encoder, which writes UTC as 'Z' and keeps only milliseconds.
+ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+
+def _escape_separators(content):
+    # Like DRF, keep the output a strict JavaScript subset.
+    if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+        content = content.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+    return content
+
+
+def dumps(value):
+    """Compact JSON text for ``value``, encoded like DRF's JSONRenderer (without the escaping)."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(value, default=_default, option=ORJSON_OPTIONS).decode()
+        except TypeError:
+            pass
+    return json.dumps(value, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.ensure_ascii or not self.compact or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            content = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        except TypeError:
+            # e.g. integers beyond 64 bits, or keys orjson cannot stringify.
+            return super().render(data, accepted_media_type, renderer_context)
+        return _escape_separators(content)
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            # orjson rejects NaN and Infinity, as STRICT_JSON does.
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
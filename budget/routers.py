@@ -0,0 +1,127 @@
+"""Read-replica routing for the heavy read endpoints.
+
+Reads go to the primary unless a view opts in with ``@read_from_replica``.
+Opted-in requests still read from the primary when:
+
+- the user wrote within the last BUDGET_REPLICA_PIN_SECONDS (read-your-writes,
+  using DataVersion.updated_at, which every write to the user's data bumps);
+- an admin session saved something within that window;
+- the query runs inside a transaction on the primary.
+
+All writes go to the primary. Replicas are listed in BUDGET_READ_REPLICAS.
+"""
+import contextvars
+import functools
+import random
+import time
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpRequest
+from django.utils import timezone
+from rest_framework.request import Request
+
+REPLICA_PIN_SECONDS = 10
+ADMIN_PIN_SESSION_KEY = 'budget_primary_until'
+
+read_alias = contextvars.ContextVar('budget_read_alias', default=None)
+
+
+def replicas():
+    return list(getattr(settings, 'BUDGET_READ_REPLICAS', []))
+
+
+def pin_seconds():
+    return getattr(settings, 'BUDGET_REPLICA_PIN_SECONDS', REPLICA_PIN_SECONDS)
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+
+def recently_wrote(request):
+    session = getattr(request, 'session', None)
+    if session is not None and session.get(ADMIN_PIN_SESSION_KEY, 0) > time.time():
+        return True
+    user = request.user
+    if not user.is_authenticated:
+        return False
+    from .models import DataVersion
+    cutoff = timezone.now() - timedelta(seconds=pin_seconds())
+    return DataVersion.objects.using(DEFAULT_DB_ALIAS).filter(user=user, updated_at__gte=cutoff).exists()
+
+
+def pin_session_to_primary(request):
+    """Keep this session's opted-in reads on the primary for a while, e.g. after an admin save."""
+    if replicas() and hasattr(request, 'session'):
+        request.session[ADMIN_PIN_SESSION_KEY] = time.time() + pin_seconds()
+
+
+def choose_replica(request):
+    """The alias this request should read from, or None for the primary."""
+    candidates = replicas()
+    if not candidates or request.method not in ('GET', 'HEAD') or recently_wrote(request):
+        return None
+    return random.choice(candidates)
+
+
+def _replica_content(content, alias):
+    # Streaming responses query lazily, after the view has returned. Servers may
+    # pull each chunk in a different context, so route one chunk at a time.
+    iterator = iter(content)
+    while True:
+        token = read_alias.set(alias)
+        try:
+            chunk = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            read_alias.reset(token)
+        yield chunk
+
+
+def _bind(response, alias):
+    if alias is not None and getattr(response, 'streaming', False) and not response.is_async:
+        response.streaming_content = _replica_content(response.streaming_content, alias)
+    return response
+
+
+def read_from_replica(view):
+    """Run a GET handler's reads on a read replica, unless the user needs to read their own writes."""
+    def find_request(args):
+        # Function views get (request, ...); methods get (self, request, ...).
+        return next(arg for arg in args if isinstance(arg, (HttpRequest, Request)))
+
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            alias = await sync_to_async(choose_replica)(find_request(args))
+            token = read_alias.set(alias)
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                read_alias.reset(token)
+        return async_wrapper
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        alias = choose_replica(find_request(args))
+        token = read_alias.set(alias)
+        try:
+            return _bind(view(*args, **kwargs), alias)
+        finally:
+            read_alias.reset(token)
+    return wrapper
@@ -0,0 +1,96 @@
+"""Read-only serialization straight from ``values()`` rows.
+
+These produce exactly what the matching ModelSerializer would for list
+endpoints, without instantiating models or walking DRF field machinery.
+"""
+
+
+def money(value):
+    # DRF's DecimalField(decimal_places=2) with COERCE_DECIMAL_TO_STRING.
+    return None if value is None else f'{value:.2f}'
+
+
+def iso_date(value):
+    return None if value is None else value.isoformat()
+
+
+class RowSerializer:
+    """Declares output keys as (key, values() lookup, converter) and compiles them once.
+
+    A field may also be a nested group: (key, presence lookup, [fields]); the
+    group is None when the presence lookup is None, as with a null foreign key.
+    """
+    fields = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.lookups = tuple(dict.fromkeys(cls._lookups(cls.fields)))
+        cls.convert = staticmethod(cls._compile(cls.fields))
+
+    @classmethod
+    def _lookups(cls, fields):
+        for key, lookup, converter in fields:
+            yield lookup
+            if isinstance(converter, list):
+                yield from cls._lookups(converter)
+
+    @classmethod
+    def _expression(cls, fields, namespace):
+        parts = []
+        for key, lookup, converter in fields:
+            if isinstance(converter, list):
+                value = f'(None if row[{lookup!r}] is None else {cls._expression(converter, namespace)})'
+            elif converter is None:
+                value = f'row[{lookup!r}]'
+            else:
+                name = f'_convert_{len(namespace)}'
+                namespace[name] = converter
+                value = f'{name}(row[{lookup!r}])'
+            parts.append(f'{key!r}: {value}')
+        return '{' + ', '.join(parts) + '}'
+
+    @classmethod
+    def _compile(cls, fields):
+        # One flat dict display per row: no per-field loop or attribute lookups.
+        namespace = {}
+        exec(f'def convert(row):\n    return {cls._expression(fields, namespace)}\n', namespace)
+        return namespace['convert']
+
+    @classmethod
+    def values(cls, queryset):
+        return queryset.values(*cls.lookups)
+
+    @classmethod
+    def serialize(cls, rows):
+        convert = cls.convert
+        return [convert(row) for row in rows]
+
+    @classmethod
+    def iterate(cls, rows):
+        convert = cls.convert
+        for row in rows:
+            yield convert(row)
+
+
+class CategoryRows(RowSerializer):
+    """Same output as CategorySerializer."""
+    fields = (
+        ('id', 'id', None),
+        ('name', 'name', None),
+        ('type', 'type', None),
+    )
+
+
+class TransactionRows(RowSerializer):
+    """Same output as TransactionSerializer, including the nested category."""
+    fields = (
+        ('id', 'id', None),
+        ('amount', 'amount', money),
+        ('date', 'date', iso_date),
+        ('description', 'description', None),
+        ('category', 'category_id', [
+            ('id', 'category_id', None),
+            ('name', 'category__name', None),
+            ('type', 'category__type', None),
+        ]),
+    )
@@ -0,0 +1,78 @@
+"""Full-text search over transaction descriptions and category names.
+
+The index lives in the ``budget_transactionsearch`` table: an FTS5 virtual table
+on SQLite, a tsvector column with a GIN index on PostgreSQL. Database triggers
+(see migration 0009) keep it in sync with Transaction and Category writes,
+including bulk updates and SET_NULL cascades that bypass the ORM.
+"""
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Func, Lookup, Q, TextField, Value
+
+SEARCH_VENDORS = ('sqlite', 'postgresql')
+SEARCH_MAX_TERMS = 10
+SEARCH_RANK = 'search_rank'
+
+
+def search_terms(query):
+    return re.findall(r'\w+', query.lower())[:SEARCH_MAX_TERMS]
+
+
+class SearchDocumentField(TextField):
+    """The indexed document of a TransactionSearch row; only usable through ``match``."""
+
+
+@SearchDocumentField.register_lookup
+class Match(Lookup):
+    """Every term of the query must match a word prefix, in either the description or category name."""
+    lookup_name = 'match'
+
+    def as_sqlite(self, compiler, connection):
+        # FTS5 exposes a hidden column named after the table for MATCH.
+        table = compiler.quote_name_unless_alias(self.lhs.alias)
+        column = connection.ops.quote_name(self.lhs.target.model._meta.db_table)
+        query = ' '.join(f'"{term}"*' for term in search_terms(self.rhs))
+        return f'{table}.{column} MATCH %s', [query]
+
+    def as_postgresql(self, compiler, connection):
+        lhs, params = compiler.compile(self.lhs)
+        query = ' & '.join(f'{term}:*' for term in search_terms(self.rhs))
+        return f"{lhs} @@ to_tsquery('simple', %s)", params + [query]
+
+
+class SearchRank(Func):
+    """Relevance of a matched row; lower is better, like FTS5's bm25."""
+    output_field = FloatField()
+
+    def __init__(self, document, query):
+        super().__init__(document)
+        self.query = query
+
+    def as_sqlite(self, compiler, connection):
+        table = compiler.quote_name_unless_alias(self.source_expressions[0].alias)
+        return f'{table}.{connection.ops.quote_name("rank")}', []
+
+    def as_postgresql(self, compiler, connection):
+        document, params = compiler.compile(self.source_expressions[0])
+        query = ' & '.join(f'{term}:*' for term in search_terms(self.query))
+        return f"-ts_rank({document}, to_tsquery('simple', %s))", params + [query]
+
+
+def _unranked(queryset):
+    return queryset.annotate(**{SEARCH_RANK: Value(0.0, output_field=FloatField())}).order_by('-date', '-id')
+
+
+def search_transactions(queryset, query):
+    """Filter a Transaction queryset by ``query`` and annotate it with ``search_rank``.
+
+    Results are ordered by relevance, then newest first. Databases without a
+    search index fall back to an unindexed ``icontains`` scan in date order.
+    """
+    if not search_terms(query):
+        return _unranked(queryset.none())
+    if connections[queryset.db].vendor not in SEARCH_VENDORS:
+        return _unranked(queryset.filter(Q(description__icontains=query) | Q(category__name__icontains=query)))
+    return queryset.filter(search__document__match=query).annotate(
+        **{SEARCH_RANK: SearchRank('search__document', query)}
+    ).order_by(SEARCH_RANK, '-date', '-id')
@@ -2,16 +2,45 @@ from rest_framework import serializers
 from .models import Transaction, Category, Budget, TotalBudget
 from django.contrib.auth.models import User
 from rest_framework import serializers
-from .models import UserSettings
+from .models import UserSettings, ImportJob, BudgetNotification, Job
+from .export import EXPORT_FORMATS
+from .jobs import JOB_MAX_UNFINISHED
+from django.conf import settings
+from django.urls import reverse
+from .categories import category_cache
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name', 'type']
 
+class UserCategoryField(serializers.PrimaryKeyRelatedField):
+    """A category of the requesting user, resolved from the per-user category cache."""
+
+    def get_queryset(self):
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return Category.objects.none()
+        return Category.objects.filter(user=request.user)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            self.fail('does_not_exist', pk_value=data)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        category = category_cache.get(request.user.pk, pk)
+        if category is None:
+            self.fail('does_not_exist', pk_value=data)
+        return category
+
 class TransactionSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
-    category_id = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), write_only=True)
+    category_id = UserCategoryField(write_only=True)
 
     class Meta:
         model = Transaction
@@ -33,7 +62,8 @@ class BudgetSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Budget
-        fields = ['id', 'category', 'amount', 'start_date', 'end_date', 'remaining_budget']
+        fields = ['id', 'category', 'amount', 'start_date', 'end_date', 'remaining_budget', 'spent']
+        read_only_fields = ['spent']
 
 class TotalBudgetSerializer(serializers.ModelSerializer):
     total_remaining_budget = serializers.ReadOnlyField()
@@ -60,4 +90,72 @@ class UserProfileSerializer(serializers.ModelSerializer):
 class UserSettingsSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserSettings
-        fields = ['notifications_enabled', 'dark_mode', 'language']        
\ No newline at end of file
+        fields = ['notifications_enabled', 'dark_mode', 'language']
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = ['id', 'format', 'status', 'size', 'rows_imported', 'rows_failed', 'rows_per_second',
+                  'errors', 'message', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
+
+
+class BudgetNotificationSerializer(serializers.ModelSerializer):
+    category = serializers.IntegerField(source='budget.category_id', read_only=True)
+
+    class Meta:
+        model = BudgetNotification
+        fields = ['id', 'budget', 'category', 'threshold', 'amount', 'spent', 'created_at', 'read_at']
+        read_only_fields = fields
+
+
+class JobSerializer(serializers.ModelSerializer):
+    # Imports are queued by the import endpoint, with their upload.
+    kind = serializers.ChoiceField(choices=['export', 'rebuild'])
+    result_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'status', 'params', 'progress', 'result', 'result_url', 'message', 'attempts',
+                  'created_at', 'started_at', 'finished_at']
+        read_only_fields = ['status', 'progress', 'result', 'message', 'attempts', 'created_at', 'started_at',
+                            'finished_at']
+
+    def to_representation(self, instance):
+        # Stored kinds include 'import', which clients can't create.
+        data = super().to_representation(instance)
+        data['kind'] = instance.kind
+        return data
+
+    def get_result_url(self, job):
+        if job.status != 'done' or not (job.result or {}).get('file'):
+            return None
+        return self.context['request'].build_absolute_uri(reverse('api_job_result', args=[job.pk]))
+
+    def validate_params(self, params):
+        if not isinstance(params, dict):
+            raise serializers.ValidationError('Expected an object.')
+        return params
+
+    def validate(self, data):
+        params = data.get('params', {})
+        if data['kind'] == 'export':
+            if set(params) - {'output'} or params.get('output', 'json') not in EXPORT_FORMATS:
+                raise serializers.ValidationError({'params': f'Export takes {{"output": {"|".join(EXPORT_FORMATS)}}}.'})
+        elif params:
+            raise serializers.ValidationError({'params': 'Rebuild takes no parameters.'})
+        user = self.context['request'].user
+        limit = getattr(settings, 'BUDGET_JOB_MAX_UNFINISHED', JOB_MAX_UNFINISHED)
+        if Job.objects.filter(user=user, status__in=('pending', 'running')).count() >= limit:
+            raise serializers.ValidationError(f'You already have {limit} unfinished jobs.')
+        return data
+
+
+class BulkTransactionSerializer(serializers.Serializer):
+    """One item of a bulk request; categories are resolved per batch in budget.bulk."""
+    id = serializers.IntegerField(required=False)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    date = serializers.DateField()
+    description = serializers.CharField(allow_blank=True, required=False, default='')
+    category_id = serializers.IntegerField()
@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .auth import invalidate_token, invalidate_user
+from .models import Category, Budget, TotalBudget, DataVersion, fold_category_rollups
+from .categories import category_cache
+from .metrics import time_query
+
+
+# Transaction bumps DataVersion itself (see TransactionQuerySet), so that bulk
+# deletes don't have to load every row just to send signals.
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Budget)
+@receiver(post_save, sender=TotalBudget)
+def bump_data_version_on_save(sender, instance, **kwargs):
+    DataVersion.bump([instance.user_id])
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Budget)
+@receiver(post_delete, sender=TotalBudget)
+def bump_data_version_on_delete(sender, instance, **kwargs):
+    # Deletes may be cascading from the user itself, so never create a row here.
+    DataVersion.bump([instance.user_id], create=False)
+
+
+@receiver(pre_delete, sender=Category)
+def fold_rollups_on_category_delete(sender, instance, origin=None, **kwargs):
+    # Transaction.category is SET_NULL, which the collector applies with a raw
+    # UPDATE. Skip when the whole user is going away: everything cascades then.
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin is None or origin_model is Category:
+        fold_category_rollups(instance)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    category_cache.invalidate(instance.user_id)
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # Fires again whenever the wrapper reconnects; install the timer once.
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Covers deactivation and password changes made through save().
+    invalidate_user(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
@@ -1,11 +1,52 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, RequestFactory, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
-from rest_framework.test import APIClient
-from .models import Category, Transaction, Budget, TotalBudget, UserSettings
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import ParseError
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.tokens import AccessToken
+from .models import Category, Transaction, Budget, TotalBudget, UserSettings, UserLedger, DailyRollup, MonthlyRollup, verify_rollups
+from .models import BudgetNotification, Job, ImportJob, verify_budget_spend
+from . import jobs
 from decimal import Decimal
+import csv
+import gzip
+import io
 import json
+import logging
+import threading
+import os
+import pathlib
+import sqlite3
+import tempfile
+import datetime
+import time
+import unittest
+import tracemalloc
+from io import StringIO
+from .rows import TransactionRows, CategoryRows
+from .dashboard import Dashboard
+from .categories import CategoryCache, category_cache
+from .auth import AUTH_USER_FIELDS, user_key
+from .forms import TransactionForm
+from .importer import ImportFormatError, iter_json_records, run_import
+from .cache import stats as cache_stats
+from .metrics import metrics
+from . import analytics, backup, views
+from .middleware import brotli as middleware_brotli
+from .renderers import FastJSONParser, FastJSONRenderer
+from .routers import ReadReplicaRouter, read_alias, choose_replica, ADMIN_PIN_SESSION_KEY
+from .models import DataVersion
+from .log import BackgroundHandler, JSONFormatter, RateLimitFilter, SamplingFilter
+from django.core.cache import cache
+from .serializers import TransactionSerializer, CategorySerializer
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
+from asgiref.sync import sync_to_async
 
 class ModelTests(TestCase):
     def setUp(self):
@@ -183,6 +224,1615 @@ class APITests(TestCase):
             print(f"Error response: {response.content}")
         self.assertEqual(response.status_code, 201)
 
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.expense = Category.objects.create(name='Food', type='expense', user=self.user)
+        self.income = Category.objects.create(name='Salary', type='income', user=self.user)
+        self.today = timezone.now().date()
+
+    def assertLedger(self, income, expenses, count):
+        ledger = UserLedger.objects.get(user=self.user)
+        self.assertEqual((ledger.total_income, ledger.total_expenses, ledger.transaction_count),
+                         (Decimal(income), Decimal(expenses), count))
+        self.assertEqual(UserLedger.verify([self.user.id]), [])
+
+    def test_save_and_delete_update_ledger(self):
+        salary = Transaction.objects.create(amount=1000, date=self.today, category=self.income, user=self.user)
+        food = Transaction.objects.create(amount=150, date=self.today, category=self.expense, user=self.user)
+        self.assertLedger('1000', '150', 2)
+
+        food = Transaction.objects.get(pk=food.pk)
+        food.amount = -200
+        food.save()
+        self.assertLedger('1000', '200', 2)
+
+        salary.delete()
+        self.assertLedger('0', '200', 1)
+
+    def test_stale_instances(self):
+        Budget.objects.create(amount=500, start_date=self.today, end_date=self.today, category=self.expense, user=self.user)
+        food = Transaction.objects.create(amount=-100, date=self.today, category=self.expense, user=self.user)
+        first, second = Transaction.objects.get(pk=food.pk), Transaction.objects.get(pk=food.pk)
+        first.amount = -50
+        first.save()
+        second.description = 'Groceries'
+        second.save()
+        self.assertLedger('0', '100', 1)
+        self.assertEqual((verify_rollups([self.user.id]), verify_budget_spend([self.user.id])), ([], []))
+
+        first.delete()
+        second.delete()
+        self.assertLedger('0', '0', 0)
+        self.assertEqual((verify_rollups([self.user.id]), verify_budget_spend([self.user.id])), ([], []))
+
+    def test_description_edit_skips_aggregates(self):
+        food = Transaction.objects.create(amount=-100, date=self.today, category=self.expense, user=self.user)
+        food.description = 'Groceries'
+        with CaptureQueriesContext(connection) as queries:
+            food.save()
+        tables = ('"budget_userledger"', '"budget_dailyrollup"', '"budget_monthlyrollup"', '"budget_budget"')
+        self.assertEqual([q['sql'] for q in queries if any(table in q['sql'] for table in tables)], [])
+        self.assertLedger('0', '100', 1)
+
+    def test_bulk_paths_update_ledger(self):
+        Transaction.objects.bulk_create([
+            Transaction(amount=500, date=self.today, category=self.income, user=self.user),
+            Transaction(amount=-40, date=self.today, category=self.expense, user=self.user),
+            Transaction(amount=-60, date=self.today, category=self.expense, user=self.user),
+        ])
+        self.assertLedger('500', '100', 3)
+
+        Transaction.objects.filter(user=self.user, amount=-40).update(amount=-90)
+        self.assertLedger('500', '150', 3)
+
+        Transaction.objects.filter(user=self.user, amount__lt=0).delete()
+        self.assertLedger('500', '0', 1)
+
+    def test_dashboard_reads_ledger(self):
+        Transaction.objects.create(amount=300, date=self.today, category=self.income, user=self.user)
+        Transaction.objects.create(amount=100, date=self.today, category=self.expense, user=self.user)
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.get(reverse('api_statistics'))
+        self.assertEqual(response.data['total_income'], Decimal('300'))
+        self.assertEqual(response.data['total_expenses'], Decimal('100'))
+        self.assertEqual(response.data['savings_rate'], Decimal('66.67'))
+        with self.assertNumQueries(1):
+            UserLedger.for_user(self.user)
+
+    def test_rebuild_ledger_command(self):
+        Transaction.objects.create(amount=300, date=self.today, category=self.income, user=self.user)
+        UserLedger.objects.filter(user=self.user).update(total_income=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_ledger', '--verify', stdout=StringIO(), stderr=StringIO())
+        call_command('rebuild_ledger', stdout=StringIO())
+        call_command('rebuild_ledger', '--verify', stdout=StringIO())
+        self.assertLedger('300', '0', 1)
+
+class BudgetEvaluationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.today = timezone.now().date()
+        TotalBudget.objects.create(amount=5000, start_date=self.today, end_date=self.today, user=self.user)
+
+    def add_budgets(self, count):
+        for i in range(count):
+            category = Category.objects.create(name=f'Category {i}', type='expense', user=self.user)
+            Budget.objects.create(amount=100, start_date=self.today - timezone.timedelta(days=1),
+                                  end_date=self.today + timezone.timedelta(days=1), category=category, user=self.user)
+            Transaction.objects.create(amount=-i, date=self.today, category=category, user=self.user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_annotated_remaining_matches_model_method(self):
+        self.add_budgets(3)
+        Budget.objects.create(amount=70, start_date=self.today + timezone.timedelta(days=5),
+                              end_date=self.today + timezone.timedelta(days=9),
+                              category=Category.objects.first(), user=self.user)
+        for budget in Budget.objects.filter(user=self.user).with_remaining():
+            self.assertEqual(budget.annotated_remaining, Budget.objects.get(pk=budget.pk).remaining_budget())
+        total_budget = TotalBudget.objects.with_remaining().get(user=self.user)
+        self.assertEqual(total_budget.total_remaining_budget(), Decimal('4997.00'))
+
+    def test_constant_query_count(self):
+        self.add_budgets(2)
+        budgets_few = self.count_queries(reverse('api_budgets'))
+        dashboard_few = self.count_queries(reverse('api_dashboard'))
+        self.add_budgets(10)
+        self.assertEqual(self.count_queries(reverse('api_budgets')), budgets_few)
+        self.assertEqual(self.count_queries(reverse('api_dashboard')), dashboard_few)
+
+class DashboardServiceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.today = timezone.now().date()
+        self.total_budget = TotalBudget.objects.create(amount=5000, start_date=self.today - timezone.timedelta(days=30),
+                                                       end_date=self.today, user=self.user)
+        Transaction.objects.create(amount=1000, date=self.today, user=self.user)
+
+    def add_budgets(self, count, start_offset=1):
+        for i in range(count):
+            category = Category.objects.create(name=f'Category {i}', type='expense', user=self.user)
+            Budget.objects.create(amount=100, start_date=self.today - timezone.timedelta(days=start_offset),
+                                  end_date=self.today + timezone.timedelta(days=1), category=category, user=self.user)
+            Transaction.objects.create(amount=-i, date=self.today, category=category, user=self.user)
+            Transaction.objects.create(amount=-50, date=self.today - timezone.timedelta(days=start_offset + 1),
+                                       category=category, user=self.user)
+
+    def test_matches_model_methods(self):
+        self.add_budgets(3)
+        Budget.objects.create(amount=70, start_date=self.today + timezone.timedelta(days=5),
+                              end_date=self.today + timezone.timedelta(days=9),
+                              category=Category.objects.first(), user=self.user)
+        dashboard = Dashboard(self.user)
+        for budget in dashboard.budgets:
+            self.assertEqual(budget.remaining_budget(), Budget.objects.get(pk=budget.pk).remaining_budget())
+        self.assertEqual(dashboard.total_budget.total_remaining_budget(),
+                         TotalBudget.objects.get(pk=self.total_budget.pk).total_remaining_budget())
+        self.assertEqual((dashboard.income, dashboard.expenses), (Decimal('1000'), Decimal('153')))
+
+    def test_query_count_is_pinned(self):
+        self.add_budgets(12)
+        with self.assertNumQueries(4):  # ledger + total budget, budgets, spend aggregate, recent transactions
+            Dashboard(self.user).data()
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with self.assertNumQueries(5):  # plus the data version for the response cache
+            response = client.get(reverse('api_dashboard'))
+        self.assertEqual(len(response.data['budgets']), 12)
+
+        client = Client()
+        client.login(username='testuser', password='12345')
+        client.get(reverse('budget_list'))  # warm the cached user, not the dashboard's response cache
+        with CaptureQueriesContext(connection) as few:
+            client.get(reverse('dashboard'))
+        self.add_budgets(5, start_offset=3)
+        with CaptureQueriesContext(connection) as many:
+            response = client.get(reverse('dashboard'))
+        self.assertEqual(len(many.captured_queries), len(few.captured_queries))
+        self.assertEqual(len(response.context['budgets']), 17)
+
+class TransactionPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.food = Category.objects.create(name='Food', type='expense', user=self.user)
+        self.rent = Category.objects.create(name='Rent', type='expense', user=self.user)
+        self.start = timezone.now().date() - timezone.timedelta(days=10)
+        for i in range(7):
+            # Two transactions per day so pages have to break ties on id.
+            Transaction.objects.create(amount=-(i + 1), date=self.start + timezone.timedelta(days=i // 2),
+                                       category=self.food if i % 2 else self.rent, user=self.user)
+
+    def collect(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_pages_follow_date_then_id_order(self):
+        expected = list(Transaction.objects.filter(user=self.user).order_by('-date', '-id').values_list('id', flat=True))
+        self.assertEqual(self.collect(reverse('api_transactions') + '?page_size=3'), expected)
+
+    def test_insert_between_pages_does_not_shift_cursor(self):
+        first = self.client.get(reverse('api_transactions') + '?page_size=3').data
+        Transaction.objects.create(amount=-1, date=timezone.now().date(), category=self.food, user=self.user)
+        rest = self.collect(first['next'])
+        seen = [row['id'] for row in first['results']] + rest
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len(set(seen)), 7)
+
+    def test_filters_compose_with_cursor(self):
+        date_from = self.start + timezone.timedelta(days=1)
+        url = reverse('api_transactions') + f'?page_size=1&category=Food&date_from={date_from}'
+        expected = list(Transaction.objects.filter(user=self.user, category=self.food, date__gte=date_from)
+                        .order_by('-date', '-id').values_list('id', flat=True))
+        self.assertEqual(self.collect(url), expected)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(reverse('api_transactions') + '?cursor=garbage').status_code, 404)
+        self.assertEqual(self.client.get(reverse('api_transactions') + '?date_from=2024-02-30').status_code, 400)
+
+class StreamingExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.today = timezone.now().date()
+        self.category = Category.objects.create(name='Food, "fresh"', type='expense', user=self.user)
+        Transaction.objects.create(amount=-12.5, date=self.today, description='Ужин', category=self.category, user=self.user)
+        Transaction.objects.create(amount=40, date=self.today, description='Refund', category=None, user=self.user)
+        Budget.objects.create(amount=100, start_date=self.today, end_date=self.today, category=self.category, user=self.user)
+        TotalBudget.objects.create(amount=500, start_date=self.today, end_date=self.today, user=self.user)
+
+    def export(self, query):
+        response = self.client.get(reverse('api_export_data') + query)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_streamed_json_matches_legacy_export(self):
+        legacy = json.loads(self.client.get(reverse('api_export_data')).content)
+        self.assertEqual(json.loads(self.export('?output=json')), legacy)
+
+    def test_ndjson_and_csv(self):
+        lines = [json.loads(line) for line in self.export('?output=ndjson').decode().splitlines()]
+        self.assertEqual([line['record'] for line in lines], ['category', 'transaction', 'transaction', 'budget', 'total_budget'])
+        self.assertEqual(lines[1]['data']['amount'], '-12.50')
+
+        rows = list(csv.DictReader(StringIO(self.export('?output=csv').decode())))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['category_name'], 'Food, "fresh"')
+        self.assertEqual(rows[1]['category_id'], '')
+
+    def test_gzip(self):
+        self.assertEqual(gzip.decompress(self.export('?output=ndjson&compress=gzip')), self.export('?output=ndjson'))
+        self.assertEqual(self.client.get(reverse('api_export_data') + '?output=xml').status_code, 400)
+
+    def test_memory_stays_flat(self):
+        # EXPORT_TEST_ROWS=1000000 reproduces the million-row check; the ceiling does not depend on the row count.
+        rows = int(os.environ.get('EXPORT_TEST_ROWS', 20000))
+        for start in range(0, rows, 10000):
+            Transaction.objects.bulk_create([
+                Transaction(amount=-1, date=self.today, description=f'row {i}', category=self.category, user=self.user)
+                for i in range(start, min(start + 10000, rows))
+            ])
+        response = self.client.get(reverse('api_export_data') + '?output=ndjson&compress=gzip')
+        tracemalloc.start()
+        try:
+            for chunk in response.streaming_content:
+                pass
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 8 * 1024 * 1024)
+
+class ImportDataTests(TestCase):
+    def setUp(self):
+        self.source = User.objects.create_user(username='source', password='12345')
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.today = timezone.now().date()
+        food = Category.objects.create(name='Food', type='expense', user=self.source)
+        salary = Category.objects.create(name='Salary', type='income', user=self.source)
+        Transaction.objects.create(amount=-20, date=self.today, description='Lunch', category=food, user=self.source)
+        Transaction.objects.create(amount=900, date=self.today, description='June', category=salary, user=self.source)
+        Budget.objects.create(amount=300, start_date=self.today, end_date=self.today, category=food, user=self.source)
+        TotalBudget.objects.create(amount=2000, start_date=self.today, end_date=self.today, user=self.source)
+
+    def export(self, query=''):
+        self.client.force_authenticate(user=self.source)
+        response = self.client.get(reverse('api_export_data') + query)
+        self.client.force_authenticate(user=self.user)
+        return b''.join(response.streaming_content) if response.streaming else response.content
+
+    def assertImported(self):
+        rows = Transaction.objects.filter(user=self.user).order_by('amount').values_list('amount', 'category__name', 'category__type')
+        self.assertEqual(list(rows), [(Decimal('-20.00'), 'Food', 'expense'), (Decimal('900.00'), 'Salary', 'income')])
+        self.assertEqual(UserLedger.verify([self.user.id]), [])
+
+    def test_json_export_round_trip(self):
+        response = self.client.post(reverse('api_import_data'), data=self.export(), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'done')
+        self.assertIsNotNone(response.data['rows_per_second'])
+        self.assertImported()
+        self.assertEqual(Budget.objects.get(user=self.user).category.name, 'Food')
+        self.assertEqual(TotalBudget.objects.get(user=self.user).amount, Decimal('2000.00'))
+
+    def test_ndjson_and_gzipped_csv_uploads(self):
+        response = self.client.post(reverse('api_import_data'), data=self.export('?output=ndjson'),
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.data['status'], 'done')
+        self.assertEqual(Budget.objects.filter(user=self.user).count(), 1)
+        Transaction.objects.filter(user=self.user).delete()
+
+        upload = SimpleUploadedFile('export.csv.gz', self.export('?output=csv&compress=gzip'))
+        response = self.client.post(reverse('api_import_data'), data={'file': upload}, format='multipart')
+        self.assertEqual(response.data['status'], 'done')
+        self.assertImported()
+        self.assertEqual(Category.objects.filter(user=self.user).count(), 2)
+
+    def test_bad_rows_are_reported_and_expenses_normalized(self):
+        body = '\n'.join([
+            'id,date,amount,description,category_id,category_name,category_type',
+            '1,2024-01-05,15.00,Positive expense,7,Food,expense',
+            '2,2024-13-01,10.00,Bad date,7,Food,expense',
+            '3,2024-01-06,lots,Bad amount,7,Food,expense',
+        ])
+        response = self.client.post(reverse('api_import_data') + '?input=csv', data=body, content_type='text/plain')
+        self.assertEqual(response.data['rows_failed'], 2)
+        self.assertEqual([error['record'] for error in response.data['errors']], [2, 3])
+        self.assertEqual(Transaction.objects.get(user=self.user).amount, Decimal('-15.00'))
+
+    def test_malformed_document_fails_job(self):
+        response = self.client.post(reverse('api_import_data'), data='{"transactions": [{"amount": 1', content_type='application/json')
+        self.assertEqual(response.data['status'], 'failed')
+        job = self.client.get(reverse('api_import_job', args=[response.data['id']]))
+        self.assertEqual(job.data['message'], 'Malformed JSON document')
+
+    def test_unterminated_string_is_not_buffered_to_the_end(self):
+        stream = io.StringIO('{"transactions": [{"description": "' + 'x' * 200_000)
+        with override_settings(BUDGET_IMPORT_MAX_VALUE_SIZE=100_000):
+            with self.assertRaisesMessage(ImportFormatError, 'longer than 100000 characters'):
+                list(iter_json_records(stream))
+        self.assertGreater(len(stream.read()), 0)
+
+    def test_missing_upload_fails_job(self):
+        job = run_import(ImportJob.objects.create(user=self.user, format='ndjson', size=10), '/nonexistent/upload')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNotNone(job.finished_at)
+
+class BackgroundImportTests(TransactionTestCase):
+    def test_large_upload_runs_in_background(self):
+        user = User.objects.create_user(username='testuser', password='12345')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        lines = [json.dumps({'record': 'transaction', 'data': {'amount': '-1.00', 'date': '2024-01-01', 'description': f'#{i}',
+                                                               'category': {'id': 1, 'name': 'Food', 'type': 'expense'}}})
+                 for i in range(2500)]
+        with override_settings(BUDGET_IMPORT_SYNC_MAX_BYTES=1024, BUDGET_JOB_QUEUE=False):
+            response = client.post(reverse('api_import_data'), data='\n'.join(lines), content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 202)
+        deadline = time.monotonic() + 30
+        while True:
+            job = client.get(reverse('api_import_job', args=[response.data['id']])).data
+            if job['status'] in ('done', 'failed') or time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['rows_imported'], 2500)
+        self.assertEqual(UserLedger.objects.get(user=user).total_expenses, Decimal('2500.00'))
+
+class LeanSerializationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        food = Category.objects.create(name='Еда "и" напитки', type='expense', user=self.user)
+        today = timezone.now().date()
+        Transaction.objects.create(amount=-1234.5, date=today, description='Ужин\n', category=food, user=self.user)
+        Transaction.objects.create(amount=0, date=today, description='', category=None, user=self.user)
+        Transaction.objects.create(amount=99999999.99, date=today, description='Big', category=food, user=self.user)
+
+    def test_rows_render_identically_to_serializers(self):
+        renderer = JSONRenderer()
+        transactions = Transaction.objects.filter(user=self.user).order_by('-date', '-id')
+        self.assertEqual(renderer.render(TransactionRows.serialize(TransactionRows.values(transactions))),
+                         renderer.render(TransactionSerializer(transactions, many=True).data))
+        categories = Category.objects.filter(user=self.user)
+        self.assertEqual(renderer.render(CategoryRows.serialize(CategoryRows.values(categories))),
+                         renderer.render(CategorySerializer(categories, many=True).data))
+
+    def test_list_endpoints_run_constant_queries(self):
+        with self.assertNumQueries(2):  # the rows, plus the data version for the ETag
+            response = self.client.get(reverse('api_transactions'))
+        self.assertEqual(len(response.data['results']), 3)
+        with self.assertNumQueries(2):
+            self.client.get(reverse('api_categories'))
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache_stats.reset()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name='Food', type='expense', user=self.user)
+        self.today = timezone.now().date()
+
+    def test_repeat_requests_hit_cache(self):
+        first = self.client.get(reverse('api_dashboard'))
+        with self.assertNumQueries(1):  # only the data version lookup
+            second = self.client.get(reverse('api_dashboard'))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(cache_stats.snapshot()['dashboard'], {'hits': 1, 'misses': 1})
+
+    def test_writes_invalidate(self):
+        self.client.get(reverse('api_statistics'))
+        Transaction.objects.create(amount=50, date=self.today, category=self.category, user=self.user)
+        self.assertEqual(self.client.get(reverse('api_statistics')).data['total_expenses'], Decimal('50'))
+
+        self.client.get(reverse('api_dashboard'))
+        Budget.objects.create(amount=100, start_date=self.today, end_date=self.today, category=self.category, user=self.user)
+        self.assertEqual(len(self.client.get(reverse('api_dashboard')).data['budgets']), 1)
+
+        Transaction.objects.filter(user=self.user).update(description='bulk edit')
+        self.assertEqual(self.client.get(reverse('api_dashboard')).data['recent_transactions'][0]['description'], 'bulk edit')
+        self.assertEqual(cache_stats.snapshot()['dashboard'], {'hits': 0, 'misses': 3})
+
+    def test_users_and_params_are_isolated(self):
+        other = User.objects.create_user(username='other', password='12345')
+        Transaction.objects.create(amount=-5, date=self.today, category=self.category, user=self.user)
+        self.client.get(reverse('api_statistics'))
+        self.client.force_authenticate(user=other)
+        self.assertEqual(self.client.get(reverse('api_statistics')).data['total_expenses'], Decimal('0'))
+
+    def test_stats_endpoint_requires_staff(self):
+        self.assertEqual(self.client.get(reverse('api_cache_stats')).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.client.get(reverse('api_statistics'))
+        self.assertEqual(self.client.get(reverse('api_cache_stats')).data['statistics']['misses'], 1)
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.category = Category.objects.create(name='Food', type='expense', user=self.user)
+        self.today = timezone.now().date()
+        Transaction.objects.create(amount=-20, date=self.today, category=self.category, user=self.user)
+        Budget.objects.create(amount=100, start_date=self.today, end_date=self.today, category=self.category, user=self.user)
+
+    def test_matching_etag_gets_304_without_view_queries(self):
+        for name in ('api_dashboard', 'api_transactions', 'api_categories', 'api_budgets'):
+            with self.subTest(name):
+                response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+                etag = response['ETag']
+                self.assertTrue(etag.startswith('"'))
+                self.assertNotIn('Last-Modified', response)
+                self.assertIn('no-cache', response['Cache-Control'])
+
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+                # Only the data version is read: no rows, no aggregates, no response cache.
+                self.assertEqual(len(queries), 1)
+                self.assertIn('"budget_dataversion"', queries[0]['sql'])
+
+    def test_writes_and_params_change_the_etag(self):
+        etag = self.client.get(reverse('api_transactions'))['ETag']
+        self.assertNotEqual(self.client.get(reverse('api_transactions'), {'category': 'Food'})['ETag'], etag)
+
+        Transaction.objects.create(amount=-5, date=self.today, category=self.category, user=self.user)
+        response = self.client.get(reverse('api_transactions'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_etags_are_per_user(self):
+        etag = self.client.get(reverse('api_categories'))['ETag']
+        self.client.force_authenticate(user=User.objects.create_user(username='other', password='12345'))
+        self.assertEqual(self.client.get(reverse('api_categories'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_if_modified_since_alone_never_gets_304(self):
+        # Seconds are too coarse: a write in the same second as the last fetch must still be seen.
+        self.client.get(reverse('api_budgets'))
+        Budget.objects.create(amount=50, start_date=self.today, end_date=self.today, category=self.category, user=self.user)
+        response = self.client.get(reverse('api_budgets'), HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+class RollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.food = Category.objects.create(name='Food', type='expense', user=self.user)
+        self.salary = Category.objects.create(name='Salary', type='income', user=self.user)
+
+    def assertRollupsMatch(self):
+        self.assertEqual(verify_rollups([self.user.id]), [])
+
+    def test_writes_maintain_rollups(self):
+        lunch = Transaction.objects.create(amount=20, date=datetime.date(2024, 1, 5), category=self.food, user=self.user)
+        Transaction.objects.create(amount=1000, date=datetime.date(2024, 1, 31), category=self.salary, user=self.user)
+        Transaction.objects.bulk_create([
+            Transaction(amount=-30, date=datetime.date(2024, 2, 1), category=self.food, user=self.user),
+            Transaction(amount=5, date=datetime.date(2024, 2, 1), category=None, user=self.user),
+        ])
+        self.assertRollupsMatch()
+        january = MonthlyRollup.objects.get(user=self.user, category=self.food, period=datetime.date(2024, 1, 1))
+        self.assertEqual((january.expenses, january.transaction_count), (Decimal('20'), 1))
+
+        lunch = Transaction.objects.get(pk=lunch.pk)
+        lunch.date = datetime.date(2024, 2, 10)
+        lunch.amount = -25
+        lunch.save()
+        self.assertRollupsMatch()
+
+        Transaction.objects.filter(user=self.user, amount__lt=0).update(date=datetime.date(2024, 3, 1))
+        self.assertRollupsMatch()
+        Transaction.objects.filter(user=self.user, amount=5).delete()
+        self.assertRollupsMatch()
+
+    def test_category_delete_folds_into_uncategorized(self):
+        Transaction.objects.create(amount=-20, date=datetime.date(2024, 1, 5), category=self.food, user=self.user)
+        Transaction.objects.create(amount=-10, date=datetime.date(2024, 1, 5), category=None, user=self.user)
+        self.food.delete()
+        self.assertRollupsMatch()
+        self.assertEqual(DailyRollup.objects.get(user=self.user, category=None).transaction_count, 2)
+        self.user.delete()
+        self.assertFalse(MonthlyRollup.objects.exists())
+
+    def test_rebuild_rollups_command(self):
+        Transaction.objects.create(amount=300, date=datetime.date(2024, 1, 5), category=self.salary, user=self.user)
+        DailyRollup.objects.update(income=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', '--verify', stdout=StringIO(), stderr=StringIO())
+        call_command('rebuild_rollups', stdout=StringIO())
+        call_command('rebuild_rollups', '--verify', stdout=StringIO())
+
+    def test_timeseries_endpoint(self):
+        Transaction.objects.create(amount=1000, date=datetime.date(2024, 1, 31), category=self.salary, user=self.user)
+        Transaction.objects.create(amount=-200, date=datetime.date(2024, 1, 5), category=self.food, user=self.user)
+        Transaction.objects.create(amount=-50, date=datetime.date(2024, 2, 3), category=self.food, user=self.user)
+        other = User.objects.create_user(username='other', password='12345')
+        Transaction.objects.create(amount=-999, date=datetime.date(2024, 1, 5), user=other)
+
+        with self.assertNumQueries(3):  # data version, series, categories
+            data = self.client.get(reverse('api_statistics_timeseries')).data
+        self.assertEqual([(row['period'], row['income'], row['expenses'], row['savings']) for row in data['series']], [
+            (datetime.date(2024, 1, 1), Decimal('1000'), Decimal('200'), Decimal('800')),
+            (datetime.date(2024, 2, 1), Decimal('0'), Decimal('50'), Decimal('-50')),
+        ])
+        self.assertEqual({row['category']['name']: row['expenses'] for row in data['categories']},
+                         {'Food': Decimal('250'), 'Salary': Decimal('0')})
+
+        data = self.client.get(reverse('api_statistics_timeseries'), {
+            'period': 'day', 'date_from': '2024-01-06', 'category': self.food.id}).data
+        self.assertEqual([(row['period'], row['expenses']) for row in data['series']],
+                         [(datetime.date(2024, 2, 3), Decimal('50'))])
+        self.assertEqual(self.client.get(reverse('api_statistics_timeseries'), {'period': 'year'}).status_code, 400)
+
+class BulkTransactionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.food = Category.objects.create(name='Food', type='expense', user=self.user)
+        self.salary = Category.objects.create(name='Salary', type='income', user=self.user)
+        self.foreign = Category.objects.create(name='Theirs', type='income', user=User.objects.create_user(username='other'))
+        self.url = reverse('api_transactions_bulk')
+
+    def assertInSync(self):
+        self.assertEqual(UserLedger.verify([self.user.id]), [])
+        self.assertEqual(verify_rollups([self.user.id]), [])
+
+    def test_create_reports_item_errors(self):
+        items = [
+            {'amount': '12.50', 'date': '2024-01-02', 'description': 'Lunch', 'category_id': self.food.id},
+            {'amount': 'x', 'date': '2024-01-02', 'category_id': self.food.id},
+            {'amount': '3000', 'date': '2024-01-03', 'category_id': self.salary.id},
+            {'amount': '5', 'date': '2024-01-03', 'category_id': self.foreign.id},
+        ]
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(self.url, items, format='json')
+        statements = [query['sql'] for query in context.captured_queries]
+        self.assertEqual(len([sql for sql in statements if sql.startswith('SELECT "budget_category"')]), 1)
+        self.assertEqual(len([sql for sql in statements if sql.startswith('INSERT INTO "budget_transaction"')]), 1)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([row['amount'] for row in response.data['results']], ['-12.50', '3000.00'])
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 3])
+        self.assertIn('category_id', response.data['errors'][1]['errors'])
+        self.assertInSync()
+
+    def test_update_and_delete(self):
+        first = Transaction.objects.create(amount=-10, date=datetime.date(2024, 1, 1), category=self.food, user=self.user)
+        second = Transaction.objects.create(amount=100, date=datetime.date(2024, 1, 1), category=self.salary, user=self.user)
+        response = self.client.patch(self.url, [
+            {'id': first.id, 'amount': '25'},
+            {'id': second.id, 'category_id': self.food.id, 'date': '2024-02-01'},
+            {'id': 999999, 'amount': '1'},
+            {'amount': '1'},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([error['index'] for error in response.data['errors']], [2, 3])
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.amount, Decimal('-25'))
+        self.assertEqual((second.amount, second.category, second.date), (Decimal('-100'), self.food, datetime.date(2024, 2, 1)))
+        self.assertInSync()
+
+        response = self.client.delete(self.url, [first.id, 'x', 999999], format='json')
+        self.assertEqual(response.data['results'], [first.id])
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2])
+        self.assertFalse(Transaction.objects.filter(pk=first.pk).exists())
+        self.assertInSync()
+
+    def test_rejects_bad_payloads(self):
+        self.assertEqual(self.client.post(self.url, {'amount': 1}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(self.url, [{}] * 1001, format='json').status_code, 400)
+        response = self.client.post(self.url, [{'amount': 'x'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['results'], [])
+
+class CategoryCacheTests(TestCase):
+    def setUp(self):
+        category_cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.food = Category.objects.create(name='Food', type='expense', user=self.user)
+        self.theirs = Category.objects.create(name='Theirs', type='expense', user=User.objects.create_user(username='other'))
+
+    def category_reads(self, func):
+        with CaptureQueriesContext(connection) as context:
+            result = func()
+        return result, len([q for q in context.captured_queries if 'FROM "budget_category"' in q['sql']])
+
+    def post(self, category, amount='10.00'):
+        return self.client.post(reverse('api_transactions'), {
+            'amount': amount, 'date': '2024-01-01', 'description': '', 'category_id': category.id}, format='json')
+
+    def test_writes_skip_category_table(self):
+        self.post(self.food)
+        response, reads = self.category_reads(lambda: self.post(self.food))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['amount'], '-10.00')
+        self.assertEqual(reads, 0)
+
+        transaction, reads = self.category_reads(lambda: Transaction.objects.create(
+            amount=5, date=timezone.now().date(), category_id=self.food.id, user=self.user))
+        self.assertEqual((transaction.amount, reads), (-5, 0))
+
+        form = TransactionForm(data={'amount': '7', 'date': '2024-01-01', 'category': self.food.id}, user=self.user)
+        valid, reads = self.category_reads(form.is_valid)
+        self.assertTrue(valid)
+        self.assertEqual((form.cleaned_data['amount'], reads), (Decimal('-7'), 0))
+
+    def test_scoped_to_user(self):
+        self.assertEqual(self.post(self.theirs).status_code, 400)
+        form = TransactionForm(data={'amount': '7', 'date': '2024-01-01', 'category': self.theirs.id}, user=self.user)
+        self.assertFalse(form.is_valid())
+
+    def test_category_changes_invalidate(self):
+        self.post(self.food)
+        self.food.type = 'income'
+        self.food.save()
+        self.assertEqual(self.post(self.food).data['amount'], '10.00')
+        self.food.delete()
+        self.assertEqual(self.post(self.food).status_code, 400)
+
+    def test_changes_reach_other_processes(self):
+        other_process = CategoryCache()
+        self.assertEqual(other_process.get(self.user.pk, self.food.pk).type, 'expense')
+        self.food.type = 'income'
+        self.food.save()
+        self.assertEqual(other_process.get(self.user.pk, self.food.pk).type, 'income')
+        self.food.delete()
+        self.assertIsNone(other_process.get(self.user.pk, self.food.pk))
+
+class StaleCategoryTests(TransactionTestCase):
+    def setUp(self):
+        category_cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.food = Category.objects.create(name='Food', type='expense', user=self.user)
+        category_cache.get(self.user.pk, self.food.pk)
+        # Deleted behind the cache's back, as by a process whose version bump was lost.
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM budget_category WHERE id = %s', [self.food.pk])
+
+    def test_bulk_write_is_rejected(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        response = client.post(reverse('api_transactions_bulk'), [
+            {'amount': '1.00', 'date': '2024-01-01', 'category_id': self.food.pk}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_form_write_is_rejected(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('add_transaction'), {'amount': '1', 'date': '2024-01-01', 'category': self.food.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('category', response.context['form'].errors)
+        self.assertFalse(Transaction.objects.exists())
+
+@override_settings(BUDGET_ASYNC_PARALLEL_QUERIES=False)
+class AsyncEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.food = Category.objects.create(name='Food', type='expense', user=self.user)
+        today = timezone.now().date()
+        TotalBudget.objects.create(amount=500, start_date=today, end_date=today, user=self.user)
+        Budget.objects.create(amount=100, start_date=today, end_date=today, category=self.food, user=self.user)
+        for day in range(5):
+            Transaction.objects.create(amount=-day - 1, date=today - datetime.timedelta(days=day), category=self.food, user=self.user)
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    async def assertSameAsSync(self, async_response, sync_name, **params):
+        await cache.aclear()
+        self.assertEqual(async_response.status_code, 200)
+        sync_response = await sync_to_async(self.client.get)(reverse(sync_name), params)
+        # Page links differ only by path.
+        self.assertEqual(async_response.content.replace(b'/api/async/', b'/api/'), sync_response.content)
+
+    async def test_async_endpoints_match_sync(self):
+        await self.assertSameAsSync(await self.async_client.get(reverse('api_async_dashboard')), 'api_dashboard')
+        await self.assertSameAsSync(await self.async_client.get(reverse('api_async_statistics')), 'api_statistics')
+        params = {'page_size': 2, 'q': 'foo'}
+        await self.assertSameAsSync(await self.async_client.get(reverse('api_async_transactions'), params), 'api_transactions', **params)
+
+    def test_transaction_pages_and_errors(self):
+        page = self.client.get(reverse('api_async_transactions'), {'page_size': 2}).json()
+        ids = [row['id'] for row in page['results']]
+        while page['next']:
+            page = self.client.get(page['next']).json()
+            ids += [row['id'] for row in page['results']]
+        self.assertEqual(ids, list(Transaction.objects.order_by('-date', '-id').values_list('id', flat=True)))
+
+        response = self.client.get(reverse('api_async_transactions'), {'date_from': 'yesterday'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('date_from', response.json())
+        self.assertEqual(self.client.post(reverse('api_async_dashboard')).status_code, 405)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_async_statistics')).status_code, 403)
+
+class AsyncConcurrentQueryTests(TransactionTestCase):
+    def test_dashboard_queries_run_in_worker_threads(self):
+        user = User.objects.create_user(username='testuser', password='12345')
+        Transaction.objects.create(amount=-5, date=timezone.now().date(), user=user)
+        client = Client()
+        client.force_login(user)
+        with override_settings(BUDGET_ASYNC_PARALLEL_QUERIES=True):
+            data = client.get(reverse('api_async_dashboard')).json()
+        self.assertEqual((data['expenses'], len(data['recent_transactions'])), (5.0, 1))
+
+    @override_settings(BUDGET_METRICS_SAMPLE_RATE=1.0, BUDGET_RESPONSE_CACHE_TIMEOUT=0)
+    def test_worker_thread_queries_count_towards_server_timing(self):
+        user = User.objects.create_user(username='testuser', password='12345')
+        client = Client()
+        client.force_login(user)
+        client.get(reverse('api_async_dashboard'))  # creates the ledger and data version rows
+        descriptions = []
+        for parallel in (False, True):
+            with override_settings(BUDGET_ASYNC_PARALLEL_QUERIES=parallel):
+                response = client.get(reverse('api_async_dashboard'))
+            descriptions.append(response['Server-Timing'].split(';desc=')[1].split(',')[0])
+        self.assertEqual(descriptions[0], descriptions[1])
+
+class TransactionSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.food = Category.objects.create(name='Groceries', type='expense', user=self.user)
+        self.today = timezone.now().date()
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('api_transactions'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_prefix_and_category_matching(self):
+        coffee = Transaction.objects.create(amount=-3, date=self.today, description='Кофе в кафе', category=None, user=self.user)
+        market = Transaction.objects.create(amount=-40, date=self.today, description='Weekly market', category=self.food, user=self.user)
+        Transaction.objects.create(amount=-9, date=self.today, description='Кофе', user=User.objects.create_user(username='other'))
+
+        self.assertEqual([row['id'] for row in self.search('коф')['results']], [coffee.id])
+        self.assertEqual([row['id'] for row in self.search('groc')['results']], [market.id])
+        self.assertEqual([row['id'] for row in self.search('week groc')['results']], [market.id])
+        self.assertEqual(self.search('week coffee')['results'], [])
+        self.assertEqual(self.search('"*')['results'], [])
+
+    def test_index_follows_writes(self):
+        lunch = Transaction.objects.create(amount=-12, date=self.today, description='Lunch', category=self.food, user=self.user)
+        Transaction.objects.filter(pk=lunch.pk).update(description='Dinner')
+        self.assertEqual(self.search('lunch')['results'], [])
+        self.assertEqual(len(self.search('dinner')['results']), 1)
+
+        self.food.name = 'Restaurants'
+        self.food.save()
+        self.assertEqual(len(self.search('restaurant')['results']), 1)
+        self.food.delete()
+        self.assertEqual(self.search('restaurant')['results'], [])
+
+        Transaction.objects.filter(pk=lunch.pk).delete()
+        self.assertEqual(self.search('dinner')['results'], [])
+
+    def test_relevance_order_and_pages(self):
+        weak = Transaction.objects.create(amount=-1, date=self.today, description='taxi ' + 'ride ' * 30, user=self.user)
+        strong = Transaction.objects.create(amount=-1, date=self.today - datetime.timedelta(days=1), description='taxi', user=self.user)
+        for day in range(5):
+            Transaction.objects.create(amount=-1, date=self.today - datetime.timedelta(days=day), description='taxi home', user=self.user)
+
+        first = self.search('taxi', page_size=3)
+        self.assertEqual(first['results'][0]['id'], strong.id)
+        ids = [row['id'] for row in first['results']]
+        page = first
+        while page['next']:
+            page = self.client.get(page['next']).data
+            ids += [row['id'] for row in page['results']]
+        self.assertEqual(len(ids), 7)
+        self.assertEqual(len(set(ids)), 7)
+        self.assertEqual(ids[-1], weak.id)
+
+    def test_html_view_uses_index(self):
+        Transaction.objects.create(amount=-40, date=self.today, description='Weekly market', category=self.food, user=self.user)
+        client = Client()
+        client.login(username='testuser', password='12345')
+        response = client.get(reverse('transaction_list'), {'q': 'mark'})
+        self.assertEqual([t.description for t in response.context['transactions']], ['Weekly market'])
+        response = client.get(reverse('transaction_list'), {'q': 'mark', 'sort': 'amount'})
+        self.assertEqual(len(response.context['transactions']), 1)
+
+class BenchmarkCommandTests(TestCase):
+    def test_generate_data(self):
+        call_command('generate_data', '--users', '2', '--transactions', '300', '--days', '90', stdout=StringIO())
+        user = User.objects.get(username='synthetic-1')
+        self.assertEqual(Transaction.objects.filter(user=user).count(), 300)
+        self.assertTrue(Transaction.objects.filter(user=user, amount__gt=0).exists())
+        self.assertTrue(Transaction.objects.filter(user=user, amount__lt=0).exists())
+        self.assertGreater(Budget.objects.filter(user=user).count(), 0)
+        self.assertEqual(UserLedger.verify(), [])
+        self.assertEqual(verify_rollups(), [])
+
+        with self.assertRaises(CommandError):
+            call_command('generate_data', '--transactions', '10', stdout=StringIO())
+        call_command('generate_data', '--transactions', '10', '--replace', stdout=StringIO())
+        self.assertEqual(Transaction.objects.filter(user__username='synthetic-1').count(), 10)
+
+    def test_benchmark_writes_results(self):
+        call_command('generate_data', '--transactions', '200', '--days', '60', stdout=StringIO())
+        with tempfile.TemporaryDirectory() as directory:
+            first, second = os.path.join(directory, 'first.json'), os.path.join(directory, 'second.json')
+            call_command('benchmark', '--repeat', '1', '--output', first, stdout=StringIO())
+            with open(first) as results:
+                data = json.load(results)
+            self.assertEqual(data['meta']['transactions'], 200)
+            self.assertIn('DashboardView', data['results'])
+            self.assertIn('ExportDataView', data['results'])
+            self.assertEqual(set(data['results']['Budget.remaining_budget']),
+                             {'median_ms', 'min_ms', 'max_ms', 'queries', 'peak_memory_kib'})
+            self.assertGreater(data['results']['TransactionListCreateView']['queries'], 0)
+
+            out = StringIO()
+            call_command('benchmark', '--repeat', '1', '--only', 'Dashboard*', '--output', second,
+                         '--compare', first, stdout=out)
+            with open(second) as results:
+                self.assertEqual(set(json.load(results)['results']), {'DashboardView', 'Dashboard.data'})
+            self.assertIn('DashboardView', out.getvalue().split('Against')[1])
+
+@override_settings(BUDGET_METRICS_SAMPLE_RATE=1.0, BUDGET_METRICS_TOKEN='scrape-token')
+class PerformanceMetricsTests(TestCase):
+    def setUp(self):
+        metrics.reset()
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        category = Category.objects.create(name='Food', type='expense', user=self.user)
+        Transaction.objects.create(amount=-10, date=timezone.now().date(), category=category, user=self.user)
+
+    def server_timing(self, response):
+        return {
+            part.split(';')[0]: dict(item.split('=', 1) for item in part.split(';')[1:])
+            for part in response['Server-Timing'].split(', ')
+        }
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('api_transactions'))
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'db', 'render', 'app', 'total'})
+        self.assertEqual(timing['db']['desc'], f'"{len(queries)} queries"')
+        # A small orjson page renders in well under the 0.1 ms the header resolves.
+        self.assertGreaterEqual(float(timing['render']['dur']), 0)
+        self.assertGreaterEqual(float(timing['total']['dur']), float(timing['db']['dur']))
+
+    @override_settings(BUDGET_METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_only_counted(self):
+        response = self.client.get(reverse('api_transactions'))
+        self.assertNotIn('Server-Timing', response)
+        text = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-token').content.decode()
+        self.assertIn('budget_requests_total{endpoint="api_transactions",method="GET",status="200"} 1', text)
+        self.assertNotIn('budget_request_duration_seconds_count{endpoint="api_transactions"}', text)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('api_dashboard'))
+        self.client.get(reverse('api_dashboard'))
+        self.client.get(reverse('api_transactions'))
+
+        client = Client()
+        self.assertEqual(client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('budget_requests_total{endpoint="api_dashboard",method="GET",status="200"} 2', text)
+        self.assertIn('budget_request_duration_seconds_count{endpoint="api_dashboard"} 2', text)
+        self.assertIn('budget_request_queries_bucket{endpoint="api_transactions",le="+Inf"} 1', text)
+        self.assertIn('budget_response_cache_total{endpoint="dashboard",outcome="hit"}', text)
+        self.assertIn('# TYPE budget_request_db_seconds histogram', text)
+
+        staff = User.objects.create_user(username='staff', password='12345', is_staff=True)
+        client.force_login(staff)
+        self.assertEqual(client.get(reverse('metrics')).status_code, 200)
+
+class LoggingPipelineTests(TestCase):
+    def record(self, name='budget', level=logging.INFO, msg='Handled %s', args=('GET',), **extra):
+        record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_formatter(self):
+        line = json.loads(JSONFormatter().format(self.record(status=200)))
+        self.assertEqual((line['level'], line['logger'], line['message'], line['status']),
+                         ('INFO', 'budget', 'Handled GET', 200))
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            record = self.record(level=logging.ERROR)
+            record.exc_info = __import__('sys').exc_info()
+        self.assertIn('ZeroDivisionError', json.loads(JSONFormatter().format(record))['exception'])
+
+    def test_background_handler_writes_from_listener_thread(self):
+        stream = StringIO()
+        handler = BackgroundHandler(stream)
+        handler.setFormatter(JSONFormatter())
+        logger = logging.getLogger('budget.tests.background')
+        logger.addHandler(handler)
+        logger.propagate = False
+        args = ['first']
+        try:
+            logger.warning('Value %s', args)
+            args.append('changed later')
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+        self.assertEqual(json.loads(stream.getvalue())['message'], "Value ['first']")
+
+    def test_background_handler_drops_instead_of_blocking(self):
+        release = threading.Event()
+
+        class BlockedStream(StringIO):
+            def write(self, text):
+                release.wait(5)
+                return super().write(text)
+
+        stream = BlockedStream()
+        handler = BackgroundHandler(stream, queue_size=1)
+        handler.setFormatter(JSONFormatter())
+        started = time.perf_counter()
+        for _ in range(20):
+            handler.handle(self.record())
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertGreater(handler.dropped, 0)
+        release.set()
+        handler.close()
+        self.assertIn(f'dropped {handler.dropped} records', stream.getvalue())
+
+    def test_rate_limit_is_per_logger(self):
+        rate_limit = RateLimitFilter(rate=0.001, burst=3)
+        passed = [rate_limit.filter(self.record(name='chatty')) for _ in range(10)]
+        self.assertEqual(passed.count(True), 3)
+        self.assertTrue(rate_limit.filter(self.record(name='quiet')))
+        self.assertTrue(rate_limit.filter(self.record(name='chatty', level=logging.ERROR)))
+
+    def test_sampling_keeps_warnings(self):
+        sampling = SamplingFilter(rate=0)
+        self.assertFalse(sampling.filter(self.record(name='django.db.backends', level=logging.DEBUG)))
+        self.assertTrue(sampling.filter(self.record(name='django.db.backends', level=logging.WARNING)))
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_logging', '--threads', '2', '--records', '200', '--sink-latency-us', '0', stdout=out)
+        self.assertIn('json (background, sampled)', out.getvalue())
+
+@override_settings(BUDGET_READ_REPLICAS=['default'], BUDGET_REPLICA_PIN_SECONDS=10, BUDGET_RESPONSE_CACHE_TIMEOUT=0)
+class ReadReplicaRoutingTests(TransactionTestCase):
+    # The test database stands in for the replica: what matters is which alias the router picked.
+    # Not a TestCase: its per-test transaction would keep every read on the primary.
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.category = Category.objects.create(name='Food', type='expense', user=self.user)
+        Transaction.objects.create(amount=-10, date=timezone.now().date(), category=self.category, user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def settle(self):
+        DataVersion.objects.filter(user=self.user).update(updated_at=timezone.now() - datetime.timedelta(minutes=1))
+
+    def routed_aliases(self, *args, **kwargs):
+        aliases = []
+
+        def record(execute, sql, params, many, context):
+            aliases.append(read_alias.get())
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = self.client.get(*args, **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return response, aliases
+
+    def test_router(self):
+        router = ReadReplicaRouter()
+        self.assertIsNone(router.db_for_read(Transaction))
+        token = read_alias.set('replica1')
+        try:
+            self.assertEqual(Transaction.objects.all().db, 'replica1')
+            self.assertEqual(router.db_for_write(Transaction), 'default')
+            with transaction.atomic():
+                self.assertEqual(Transaction.objects.all().db, 'default')
+        finally:
+            read_alias.reset(token)
+        self.assertEqual(Transaction.objects.all().db, 'default')
+
+    def test_read_your_writes(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        request.session = {}
+        self.assertIsNone(choose_replica(request))
+        self.settle()
+        self.assertEqual(choose_replica(request), 'default')
+        request.session[ADMIN_PIN_SESSION_KEY] = time.time() + 10
+        self.assertIsNone(choose_replica(request))
+        request = RequestFactory().post('/')
+        request.user = self.user
+        self.assertIsNone(choose_replica(request))
+        with override_settings(BUDGET_READ_REPLICAS=[]):
+            request.method = 'GET'
+            self.assertIsNone(choose_replica(request))
+
+    def test_heavy_endpoints_read_from_replica(self):
+        self.settle()
+        for url, params in [(reverse('api_dashboard'), {}), (reverse('api_statistics'), {}),
+                            (reverse('api_statistics_timeseries'), {}), (reverse('api_export_data'), {}),
+                            (reverse('api_export_data'), {'output': 'ndjson'})]:
+            response, aliases = self.routed_aliases(url, params)
+            self.assertEqual(response.status_code, 200)
+            # Only the cache key and the user's last write are looked up on the primary.
+            first = aliases.index('default')
+            self.assertLessEqual(first, 2, url)
+            self.assertEqual(set(aliases[first:]), {'default'}, url)
+
+        response, aliases = self.routed_aliases(reverse('api_transactions'))
+        self.assertEqual(set(aliases), {None})
+
+    def test_legacy_reporting_views_read_from_replica(self):
+        self.settle()
+        for view in (views.StatisticsView, views.ExportDataView):
+            request = APIRequestFactory().get('/')
+            force_authenticate(request, user=self.user)
+            aliases = []
+
+            def record(execute, sql, params, many, context):
+                aliases.append(read_alias.get())
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(record):
+                self.assertEqual(view.as_view()(request).status_code, 200)
+            self.assertIn('default', aliases, view.__name__)
+
+    def test_recent_writer_stays_on_primary(self):
+        self.settle()
+        response = self.client.post(reverse('api_transactions'), {
+            'amount': '-5.00', 'date': '2024-01-01', 'description': '', 'category_id': self.category.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+        response, aliases = self.routed_aliases(reverse('api_statistics'))
+        self.assertEqual(response.data['total_expenses'], Decimal('15'))
+        self.assertEqual(set(aliases), {None})
+
+    def test_admin_changelist(self):
+        admin_user = User.objects.create_superuser(username='admin', password='12345', email='admin@example.com')
+        client = Client()
+        client.force_login(admin_user)
+        aliases = []
+
+        def record(execute, sql, params, many, context):
+            aliases.append(read_alias.get())
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            self.assertEqual(client.get(reverse('admin:budget_transaction_changelist')).status_code, 200)
+        self.assertIn('default', aliases)
+
+        client.post(reverse('admin:budget_category_change', args=[self.category.id]),
+                    {'name': 'Groceries', 'type': 'expense', 'user': self.user.id})
+        aliases.clear()
+        with connection.execute_wrapper(record):
+            client.get(reverse('admin:budget_category_changelist'))
+        self.assertNotIn('default', aliases)
+
+class DatabaseBackupTests(TransactionTestCase):
+    # A backup cannot run inside TestCase's transaction.
+    def setUp(self):
+        call_command('generate_data', '--transactions', '300', '--days', '60', stdout=StringIO())
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def backups(self):
+        return sorted(name for name in os.listdir(self.directory.name) if name.startswith('db-'))
+
+    def test_backup_is_verified_and_compressed(self):
+        out = StringIO()
+        call_command('backup_db', '--dir', self.directory.name, '--pages', '4', '--pause-ms', '0', stdout=out)
+        [name] = self.backups()
+        self.assertTrue(name.endswith('.sqlite3.gz'))
+        self.assertIn('300 Transaction', out.getvalue())
+
+        restored = os.path.join(self.directory.name, 'restored.sqlite3')
+        with gzip.open(os.path.join(self.directory.name, name)) as src, open(restored, 'wb') as dst:
+            dst.write(src.read())
+        db = sqlite3.connect(restored)
+        try:
+            self.assertEqual(db.execute('PRAGMA journal_mode').fetchone()[0], 'delete')
+            self.assertEqual(backup.count_rows(db), {
+                'Transaction': Transaction.objects.count(),
+                'Category': Category.objects.count(),
+                'Budget': Budget.objects.count(),
+            })
+        finally:
+            db.close()
+
+    def test_rotation_keeps_newest(self):
+        for _ in range(3):
+            call_command('backup_db', '--dir', self.directory.name, '--keep', '2', '--no-compress', stdout=StringIO())
+        names = self.backups()
+        self.assertEqual(len(names), 2)
+        self.assertTrue(all(name.endswith('.sqlite3') for name in names))
+        stale = backup.rotate(pathlib.Path(self.directory.name), 1)
+        self.assertEqual([path.name for path in stale], names[:1])
+
+    def test_verify_rejects_mismatched_counts(self):
+        path, counts = backup.backup(connection, self.directory.name, compressed=False)
+        backup.verify(path, counts)
+        with self.assertRaises(backup.BackupError):
+            backup.verify(path, dict(counts, Transaction=counts['Transaction'] + 1))
+        with open(path, 'r+b') as corrupt:
+            corrupt.write(b'not a database' * 10)
+        with self.assertRaises(backup.BackupError):
+            backup.verify(path, counts)
+
+        with transaction.atomic(), self.assertRaises(backup.BackupError):
+            backup.backup(connection, self.directory.name)
+
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cached', password='12345')
+        self.url = reverse('api_categories')
+
+    def auth_queries(self, client):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return [q['sql'] for q in queries if any(
+            table in q['sql'] for table in ('"auth_user"', '"authtoken_token"', '"django_session"'))]
+
+    def test_jwt_requests_run_no_auth_queries_once_cached(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(len(self.auth_queries(client)), 1)
+        self.assertEqual(self.auth_queries(client), [])
+
+    def test_token_requests_run_no_auth_queries_once_cached(self):
+        token = Token.objects.create(user=self.user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.auth_queries(client)
+        self.assertEqual(self.auth_queries(client), [])
+
+        token.delete()
+        # SessionAuthentication comes first, so failures are 403 rather than 401.
+        self.assertEqual(client.get(self.url).status_code, 403)
+
+    def test_session_requests_run_no_auth_queries_once_cached(self):
+        client = APIClient()
+        client.login(username='cached', password='12345')
+        self.auth_queries(client)
+        self.assertEqual(self.auth_queries(client), [])
+
+        self.user.set_password('changed-password')
+        self.user.save()
+        self.assertEqual(client.get(self.url).status_code, 403)
+
+    def test_deactivation_invalidates_cached_user(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        self.assertEqual(client.get(self.url).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        response = client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data['detail'].code, 'user_inactive')
+
+    def test_cache_holds_no_password(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        client.get(self.url)
+        fields, _ = cache.get(user_key(self.user.pk))
+        self.assertEqual(set(fields), set(AUTH_USER_FIELDS))
+
+        # Other fields load on demand, and saving the cached user keeps them.
+        response = client.patch(reverse('api_user_profile'), {'email': 'cached@example.com'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.email, 'cached@example.com')
+        self.assertTrue(self.user.check_password('12345'))
+
+class FastJSONTests(TestCase):
+    def test_renderer_matches_drf(self):
+        from django.utils.translation import gettext_lazy
+        from rest_framework.utils.serializer_helpers import ReturnDict
+        payload = {
+            'amount': Decimal('153.10'), 'string_amount': '-20.00', 'date': datetime.date(2024, 2, 29),
+            'created': datetime.datetime(2024, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+            'text': 'Еда "и"\n напитки \u2028', 'lazy': gettext_lazy('Food'), 1: None,
+            'nested': ReturnDict({'rows': [1, 2.5, True, None]}, serializer=None),
+        }
+        self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+        # Falls back where orjson has no answer.
+        self.assertEqual(FastJSONRenderer().render({'big': 2 ** 70}), JSONRenderer().render({'big': 2 ** 70}))
+        self.assertEqual(FastJSONRenderer().render([1], 'application/json; indent=2'),
+                         JSONRenderer().render([1], 'application/json; indent=2'))
+
+    def test_parser(self):
+        self.assertEqual(FastJSONParser().parse(io.BytesIO('{"a": [1, "é"]}'.encode())), {'a': [1, 'é']})
+        for body in (b'{"a": ', b'{"a": NaN}'):
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(body))
+
+    def test_large_responses_are_compressed(self):
+        user = User.objects.create_user(username='testuser', password='12345')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        category = Category.objects.create(name='Food', type='expense', user=user)
+        Transaction.objects.bulk_create([Transaction(amount=-i, date=timezone.now().date(), description=f'Lunch {i}',
+                                                     category=category, user=user) for i in range(200)])
+
+        small = client.get(reverse('api_categories'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(small.has_header('Content-Encoding'))
+
+        response = client.get(reverse('api_transactions'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))['results']), 50)
+        # The weakened ETag still revalidates.
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertEqual(client.get(reverse('api_transactions'), HTTP_ACCEPT_ENCODING='gzip',
+                                    HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        if middleware_brotli is not None:
+            response = client.get(reverse('api_transactions'), HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+            self.assertEqual(response['Content-Encoding'], 'br')
+            self.assertEqual(len(json.loads(middleware_brotli.decompress(response.content))['results']), 50)
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.food = Category.objects.create(name='Food', type='expense', user=self.user)
+        self.salary = Category.objects.create(name='Salary', type='income', user=self.user)
+        for amount, date, category in (
+            (1000, datetime.date(2023, 1, 15), self.salary), (-100, datetime.date(2023, 1, 20), self.food),
+            (-50, datetime.date(2023, 3, 10), self.food), (Decimal('-25.50'), datetime.date(2023, 3, 11), None),
+            (1100, datetime.date(2024, 1, 5), self.salary), (-200, datetime.date(2024, 1, 6), self.food),
+        ):
+            Transaction.objects.create(amount=amount, date=date, category=category, user=self.user)
+
+    def test_orm_report(self):
+        report = analytics.report(self.user, analytics.ANALYTICS_SECTIONS, window=2, engine='orm')
+        monthly = report['monthly']
+        self.assertEqual(len(monthly), 13)
+        self.assertEqual(monthly[0], {
+            'month': datetime.date(2023, 1, 1), 'income': 1000.0, 'expenses': 100.0, 'savings': 900.0, 'count': 2,
+            'income_avg': None, 'expenses_avg': None, 'savings_avg': None, 'income_yoy': None, 'expenses_yoy': None,
+        })
+        # Empty months are filled in and count towards the moving average.
+        self.assertEqual((monthly[1]['count'], monthly[1]['income_avg'], monthly[1]['expenses_avg']), (0, 500.0, 50.0))
+        self.assertEqual(monthly[2]['expenses'], 75.5)
+        self.assertEqual((monthly[12]['income_yoy'], monthly[12]['expenses_yoy']), (10.0, 100.0))
+
+        categories = report['categories']
+        self.assertEqual([row['category'] and row['category']['name'] for row in categories], ['Food', None, 'Salary'])
+        self.assertEqual(categories[0], {
+            'category': {'id': self.food.pk, 'name': 'Food', 'type': 'expense'},
+            'income': 0.0, 'expenses': 350.0, 'count': 3, 'share': 0.9321,
+        })
+        self.assertEqual(report['percentiles'], {
+            'income': {'p50': 1050.0, 'p90': 1090.0, 'p99': 1099.0},
+            'expenses': {'p50': 75.0, 'p90': 170.0, 'p99': 197.0},
+        })
+
+    @unittest.skipUnless(analytics.np, 'numpy is not installed')
+    def test_engines_agree(self):
+        for options in ({}, {'window': 5, 'percentiles': [0, 12.5, 100]}, {'date_from': datetime.date(2023, 2, 1)},
+                        {'date_from': datetime.date(2030, 1, 1)}):
+            with self.subTest(options):
+                self.assertEqual(analytics.report(self.user, analytics.ANALYTICS_SECTIONS, engine='numpy', **options),
+                                 analytics.report(self.user, analytics.ANALYTICS_SECTIONS, engine='orm', **options))
+
+    def test_empty_report(self):
+        report = analytics.report(self.user, analytics.ANALYTICS_SECTIONS, date_to=datetime.date(2000, 1, 1))
+        self.assertEqual(report['monthly'], [])
+        self.assertEqual(report['categories'], [])
+        self.assertEqual(report['percentiles']['expenses'], {'p50': None, 'p90': None, 'p99': None})
+
+    def test_statistics_endpoint(self):
+        response = self.client.get(reverse('api_statistics'))
+        self.assertEqual(set(response.data), {'total_income', 'total_expenses', 'savings_rate'})
+
+        response = self.client.get(reverse('api_statistics'), {
+            'include': 'monthly,percentiles', 'window': '11', 'percentiles': '25,75', 'date_from': '2023-03-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('categories', response.data)
+        self.assertEqual(response.data['monthly'][0]['month'], datetime.date(2023, 3, 1))
+        self.assertEqual(response.data['monthly'][-1]['expenses_avg'], round((7550 + 20000) / 11 / 100, 2))
+        self.assertEqual(set(response.data['percentiles']['expenses']), {'p25', 'p75'})
+
+        for params in ({'include': 'monthly,forecast'}, {'include': 'monthly', 'window': '0'},
+                       {'include': 'monthly', 'window': 'x'}, {'include': 'percentiles', 'percentiles': '50,101'},
+                       {'include': 'percentiles', 'percentiles': ','.join(['50'] * 11)}):
+            with self.subTest(params):
+                self.assertEqual(self.client.get(reverse('api_statistics'), params).status_code, 400)
+
+
+class BudgetAlertTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        UserSettings.objects.create(user=self.user, notifications_enabled=True)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.food = Category.objects.create(name='Food', type='expense', user=self.user)
+        self.today = timezone.now().date()
+        self.budget = Budget.objects.create(amount=100, start_date=self.today.replace(day=1),
+                                            end_date=self.today + datetime.timedelta(days=30),
+                                            category=self.food, user=self.user)
+
+    def spend(self, amount, **kwargs):
+        return Transaction.objects.create(amount=amount, date=self.today, category=self.food, user=self.user, **kwargs)
+
+    def test_spend_follows_writes(self):
+        tx = self.spend(30)
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.spent, Decimal('30.00'))
+
+        tx.amount = Decimal('-45.50')
+        tx.save()
+        outside = self.spend(10)
+        outside.date = self.budget.start_date - datetime.timedelta(days=1)
+        outside.save()
+        Transaction.objects.bulk_create([
+            Transaction(amount=-5, date=self.budget.end_date, category=self.food, user=self.user),
+            Transaction(amount=-7, date=self.budget.end_date + datetime.timedelta(days=1), category=self.food, user=self.user),
+        ])
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.spent, Decimal('50.50'))
+
+        Transaction.objects.filter(amount=-5).delete()
+        Transaction.objects.filter(pk=tx.pk).update(amount=-20)
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.spent, Decimal('20.00'))
+        self.assertEqual(verify_budget_spend(), [])
+
+    def test_write_without_scanning_transactions(self):
+        self.spend(10)
+        with CaptureQueriesContext(connection) as queries:
+            self.spend(20)
+        budget_sql = [q['sql'] for q in queries if '"budget_budget"' in q['sql']]
+        # Lock/read the category's budgets, then write the new spend.
+        self.assertEqual(len(budget_sql), 2)
+        self.assertFalse(any('"budget_transaction"' in sql for sql in budget_sql))
+        # Past periods are filtered out in SQL, so they are neither loaded nor locked.
+        self.assertIn('"start_date" <=', budget_sql[0])
+        self.assertIn('"end_date" >=', budget_sql[0])
+
+    def test_crossing_thresholds_queues_notifications(self):
+        self.spend(50)
+        self.spend(35)
+        self.spend(5)
+        self.assertEqual(list(BudgetNotification.objects.values_list('threshold', 'spent')), [(80, Decimal('85.00'))])
+
+        over = self.spend(20)
+        self.assertEqual(BudgetNotification.objects.first().threshold, 100)
+        self.assertEqual(BudgetNotification.objects.count(), 2)
+
+        # Dropping back below a threshold re-arms it.
+        over.delete()
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.alert_level, 80)
+        self.spend(20)
+        self.assertEqual(list(BudgetNotification.objects.values_list('threshold', flat=True)), [100, 100, 80])
+
+    @override_settings(BUDGET_ALERT_THRESHOLDS=(50,))
+    def test_budget_changes_and_settings(self):
+        self.spend(60)
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.alert_level, 50)
+
+        # A new budget counts existing spending straight away.
+        budget = Budget.objects.create(amount=50, start_date=self.today, end_date=self.today,
+                                       category=self.food, user=self.user)
+        self.assertEqual((budget.spent, budget.alert_level), (Decimal('60.00'), 50))
+        budget.amount = 1000
+        budget.save()
+        self.assertEqual(Budget.objects.get(pk=budget.pk).alert_level, 0)
+        self.assertEqual(BudgetNotification.objects.filter(budget=budget).count(), 1)
+
+        UserSettings.objects.filter(user=self.user).update(notifications_enabled=False)
+        self.spend(1000)
+        self.assertEqual(Budget.objects.get(pk=budget.pk).alert_level, 50)
+        self.assertEqual(BudgetNotification.objects.filter(budget=budget).count(), 1)
+
+    def test_rebuild_command_covers_budgets(self):
+        self.spend(30)
+        Budget.objects.filter(pk=self.budget.pk).update(spent=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', '--verify', stdout=StringIO(), stderr=StringIO())
+        call_command('rebuild_rollups', stdout=StringIO())
+        call_command('rebuild_rollups', '--verify', stdout=StringIO())
+        self.budget.refresh_from_db()
+        self.assertEqual(self.budget.spent, Decimal('30.00'))
+
+    def test_notifications_api(self):
+        other = User.objects.create_user(username='other', password='12345')
+        UserSettings.objects.create(user=other, notifications_enabled=True)
+        other_category = Category.objects.create(name='Food', type='expense', user=other)
+        Budget.objects.create(amount=10, start_date=self.today, end_date=self.today, category=other_category, user=other)
+        Transaction.objects.create(amount=-10, date=self.today, category=other_category, user=other)
+        self.spend(80)
+        self.spend(20)
+
+        response = self.client.get(reverse('api_notifications'))
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([(row['threshold'], row['spent'], row['category']) for row in results],
+                         [(100, '100.00', self.food.pk), (80, '80.00', self.food.pk)])
+        self.assertIsNone(results[0]['read_at'])
+
+        response = self.client.post(reverse('api_notifications_read'), {'ids': [results[1]['id']]}, format='json')
+        self.assertEqual(response.data, {'updated': 1})
+        unread = self.client.get(reverse('api_notifications'), {'unread': '1'}).data['results']
+        self.assertEqual([row['threshold'] for row in unread], [100])
+
+        self.assertEqual(self.client.post(reverse('api_notifications_read'), {'ids': 'all'}, format='json').status_code, 400)
+        self.assertEqual(self.client.post(reverse('api_notifications_read'), {}, format='json').data, {'updated': 1})
+        self.assertEqual(BudgetNotification.objects.filter(user=other, read_at__isnull=True).count(), 1)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.results = tempfile.TemporaryDirectory()
+        self.addCleanup(self.results.cleanup)
+        self.uploads = tempfile.TemporaryDirectory()
+        self.addCleanup(self.uploads.cleanup)
+        settings_override = override_settings(BUDGET_JOB_RESULTS_DIR=pathlib.Path(self.results.name),
+                                              BUDGET_JOB_UPLOADS_DIR=pathlib.Path(self.uploads.name))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user(username='testuser', password='12345')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        food = Category.objects.create(name='Food', type='expense', user=self.user)
+        for i in range(5):
+            Transaction.objects.create(amount=-10 - i, date=datetime.date(2024, 1, i + 1), category=food,
+                                       user=self.user, description=f'#{i}')
+
+    def run_worker(self):
+        out = StringIO()
+        call_command('run_jobs', '--processes', '0', '--burst', stdout=out)
+        return out.getvalue()
+
+    def test_export_job(self):
+        response = self.client.post(reverse('api_jobs'), {'kind': 'export', 'params': {'output': 'ndjson'}}, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual((response.data['status'], response.data['result_url']), ('pending', None))
+
+        self.assertIn(f'Job {response.data["id"]}: done', self.run_worker())
+        job = self.client.get(reverse('api_job_detail', args=[response.data['id']])).data
+        self.assertEqual((job['status'], job['progress'], job['attempts']), ('done', 100, 1))
+        self.assertTrue(job['result_url'].endswith(reverse('api_job_result', args=[job['id']])))
+
+        download = self.client.get(reverse('api_job_result', args=[job['id']]))
+        self.assertEqual(download['Content-Type'], 'application/gzip')
+        self.assertIn('moneyapp-export.ndjson.gz', download['Content-Disposition'])
+        exported = b''.join(self.client.get(reverse('api_export_data') + '?output=ndjson').streaming_content)
+        self.assertEqual(gzip.decompress(b''.join(download.streaming_content)), exported)
+
+    def test_export_view_in_background(self):
+        response = self.client.get(reverse('api_export_data'), {'output': 'csv', 'background': '1'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual((response.data['kind'], response.data['params']), ('export', {'output': 'csv'}))
+        self.assertEqual(self.client.get(reverse('api_export_data'), {'output': 'xml', 'background': '1'}).status_code, 400)
+
+    def test_rebuild_job(self):
+        UserLedger.objects.filter(user=self.user).update(total_expenses=0)
+        response = self.client.post(reverse('api_jobs'), {'kind': 'rebuild'}, format='json')
+        self.run_worker()
+        self.assertEqual(UserLedger.objects.get(user=self.user).total_expenses, Decimal('60.00'))
+        self.assertEqual(Job.objects.get(pk=response.data['id']).result['budgets_corrected'], 0)
+
+    def test_validation_and_ownership(self):
+        for data in ({'kind': 'import'}, {'kind': 'export', 'params': {'output': 'xml'}},
+                     {'kind': 'export', 'params': [1]}, {'kind': 'rebuild', 'params': {'all': True}}):
+            with self.subTest(data):
+                self.assertEqual(self.client.post(reverse('api_jobs'), data, format='json').status_code, 400)
+
+        with override_settings(BUDGET_JOB_MAX_UNFINISHED=2):
+            for _ in range(2):
+                self.assertEqual(self.client.post(reverse('api_jobs'), {'kind': 'rebuild'}, format='json').status_code, 202)
+            self.assertEqual(self.client.post(reverse('api_jobs'), {'kind': 'rebuild'}, format='json').status_code, 400)
+
+        other = User.objects.create_user(username='other', password='12345')
+        job = Job.enqueue(other, 'export', output='json')
+        jobs.run_job(jobs.claim(5, 'test')[-1])
+        self.assertEqual(Job.objects.get(pk=job.pk).status, 'done')
+        self.assertEqual(self.client.get(reverse('api_job_detail', args=[job.pk])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api_job_result', args=[job.pk])).status_code, 404)
+        self.assertEqual(len(self.client.get(reverse('api_jobs')).data['results']), 2)
+
+    def test_failed_job(self):
+        job = Job.enqueue(self.user, 'export', output='xml')
+        self.assertIn('failed', self.run_worker())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.message), ('failed', "Unknown export format 'xml'"))
+        self.assertIsNone(self.client.get(reverse('api_job_detail', args=[job.pk])).data['result_url'])
+
+    def test_claims_and_stale_jobs(self):
+        export = Job.enqueue(self.user, 'export')
+        import_job = ImportJob.objects.create(user=self.user, format='ndjson', status='running')
+        (pathlib.Path(self.uploads.name) / 'import-0').write_bytes(b'{}')
+        upload = Job.enqueue(self.user, 'import', import_job=import_job.pk, upload='import-0')
+        self.assertEqual(jobs.claim(5, 'a'), [export.pk, upload.pk])
+        self.assertEqual(jobs.claim(5, 'b'), [])
+
+        Job.objects.update(heartbeat_at=timezone.now() - datetime.timedelta(minutes=10))
+        self.assertEqual(jobs.requeue_stale(60), (1, 1))
+        export.refresh_from_db()
+        self.assertEqual((export.status, export.attempts, export.worker), ('pending', 1, ''))
+        # Imports are not run twice.
+        self.assertEqual(Job.objects.get(pk=upload.pk).status, 'failed')
+        self.assertEqual(ImportJob.objects.get(pk=import_job.pk).status, 'failed')
+        self.assertEqual(os.listdir(self.uploads.name), [])
+
+        Job.objects.filter(pk=export.pk).update(attempts=jobs.JOB_MAX_ATTEMPTS - 1)
+        jobs.claim(1, 'a')
+        Job.objects.filter(pk=export.pk).update(heartbeat_at=timezone.now() - datetime.timedelta(minutes=10))
+        self.assertEqual(jobs.requeue_stale(60), (0, 1))
+
+    def test_large_import_is_queued(self):
+        lines = [json.dumps({'record': 'transaction', 'data': {'amount': '-1.00', 'date': '2024-01-01'}}) for _ in range(100)]
+        with override_settings(BUDGET_IMPORT_SYNC_MAX_BYTES=1024, BUDGET_JOB_QUEUE=True):
+            response = self.client.post(reverse('api_import_data'), data='\n'.join(lines), content_type='application/x-ndjson')
+        self.assertEqual((response.status_code, response.data['status']), (202, 'pending'))
+        job = Job.objects.get(kind='import')
+        self.assertEqual(job.params['import_job'], response.data['id'])
+        # Moved out of the web server's temporary directory, where a worker in another container can't see it.
+        upload = pathlib.Path(self.uploads.name) / job.params['upload']
+        self.assertTrue(upload.exists())
+
+        self.assertEqual(jobs.run_job(jobs.claim(1, 'other-host')[0]), 'done')
+        self.assertEqual(self.client.get(reverse('api_import_job', args=[response.data['id']])).data['rows_imported'], 100)
+        self.assertEqual(Job.objects.get(pk=job.pk).result['rows_imported'], 100)
+        self.assertFalse(upload.exists())
+
+    def test_prune(self):
+        job = Job.enqueue(self.user, 'export')
+        jobs.run_job(jobs.claim(1, 'a')[0])
+        path = jobs.result_path(Job.objects.get(pk=job.pk))
+        self.assertTrue(path.exists())
+        self.assertEqual(jobs.prune(ttl=3600), 0)
+        Job.objects.update(finished_at=timezone.now() - datetime.timedelta(hours=2))
+        self.assertEqual(jobs.prune(ttl=3600), 1)
+        self.assertFalse(path.exists())
+
+
 class AuthenticationTests(TestCase):
     def setUp(self):
         self.client = APIClient()
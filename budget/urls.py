@@ -1,6 +1,7 @@
 from django.urls import path
 from . import views
 from . import api
+from . import async_api
 from rest_framework.authtoken.views import obtain_auth_token
 from rest_framework_simplejwt.views import TokenRefreshView
 from .views import dashboard, transaction_list, add_transaction, budget_list, add_budget, dashboard_view, login_view
@@ -19,6 +20,7 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/dashboard/', api.DashboardView.as_view(), name='api_dashboard'),
     path('api/transactions/', api.TransactionListCreateView.as_view(), name='api_transactions'),
+    path('api/transactions/bulk/', api.TransactionBulkView.as_view(), name='api_transactions_bulk'),
     path('api/transactions/<int:pk>/', api.TransactionDetailView.as_view(), name='api_transaction_detail'),
     path('api/categories/', api.CategoryListCreateView.as_view(), name='api_categories'),
     path('api/categories/<int:pk>/', api.CategoryDetailView.as_view(), name='api_category_detail'),
@@ -30,7 +32,20 @@ urlpatterns = [
     # Новые API endpoints
     path('api/user-profile/', api.UserProfileView.as_view(), name='api_user_profile'),
     path('api/statistics/', api.StatisticsView.as_view(), name='api_statistics'),
+    path('api/statistics/timeseries/', api.TimeseriesStatisticsView.as_view(), name='api_statistics_timeseries'),
     path('api/export-data/', api.ExportDataView.as_view(), name='api_export_data'),
     path('api/import-data/', api.ImportDataView.as_view(), name='api_import_data'),
+    path('api/import-data/<int:pk>/', api.ImportJobDetailView.as_view(), name='api_import_job'),
     path('api/user-settings/', UserSettingsView.as_view(), name='api_user_settings'),
+    path('api/cache-stats/', api.CacheStatsView.as_view(), name='api_cache_stats'),
+    path('api/notifications/', api.NotificationListView.as_view(), name='api_notifications'),
+    path('api/notifications/read/', api.NotificationReadView.as_view(), name='api_notifications_read'),
+    path('api/jobs/', api.JobListCreateView.as_view(), name='api_jobs'),
+    path('api/jobs/<int:pk>/', api.JobDetailView.as_view(), name='api_job_detail'),
+    path('api/jobs/<int:pk>/result/', api.JobResultView.as_view(), name='api_job_result'),
+
+    # Async (ASGI) variants of the read-heavy endpoints
+    path('api/async/dashboard/', async_api.dashboard, name='api_async_dashboard'),
+    path('api/async/statistics/', async_api.statistics, name='api_async_statistics'),
+    path('api/async/transactions/', async_api.transactions, name='api_async_transactions'),
 ]
@@ -1,7 +1,6 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, Q
-from .models import Transaction, Category, Budget, TotalBudget
+from .models import Transaction, Category, Budget, TotalBudget, UserLedger
 from .forms import TransactionForm, BudgetForm
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.decorators import api_view, permission_classes
@@ -10,30 +9,26 @@ from rest_framework import status, generics
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import HttpResponse, HttpResponseForbidden
+import hmac
 import logging
 from .serializers import TransactionSerializer, CategorySerializer, BudgetSerializer, UserProfileSerializer, TotalBudgetSerializer
+from .search import search_transactions
+from .dashboard import Dashboard
+from .cache import cache_per_user, stats as cache_stats
+from .routers import read_from_replica
+from .metrics import metrics
+from .api import streaming_export
 
 logger = logging.getLogger(__name__)
 
 @login_required
+@cache_per_user('dashboard_html')
+@read_from_replica
 def dashboard(request):
-    income = Transaction.objects.filter(user=request.user, amount__gt=0).aggregate(Sum('amount'))['amount__sum'] or 0
-    expenses = abs(Transaction.objects.filter(user=request.user, amount__lt=0).aggregate(Sum('amount'))['amount__sum'] or 0)
-    balance = income - expenses
-    
-    recent_transactions = Transaction.objects.filter(user=request.user).order_by('-date', '-id')[:10]
-    budgets = Budget.objects.filter(user=request.user)
-    total_budget = TotalBudget.objects.filter(user=request.user).first()
-    
-    context = {
-        'income': income,
-        'expenses': expenses,
-        'balance': balance,
-        'recent_transactions': recent_transactions,
-        'budgets': budgets,
-        'total_budget': total_budget,
-    }
-    return render(request, 'budget/dashboard.html', context)
+    return render(request, 'budget/dashboard.html', Dashboard(request.user).context())
 
 @login_required
 def transaction_list(request):
@@ -49,13 +44,11 @@ def transaction_list(request):
         transactions = transactions.filter(date__range=[date_from, date_to])
     
     query = request.GET.get('q')
+    sort = request.GET.get('sort', 'relevance')
     if query:
-        transactions = transactions.filter(
-            Q(description__icontains=query) | Q(category__name__icontains=query)
-        )
-    
-    sort = request.GET.get('sort', '-date')
-    transactions = transactions.order_by(sort)
+        transactions = search_transactions(transactions, query)
+    if sort != 'relevance' or not query:
+        transactions = transactions.order_by('-date' if sort == 'relevance' else sort)
     
     categories = Category.objects.filter(user=request.user)
     
@@ -72,15 +65,20 @@ def add_transaction(request):
         if form.is_valid():
             transaction = form.save(commit=False)
             transaction.user = request.user
-            transaction.save()
-            return redirect('dashboard')
+            try:
+                transaction.save()
+            except IntegrityError:
+                # The category was deleted after the form was validated.
+                form.add_error('category', 'This category no longer exists.')
+            else:
+                return redirect('dashboard')
     else:
         form = TransactionForm(user=request.user)
     return render(request, 'budget/add_transaction.html', {'form': form})
 
 @login_required
 def budget_list(request):
-    budgets = Budget.objects.filter(user=request.user)
+    budgets = Budget.objects.filter(user=request.user).select_related('category').with_remaining()
     return render(request, 'budget/budget_list.html', {'budgets': budgets})
 
 @login_required
@@ -99,35 +97,24 @@ def add_budget(request):
 @csrf_exempt
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@cache_per_user('dashboard_view')
+@read_from_replica
 def dashboard_view(request):
-    logger.debug("Received request: %s %s", request.method, request.path)
-    logger.debug("User: %s", request.user)
-    logger.debug("Auth: %s", request.auth)
-    
-    income = Transaction.objects.filter(user=request.user, amount__gt=0).aggregate(Sum('amount'))['amount__sum'] or 0
-    expenses = abs(Transaction.objects.filter(user=request.user, amount__lt=0).aggregate(Sum('amount'))['amount__sum'] or 0)
-    balance = income - expenses
-    
-    recent_transactions = Transaction.objects.filter(user=request.user).order_by('-date', '-id')[:10]
-    budgets = Budget.objects.filter(user=request.user)
-    total_budget = TotalBudget.objects.filter(user=request.user).first()
-    
-    data = {
-        'income': income,
-        'expenses': expenses,
-        'balance': balance,
-        'recent_transactions': TransactionSerializer(recent_transactions, many=True).data,
-        'budgets': BudgetSerializer(budgets, many=True).data,
-        'total_budget': TotalBudgetSerializer(total_budget).data if total_budget else None,
-    }
-    return Response(data)
+    return Response(Dashboard(request.user).data())
+
+def metrics_view(request):
+    """Prometheus metrics of this process, for staff sessions or the BUDGET_METRICS_TOKEN bearer."""
+    token = getattr(settings, 'BUDGET_METRICS_TOKEN', None)
+    authorization = request.headers.get('Authorization', '')
+    allowed = request.user.is_staff or (bool(token) and hmac.compare_digest(authorization, f'Bearer {token}'))
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(cache_stats.snapshot()), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @csrf_exempt
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def login_view(request):
-    logger.debug("Login view called")
-    logger.debug("Request data: %s", request.data)
     username = request.data.get('username')
     password = request.data.get('password')
     user = authenticate(username=username, password=password)
@@ -138,6 +125,7 @@ def login_view(request):
             'access': str(refresh.access_token),
         })
     else:
+        logger.info("Failed login", extra={'username': username})
         return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
 
 class TransactionListCreateView(generics.ListCreateAPIView):
@@ -182,7 +170,7 @@ class BudgetListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Budget.objects.filter(user=self.request.user)
+        return Budget.objects.filter(user=self.request.user).with_remaining()
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -204,27 +192,31 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
 class StatisticsView(generics.RetrieveAPIView):
     permission_classes = [IsAuthenticated]
 
+    @cache_per_user('statistics')
+    @read_from_replica
     def get(self, request, *args, **kwargs):
         user = request.user
-        total_income = Transaction.objects.filter(user=user, amount__gt=0).aggregate(Sum('amount'))['amount__sum'] or 0
-        total_expenses = abs(Transaction.objects.filter(user=user, amount__lt=0).aggregate(Sum('amount'))['amount__sum'] or 0)
-        savings_rate = (total_income - total_expenses) / total_income * 100 if total_income > 0 else 0
+        ledger = UserLedger.for_user(user)
         
         return Response({
-            'total_income': total_income,
-            'total_expenses': total_expenses,
-            'savings_rate': round(savings_rate, 2),
+            'total_income': ledger.total_income,
+            'total_expenses': ledger.total_expenses,
+            'savings_rate': ledger.savings_rate,
         })
 
 class ExportDataView(generics.GenericAPIView):
     permission_classes = [IsAuthenticated]
 
+    @read_from_replica
     def get(self, request, *args, **kwargs):
         user = request.user
+        output = request.query_params.get('output')
+        if output:
+            return streaming_export(request, output)
         transactions = TransactionSerializer(Transaction.objects.filter(user=user), many=True).data
         categories = CategorySerializer(Category.objects.filter(user=user), many=True).data
-        budgets = BudgetSerializer(Budget.objects.filter(user=user), many=True).data
-        total_budget = TotalBudgetSerializer(TotalBudget.objects.filter(user=user).first()).data
+        budgets = BudgetSerializer(Budget.objects.filter(user=user).with_remaining(), many=True).data
+        total_budget = TotalBudgetSerializer(TotalBudget.objects.filter(user=user).with_remaining().first()).data
         
         export_data = {
             'transactions': transactions,
@@ -233,10 +225,3 @@ class ExportDataView(generics.GenericAPIView):
             'total_budget': total_budget,
         }
         return Response(export_data)
-
-class ImportDataView(generics.GenericAPIView):
-    permission_classes = [IsAuthenticated]
-
-    def post(self, request, *args, **kwargs):
-        # Здесь добавьте логику для импорта данных пользователя
-        return Response({'message': 'Data import functionality not implemented yet'})
\ No newline at end of file
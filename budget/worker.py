@@ -0,0 +1,20 @@
+"""Entry points for run_jobs' pool processes.
+
+Pool processes are spawned fresh, so this module must import before Django
+is set up: everything else is imported inside the functions.
+"""
+
+
+def setup_process():
+    import django
+    django.setup()
+
+
+def execute(job_id):
+    from django.db import connections
+    from .jobs import run_job
+    try:
+        return run_job(job_id)
+    finally:
+        # Jobs may be minutes apart; don't keep connections open in between.
+        connections.close_all()
@@ -6,17 +6,21 @@ const TransactionList = () => {
   const [transactions, setTransactions] = useState([]);
   const [sortConfig, setSortConfig] = useState({ key: 'date', direction: 'desc' });
   const [filter, setFilter] = useState('');
+  const [nextPage, setNextPage] = useState(null);
 
-  useEffect(() => {
-    const fetchTransactions = async () => {
-      try {
-        const response = await axiosInstance.get('/budget/api/transactions/');
-        setTransactions(response.data);
-      } catch (error) {
-        console.error('Error fetching transactions:', error);
-      }
-    };
+  // API отдаёт транзакции страницами: { next, results }
+  const fetchTransactions = async (url = null) => {
+    try {
+      const response = await axiosInstance.get(url || '/budget/api/transactions/');
+      const page = response.data.results;
+      setTransactions(prev => (url ? prev.concat(page) : page));
+      setNextPage(response.data.next);
+    } catch (error) {
+      console.error('Error fetching transactions:', error);
+    }
+  };
 
+  useEffect(() => {
     fetchTransactions();
   }, []);
 
@@ -114,6 +118,11 @@ const TransactionList = () => {
           ))}
         </tbody>
       </table>
+      {nextPage && (
+        <button onClick={() => fetchTransactions(nextPage)} style={styles.loadMore}>
+          Загрузить ещё
+        </button>
+      )}
     </div>
   );
 };
@@ -158,6 +167,15 @@ const styles = {
     padding: '12px',
     textAlign: 'center', // Выровняли данные по центру
   },
+  loadMore: {
+    marginTop: '20px',
+    padding: '10px 20px',
+    backgroundColor: '#2C2C2C',
+    border: '1px solid #FFD700',
+    borderRadius: '4px',
+    color: '#FFD700',
+    cursor: 'pointer',
+  },
 };
 
 export default TransactionList;
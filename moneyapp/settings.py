@@ -51,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'budget.middleware.PerformanceMiddleware',
+    'budget.middleware.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -85,12 +87,126 @@ WSGI_APPLICATION = 'moneyapp.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# PostgreSQL при заданном POSTGRES_DB, иначе SQLite
+if os.getenv('POSTGRES_DB'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB'),
+            'USER': os.getenv('POSTGRES_USER', ''),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('POSTGRES_HOST', ''),
+            'PORT': os.getenv('POSTGRES_PORT', ''),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            # WAL: читатели (и резервное копирование) не блокируют запись; synchronous=NORMAL безопасен с WAL.
+            # IMMEDIATE берёт блокировку записи в начале транзакции, а не падает с "database is locked" посреди неё
+            'OPTIONS': {
+                'init_command': (
+                    'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL; '
+                    'PRAGMA temp_store=MEMORY; PRAGMA cache_size=-20000'
+                ),
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+        }
     }
-}
+
+# Реплики для чтения (через запятую): пути к файлам SQLite или [хост[:порт]/]имя_базы PostgreSQL.
+# Тяжёлые отчёты читают с реплик; после записи пользователь BUDGET_REPLICA_PIN_SECONDS секунд читает с основной базы
+BUDGET_READ_REPLICAS = []
+for number, replica in enumerate(filter(None, map(str.strip, os.getenv('DATABASE_REPLICAS', '').split(','))), 1):
+    replica_settings = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if replica_settings['ENGINE'] == 'django.db.backends.sqlite3':
+        replica_settings['NAME'] = BASE_DIR / replica
+    else:
+        address, _, replica_settings['NAME'] = replica.rpartition('/')
+        if address:
+            replica_settings['HOST'], _, port = address.partition(':')
+            replica_settings['PORT'] = port or replica_settings['PORT']
+    DATABASES[f'replica{number}'] = replica_settings
+    BUDGET_READ_REPLICAS.append(f'replica{number}')
+BUDGET_REPLICA_PIN_SECONDS = 10
+DATABASE_ROUTERS = ['budget.routers.ReadReplicaRouter']
+
+# Онлайн-резервные копии SQLite (manage.py backup_db): каталог и число хранимых копий
+BUDGET_BACKUP_DIR = BASE_DIR / 'database_backups'
+BUDGET_BACKUP_KEEP = int(os.getenv('BACKUP_KEEP', '7'))
+
+
+# Кэш: Redis при заданном REDIS_URL, файловый при CACHE_DIR, иначе локальная память процесса
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+elif os.getenv('CACHE_DIR'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_DIR'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'moneyapp',
+        }
+    }
+
+# Кэш ответов дашборда и статистики (ключ включает версию данных пользователя)
+BUDGET_RESPONSE_CACHE_ALIAS = 'default'
+BUDGET_RESPONSE_CACHE_TIMEOUT = 300
+
+# Кэш категорий пользователя в памяти процесса (секунды до перечитывания из БД); версия категорий
+# пользователя хранится в общем кэше, её смена (изменение/удаление категории) сбрасывает кэш во всех процессах
+BUDGET_CATEGORY_CACHE_ALIAS = 'default'
+BUDGET_CATEGORY_CACHE_TIMEOUT = 60
+
+# Асинхронные API: независимые запросы выполняются параллельно в отдельных потоках (и соединениях)
+BUDGET_ASYNC_PARALLEL_QUERIES = True
+
+# Метрики производительности: доля запросов с замером SQL/рендеринга (0..1),
+# заголовок Server-Timing и токен для /metrics (Authorization: Bearer <token>)
+BUDGET_METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', '1.0' if DEBUG else '0.1'))
+BUDGET_SERVER_TIMING = True
+BUDGET_METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Сжатие ответов: меньше этого размера (байт) не сжимаем; JSON/NDJSON/CSV — brotli (если установлен), остальное gzip
+BUDGET_COMPRESSION_MIN_SIZE = 1024
+BUDGET_BROTLI_QUALITY = 4
+
+
+# Аутентификация без запросов к БД: пользователи и токены кэшируются на BUDGET_AUTH_CACHE_TIMEOUT секунд,
+# сессии хранятся в кэше (с записью в БД). Сохранение/удаление пользователя сбрасывает кэш
+AUTHENTICATION_BACKENDS = ['budget.auth.CachedModelBackend']
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+BUDGET_AUTH_CACHE_ALIAS = 'default'
+BUDGET_AUTH_CACHE_TIMEOUT = 60
+
+# Уведомления о бюджетах: пороги расходов в процентах от суммы бюджета; при пересечении порога
+# создаётся уведомление (если у пользователя включены уведомления), см. /budget/api/notifications/
+BUDGET_ALERT_THRESHOLDS = (80, 100)
+
+# Фоновые задачи (экспорт, импорт, пересчёт агрегатов): очередь в БД, выполняет manage.py run_jobs
+# в пуле из BUDGET_JOB_PROCESSES процессов. JOB_QUEUE=1 — большие импорты тоже через очередь (нужен запущенный
+# run_jobs), иначе в потоке веб-процесса. Загрузки для очереди лежат в BUDGET_JOB_UPLOADS_DIR — каталог должен
+# быть общим у веб-сервера и воркеров
+BUDGET_JOB_QUEUE = os.getenv('JOB_QUEUE', '0') == '1'
+BUDGET_JOB_PROCESSES = int(os.getenv('JOB_PROCESSES', '2'))
+BUDGET_JOB_RESULTS_DIR = BASE_DIR / 'job_results'
+BUDGET_JOB_UPLOADS_DIR = BASE_DIR / 'job_uploads'
+BUDGET_JOB_RESULT_TTL = 24 * 60 * 60
+BUDGET_JOB_STALE_SECONDS = 300
+BUDGET_JOB_MAX_UNFINISHED = 5
 
 
 # Password validation
@@ -142,15 +258,15 @@ LOGOUT_REDIRECT_URL = '/accounts/login/'
 # Настройки Django Rest Framework
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'budget.renderers.FastJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'budget.renderers.FastJSONParser',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'budget.auth.CachedTokenAuthentication',
+        'budget.auth.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -206,23 +322,68 @@ CORS_ALLOW_METHODS = [
 ]
 
 # Настройки логирования
-LOGGING = {
-    'version': 1,
-    'disable_existing_loggers': False,
-    'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
+# LOG_MODE=console — синхронный вывод в консоль (для разработки);
+# LOG_MODE=json — JSON-строки через очередь и фоновый поток, с ограничением частоты по логгерам
+# и выборкой SQL-запросов (LOG_SQL_SAMPLE_RATE), чтобы потоки запросов не ждали ввода-вывода
+LOG_MODE = os.environ.get('LOG_MODE', 'console' if DEBUG else 'json')
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'DEBUG' if DEBUG else 'INFO')
+LOG_RATE_LIMIT = float(os.environ.get('LOG_RATE_LIMIT', '100'))
+LOG_SQL_SAMPLE_RATE = float(os.environ.get('LOG_SQL_SAMPLE_RATE', '0.01'))
+
+if LOG_MODE == 'json':
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'formatters': {
+            'json': {'()': 'budget.log.JSONFormatter'},
         },
-    },
-    'root': {
-        'handlers': ['console'],
-        'level': 'DEBUG',
-    },
-    'loggers': {
-        'django': {
+        'filters': {
+            'rate_limit': {'()': 'budget.log.RateLimitFilter', 'rate': LOG_RATE_LIMIT},
+            'sql_sample': {'()': 'budget.log.SamplingFilter', 'rate': LOG_SQL_SAMPLE_RATE},
+        },
+        'handlers': {
+            'background': {
+                '()': 'budget.log.BackgroundHandler',
+                'formatter': 'json',
+                'filters': ['rate_limit'],
+            },
+        },
+        'root': {
+            'handlers': ['background'],
+            'level': LOG_LEVEL,
+        },
+        'loggers': {
+            'django': {
+                'handlers': ['background'],
+                'level': LOG_LEVEL,
+                'propagate': False,
+            },
+            'django.db.backends': {
+                'handlers': ['background'],
+                'level': LOG_LEVEL,
+                'filters': ['sql_sample'],
+                'propagate': False,
+            },
+        },
+    }
+else:
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {
+            'console': {
+                'class': 'logging.StreamHandler',
+            },
+        },
+        'root': {
             'handlers': ['console'],
-            'level': 'DEBUG',
-            'propagate': False,
+            'level': LOG_LEVEL,
         },
-    },
-}
\ No newline at end of file
+        'loggers': {
+            'django': {
+                'handlers': ['console'],
+                'level': LOG_LEVEL,
+                'propagate': False,
+            },
+        },
+    }